@@ -1,10 +1,63 @@
-from fastapi import APIRouter, HTTPException, Body
-from services.gemini_service import generate_product_json, GeminiException, get_api_status
-from schemas.product import ProductDescriptionRequest, ProductJSONResponse
+import os
+import json
+from typing import Literal, Optional
+from fastapi import APIRouter, HTTPException, Body, Depends, Header, Query, Request
+from fastapi.responses import StreamingResponse
+from services.gemini_service import (
+    generate_product_json,
+    generate_product_json_batch,
+    generate_product_json_packed,
+    stream_product_json,
+    GeminiException,
+    get_api_status,
+)
+from services.admission import (
+    LANES,
+    DeadlineExceeded,
+    Overloaded,
+    request_context,
+    retry_after_header,
+)
+from services.ingest_service import spool_to_file, iter_file_lines, stream_generation_results
+from schemas.product import (
+    ProductDescriptionRequest,
+    ProductJSONResponse,
+    BatchProductDescriptionRequest,
+    BatchProductJSONResponse,
+)
 
 # Create a new router
 router = APIRouter()
 
+# Default deadlines in seconds per priority lane (0 means no deadline)
+DEFAULT_TIMEOUTS = {
+    "interactive": float(os.getenv("INTERACTIVE_REQUEST_TIMEOUT", "30")),
+    "bulk": float(os.getenv("BULK_REQUEST_TIMEOUT", "0")),
+}
+
+Lane = Literal["interactive", "bulk"]
+
+def request_options(
+    timeout: Optional[float] = Query(None, gt=0, description="Deadline in seconds for this request"),
+    priority: Optional[Lane] = Query(None, description="Priority lane: 'interactive' or 'bulk'"),
+    x_request_timeout: Optional[float] = Header(None, gt=0),
+    x_priority: Optional[Lane] = Header(None)
+) -> dict:
+    """Deadline and priority lane from the query string or the X-Request-Timeout / X-Priority headers."""
+    return {"timeout": timeout or x_request_timeout, "priority": priority or x_priority}
+
+def _request_scope(options: dict, default_lane: str):
+    lane = options["priority"] or default_lane
+    return request_context(timeout=options["timeout"] or DEFAULT_TIMEOUTS[lane], priority=LANES[lane])
+
+def _admission_error(e: Exception) -> HTTPException:
+    """Map a shed (429/503) or timed-out (504) request to its HTTP error."""
+    if isinstance(e, Overloaded):
+        return HTTPException(
+            status_code=e.status_code, detail=str(e), headers={"Retry-After": retry_after_header(e.retry_after)}
+        )
+    return HTTPException(status_code=504, detail=str(e))
+
 @router.post(
     "/generate-description",
     response_model=ProductJSONResponse,
@@ -12,17 +65,30 @@ router = APIRouter()
     description="Receives raw product text and uses the Gemini API to generate a structured JSON object."
 )
 async def generate_description_endpoint(
-    request: ProductDescriptionRequest = Body(...)
+    request: ProductDescriptionRequest = Body(...),
+    options: dict = Depends(request_options)
 ):
     """
     This endpoint processes raw product text to generate a structured JSON.
     - **request**: Must contain 'raw_text' with the product description.
+      Set 'bypass_cache' to skip cached results.
+    - **timeout** / **X-Request-Timeout**: Deadline in seconds (default INTERACTIVE_REQUEST_TIMEOUT).
+    - **priority** / **X-Priority**: 'interactive' (default) or 'bulk'.
+
+    Returns 429 or 503 with Retry-After when the request is shed because the server is
+    busy, and 504 when the deadline passes.
     """
     try:
         # Call the service function with the text from the request
-        generated_data = await generate_product_json(raw_text=request.raw_text)
+        with _request_scope(options, "interactive"):
+            generated_data = await generate_product_json(
+                raw_text=request.raw_text,
+                bypass_cache=request.bypass_cache
+            )
         return ProductJSONResponse(data=generated_data)
         
+    except (Overloaded, DeadlineExceeded) as e:
+        raise _admission_error(e)
     except GeminiException as e:
         # If the service fails after all retries, return a 500 error
         raise HTTPException(status_code=500, detail=str(e))
@@ -30,6 +96,140 @@ async def generate_description_endpoint(
         # Catch any other unexpected errors
         raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
 
+@router.post(
+    "/generate-description/stream",
+    summary="Stream Structured Product JSON over Server-Sent Events",
+    description="Like /generate-description, but sends fields as soon as Gemini has written them and streams the description."
+)
+async def stream_description_endpoint(
+    request: ProductDescriptionRequest = Body(...),
+    options: dict = Depends(request_options)
+):
+    """
+    This endpoint streams the generation of one product as Server-Sent Events.
+    - **request**: As for /generate-description.
+    - **timeout** / **priority**: As for /generate-description; the deadline covers the whole stream.
+
+    Events, in order:
+    - **field**: {"name", "value"} as soon as a field such as category_id, name or price is complete.
+    - **delta**: {"name": "description", "text"} with the next piece of the description.
+    - **result**: The validated product, the same as /generate-description returns in 'data'.
+      Early field values are unvalidated and may be corrected here.
+    - **error**: {"status_code", "detail"} instead of a result, using the status code the
+      non-streaming endpoint would return (with 'retry_after' for 429 and 503).
+    """
+    async def encode():
+        try:
+            with _request_scope(options, "interactive"):
+                async for event, data in stream_product_json(request.raw_text, bypass_cache=request.bypass_cache):
+                    yield _sse(event, data)
+        except (Overloaded, DeadlineExceeded) as e:
+            error = _admission_error(e)
+            data = {"status_code": error.status_code, "detail": error.detail}
+            if isinstance(e, Overloaded):
+                data["retry_after"] = e.retry_after
+            yield _sse("error", data)
+        except Exception as e:
+            yield _sse("error", {"status_code": 500, "detail": str(e)})
+    
+    # Ask proxies not to buffer the stream
+    return StreamingResponse(
+        encode(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+@router.post(
+    "/generate-descriptions",
+    response_model=BatchProductJSONResponse,
+    summary="Generate Structured Product JSON in Batch",
+    description="Receives a list of raw product texts and generates them concurrently over the API key pool."
+)
+async def generate_descriptions_endpoint(
+    request: BatchProductDescriptionRequest = Body(...),
+    options: dict = Depends(request_options)
+):
+    """
+    This endpoint processes many raw product texts in one call.
+    - **request**: Must contain 'items', a list of objects with 'raw_text'.
+
+    - Set 'packed' to send several products per Gemini call.
+    - **timeout** / **priority**: As for /generate-description, but the batch runs in the
+      'bulk' lane without a deadline by default.
+
+    Results are returned in input order. A failed item carries an 'error' instead of
+    'data' and does not fail the rest of the batch.
+    """
+    try:
+        generate = generate_product_json_packed if request.packed else generate_product_json_batch
+        with _request_scope(options, "bulk"):
+            results = await generate(
+                [item.raw_text for item in request.items],
+                bypass_cache=[item.bypass_cache for item in request.items]
+            )
+        
+        failed = sum(1 for result in results if "error" in result)
+        return BatchProductJSONResponse(
+            results=results,
+            succeeded=len(results) - failed,
+            failed=failed
+        )
+        
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"An unexpected error occurred: {e}")
+
+@router.post(
+    "/generate-descriptions/stream",
+    summary="Stream Product JSON for a JSONL File",
+    description="Receives a JSONL body (or a server-side file path) of raw listings and streams NDJSON results as each item completes."
+)
+async def stream_descriptions_endpoint(
+    request: Request,
+    path: Optional[str] = Query(None, description="JSONL file under INGEST_DIR to read instead of the request body"),
+    concurrency: Optional[int] = Query(None, ge=1, description="Maximum number of items generated at once"),
+    options: dict = Depends(request_options)
+):
+    """
+    This endpoint generates products for a JSONL stream with constant memory use.
+    - **body**: One listing per line, either {"raw_text": "..."} or a JSON string.
+    - **path**: Alternatively, a file relative to the INGEST_DIR directory on the server.
+
+    Each output line is {"line": n, "data": {...}} or {"line": n, "error": "..."}, in
+    completion order. An uploaded body is spooled to a temporary file before processing.
+    A slow reader slows down input consumption instead of buffering.
+
+    Items run in the 'bulk' lane by default; a timeout applies to each item separately.
+    """
+    if path is not None:
+        lines = iter_file_lines(_resolve_ingest_path(path))
+    else:
+        lines = iter_file_lines(await spool_to_file(request.stream()), delete=True)
+    
+    async def encode():
+        lane = options["priority"] or "bulk"
+        results = stream_generation_results(
+            lines, concurrency=concurrency, priority=LANES[lane],
+            timeout=options["timeout"] or DEFAULT_TIMEOUTS[lane]
+        )
+        async for result in results:
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(encode(), media_type="application/x-ndjson")
+
+def _resolve_ingest_path(path: str) -> str:
+    """Resolve a file path inside INGEST_DIR, rejecting anything outside it."""
+    ingest_dir = os.getenv("INGEST_DIR", "")
+    if not ingest_dir:
+        raise HTTPException(status_code=400, detail="Reading server-side files is disabled (INGEST_DIR is not set).")
+    root = os.path.realpath(ingest_dir)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise HTTPException(status_code=400, detail="Path must be inside INGEST_DIR.")
+    if not os.path.isfile(resolved):
+        raise HTTPException(status_code=404, detail=f"File not found: {path}")
+    return resolved
+
 @router.get(
     "/api-status",
     summary="Get Gemini API Keys Status",
@@ -39,10 +239,19 @@ async def get_api_status_endpoint():
     """
     Returns information about the API key pool status:
     - Total number of configured keys
-    - Currently active key index
-    - List of temporarily failed keys
+    - Per-key in-flight requests, remaining RPM/TPM capacity and circuit breaker state
+    - List of temporarily failed keys, including keys cooling down on other workers
+    - Per-key counters merged across all workers sharing the key state backend
     - Number of available keys
     - Retry configuration
+    - Result cache hit/miss counters
+    - Near-duplicate index size and reuse rate
+    - Number of requests coalesced into an in-flight call
+    - Hedged request delay, budget and win counters
+    - Model tiers with routing decisions, escalations, latency, tokens and estimated cost per tier
+    - Context caches per key and model, with cached token counts, and startup warm-up timings
+    - Admission control capacity, queue lengths per priority lane and shed requests
+    - Listing tokens before and after pre-processing
     """
     try:
         status = get_api_status()
@@ -50,14 +259,31 @@ async def get_api_status_endpoint():
             "status": "operational",
             "api_keys": {
                 "total": status["total_keys"],
-                "current_active": status["current_key_index"],
                 "failed": status["failed_keys"],
-                "available": status["available_keys"]
+                "available": status["available_keys"],
+                "pool": status["keys"],
+                "shared": status["shared"]
             },
             "configuration": {
                 "max_retries_per_key": status["max_retries_per_key"],
-                "retry_delay_seconds": status["retry_delay"]
+                "retry_delay_seconds": status["retry_delay"],
+                "rpm_limit_per_key": status["rpm_limit"],
+                "tpm_limit_per_key": status["tpm_limit"],
+                "batch_concurrency": status["batch_concurrency"]
             },
+            "throttled_waits": status["throttled_waits"],
+            "cache": status["cache"],
+            "near_duplicates": status["near_duplicates"],
+            "coalescing": status["coalescing"],
+            "hedging": status["hedging"],
+            "routing": status["routing"],
+            "context_cache": status["context_cache"],
+            "warm_up": status["warm_up"],
+            "admission": status["admission"],
+            "packing": status["packing"],
+            "classifier": status["classifier"],
+            "preprocessing": status["preprocessing"],
+            "postprocessing": status["postprocessing"],
             "message": f"System has {status['available_keys']} available API keys out of {status['total_keys']} configured."
         }
     except Exception as e:
@@ -0,0 +1,70 @@
+import asyncio
+from fastapi import APIRouter, HTTPException, Body, Query
+from services.job_service import get_job_store, get_job_workers
+from schemas.product import BatchProductDescriptionRequest
+from schemas.job import JobSubmissionResponse, JobStatusResponse, JobResultsResponse
+
+# Create a new router
+router = APIRouter()
+
+@router.post(
+    "/jobs",
+    response_model=JobSubmissionResponse,
+    status_code=202,
+    summary="Submit a Generation Job",
+    description="Queues a batch of raw product texts for background generation and returns a job id to poll."
+)
+async def submit_job_endpoint(
+    request: BatchProductDescriptionRequest = Body(...)
+):
+    """
+    This endpoint queues a batch for background processing.
+    - **request**: Must contain 'items', a list of objects with 'raw_text'.
+
+    The job survives container restarts; unfinished items resume automatically.
+    """
+    try:
+        store = get_job_store()
+        job_id = await asyncio.to_thread(
+            store.submit,
+            [item.raw_text for item in request.items],
+            [item.bypass_cache for item in request.items]
+        )
+        get_job_workers().notify()
+        return JobSubmissionResponse(job_id=job_id, status="queued", total=len(request.items))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to submit job: {e}")
+
+@router.get(
+    "/jobs/{job_id}",
+    response_model=JobStatusResponse,
+    summary="Get Job Progress",
+    description="Returns the status and per-state item counts of a generation job."
+)
+async def get_job_endpoint(job_id: str):
+    job = await asyncio.to_thread(get_job_store().get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return JobStatusResponse(**job)
+
+@router.get(
+    "/jobs/{job_id}/results",
+    response_model=JobResultsResponse,
+    summary="Get Job Results",
+    description="Returns finished items of a job in input order, one page at a time."
+)
+async def get_job_results_endpoint(
+    job_id: str,
+    after: int = Query(-1, description="Only return items with an index greater than this"),
+    limit: int = Query(100, ge=1, le=1000)
+):
+    """
+    Returns a page of finished items (succeeded or failed) in input order.
+    Items that are still pending are skipped; poll again to pick them up.
+    """
+    store = get_job_store()
+    if await asyncio.to_thread(store.get_job, job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    results = await asyncio.to_thread(store.get_results, job_id, after, limit)
+    next_after = results[-1]["index"] if len(results) == limit else None
+    return JobResultsResponse(job_id=job_id, results=results, next_after=next_after)
@@ -0,0 +1,24 @@
+from fastapi import APIRouter, Response
+from services.metrics import CONTENT_TYPE, registry
+# Importing the service registers its metrics even before the first request
+import services.gemini_service  # noqa: F401
+
+# Create a new router
+router = APIRouter()
+
+@router.get(
+    "/metrics",
+    summary="Prometheus Metrics",
+    description="Returns service metrics in the Prometheus text exposition format."
+)
+def metrics_endpoint():
+    """
+    Exposes, per API key:
+    - Upstream request counts by outcome, error classes and latency histograms
+    - Prompt and response token counts
+    - In-flight requests and availability
+
+    Plus retries, JSON parse failures, admission queues and rejections, hedging,
+    cache, coalescing, packing and post-processing counters.
+    """
+    return Response(registry.render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,99 @@
+"""
+Measure the local category pre-classifier.
+
+Reports top-1 accuracy and top-k recall against the labelled sample listings, the
+fallback rate, classification latency, and prompt input tokens with the full versus
+the reduced category list. With --live it also sends both prompt variants to Gemini and
+reports how often the model picks the expected category, and the mean latency of each.
+
+Usage:
+    python -m benchmarks.classifier
+    python -m benchmarks.classifier --live
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from prompts import PRODUCT_GENERATION_PROMPT
+from services.gemini_service import (
+    category_classifier,
+    classifier_min_score,
+    classifier_top_k,
+    get_api_key_manager,
+    select_product_prompt,
+)
+from services.rate_limiter import estimate_tokens
+from benchmarks.samples import SAMPLE_LISTINGS
+
+
+def measure_offline(top_k: int, min_score: float) -> dict:
+    top1 = recall = fallbacks = 0
+    full_tokens = reduced_tokens = 0
+    started = time.perf_counter()
+    for raw_text, expected in SAMPLE_LISTINGS:
+        candidates = category_classifier.candidates(raw_text, top_k, min_score)
+        if candidates is None:
+            fallbacks += 1
+            recall += 1  # The full list always contains the answer
+            continue
+        top1 += candidates[0] == expected
+        recall += expected in candidates
+    elapsed = time.perf_counter() - started
+
+    for raw_text, _ in SAMPLE_LISTINGS:
+        full_tokens += estimate_tokens(f"{PRODUCT_GENERATION_PROMPT}\n\n{raw_text}")
+        reduced_tokens += estimate_tokens(f"{select_product_prompt(raw_text)}\n\n{raw_text}")
+
+    count = len(SAMPLE_LISTINGS)
+    return {
+        "samples": count,
+        "top_k": top_k,
+        "top1_accuracy": round(top1 / count, 3),
+        "topk_recall": round(recall / count, 3),
+        "fallback_rate": round(fallbacks / count, 3),
+        "classify_microseconds": round(elapsed / count * 1e6, 1),
+        "full_prompt_tokens": round(full_tokens / count, 1),
+        "reduced_prompt_tokens": round(reduced_tokens / count, 1),
+        "input_token_reduction": round(1 - reduced_tokens / full_tokens, 3),
+        "token_source": "estimate",
+    }
+
+
+async def measure_live() -> dict:
+    manager = get_api_key_manager()
+    report = {}
+    for variant in ("full", "reduced"):
+        correct, seconds = 0, 0.0
+        for raw_text, expected in SAMPLE_LISTINGS:
+            prompt = PRODUCT_GENERATION_PROMPT if variant == "full" else select_product_prompt(raw_text)
+            started = time.perf_counter()
+            response_text = await manager.generate_content_with_failover(f"{prompt}\n\n{raw_text}")
+            seconds += time.perf_counter() - started
+            try:
+                correct += int(json.loads(response_text).get("category_id", 0)) == expected
+            except (ValueError, AttributeError):
+                pass
+        report[variant] = {
+            "model_accuracy": round(correct / len(SAMPLE_LISTINGS), 3),
+            "mean_latency_seconds": round(seconds / len(SAMPLE_LISTINGS), 3),
+        }
+    return report
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="also compare both prompt variants against Gemini")
+    parser.add_argument("--top-k", type=int, default=classifier_top_k)
+    parser.add_argument("--min-score", type=float, default=classifier_min_score)
+    args = parser.parse_args()
+
+    report = {"classifier": measure_offline(args.top_k, args.min_score)}
+    if args.live:
+        report["gemini"] = await measure_live()
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,133 @@
+"""
+Measure cold start and prompt tokens with and without warm-up and context caching.
+
+Each scenario runs in a fresh process, --runs times, and reports the median of:
+
+    import_seconds       importing the app
+    startup_seconds      the lifespan startup (warm-up included when enabled)
+    first_request_ms     the first /generate-description request
+    next_request_ms      the median of the following requests
+    prompt_tokens        prompt tokens per request as reported by the backend
+    cached_tokens        how many of those were served from a context cache
+    billable_tokens      prompt tokens with cached ones weighted by CACHED_TOKEN_PRICE_RATIO
+                         (default 0.25, Gemini's discount), excluding cache storage
+
+Scenarios:
+
+    lazy    WARM_UP_ENABLED=false, CONTEXT_CACHE_ENABLED=false: keys are built on the
+            first request and every request sends the whole (category-narrowed) prompt
+    warm    warm-up at startup and the product instruction in each key's context cache
+
+By default the app runs against the fake backend, whose first call on each key waits
+FAKE_GEMINI_CONNECT_SECONDS (0.3 here) and which reports cached tokens like Gemini. With
+--live, MODEL_BACKEND=gemini and the keys from the environment are used.
+
+Usage:
+    python -m benchmarks.coldstart
+    python -m benchmarks.coldstart --runs 5 --requests 10
+    python -m benchmarks.coldstart --live
+"""
+
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import statistics
+import subprocess
+
+SCENARIOS = {
+    "lazy": {"WARM_UP_ENABLED": "false", "CONTEXT_CACHE_ENABLED": "false"},
+    "warm": {"WARM_UP_ENABLED": "true", "CONTEXT_CACHE_ENABLED": "true"},
+}
+
+
+async def run_child(requests: int) -> dict:
+    """One scenario in this process: import, start up, send requests, read the counters."""
+    started = time.perf_counter()
+    from main import app
+    imported = time.perf_counter()
+
+    from benchmarks.ttfb import asgi_chunks
+    from benchmarks.samples import SAMPLE_LISTINGS
+    from services import gemini_service
+
+    latencies = []
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        for number in range(requests):
+            raw_text, _ = SAMPLE_LISTINGS[number % len(SAMPLE_LISTINGS)]
+            payload = {"raw_text": f"{raw_text}\nکد {number}", "bypass_cache": True}
+            sent = time.perf_counter()
+            async for status, _ in asgi_chunks(app, "/api/v1/generate-description", payload):
+                if status != 200:
+                    raise RuntimeError(f"Request {number} failed with status {status}")
+            latencies.append(time.perf_counter() - sent)
+
+        manager = gemini_service.get_api_key_manager()
+        prompt_tokens = sum(stats.prompt_tokens for stats in manager.router.stats.values())
+        cached_tokens = manager.context_cache.stats["cached_tokens"]
+
+    ratio = float(os.getenv("CACHED_TOKEN_PRICE_RATIO", "0.25"))
+    return {
+        "import_seconds": imported - started,
+        "startup_seconds": ready - imported,
+        "first_request_ms": latencies[0] * 1000,
+        "next_request_ms": statistics.median(latencies[1:]) * 1000 if len(latencies) > 1 else None,
+        "prompt_tokens": prompt_tokens / requests,
+        "cached_tokens": cached_tokens / requests,
+        "billable_tokens": (prompt_tokens - cached_tokens * (1 - ratio)) / requests,
+    }
+
+
+def run_scenario(name: str, runs: int, requests: int, live: bool) -> dict:
+    env = {**os.environ, **SCENARIOS[name], "JOB_WORKERS_ENABLED": "false", "CACHE_ENABLED": "false"}
+    if not live:
+        env.setdefault("MODEL_BACKEND", "fake")
+        env.setdefault("GOOGLE_API_KEYS", "fake-key-1,fake-key-2,fake-key-3,fake-key-4")
+        env.setdefault("FAKE_GEMINI_CONNECT_SECONDS", "0.3")
+    else:
+        env["MODEL_BACKEND"] = "gemini"
+
+    samples = []
+    for _ in range(runs):
+        output = subprocess.run(
+            [sys.executable, "-m", "benchmarks.coldstart", "--child", "--requests", str(requests)],
+            env=env, capture_output=True, text=True, check=True,
+        ).stdout
+        samples.append(json.loads(output.strip().splitlines()[-1]))
+
+    report = {"runs": runs, "requests": requests}
+    for metric in samples[0]:
+        values = [sample[metric] for sample in samples if sample[metric] is not None]
+        median = statistics.median(values) if values else None
+        report[metric] = round(median, 3 if metric.endswith("seconds") else 1) if median is not None else None
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3, help="fresh processes per scenario")
+    parser.add_argument("--requests", type=int, default=6, help="requests per process")
+    parser.add_argument("--live", action="store_true", help="use Gemini with the keys from the environment")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        from services.observability import configure_logging
+        configure_logging()  # Service logs go to stderr, so the last stdout line is the result
+        print(json.dumps(asyncio.run(run_child(args.requests))))
+        return
+
+    report = {"backend": "gemini" if args.live else "fake"}
+    for name in SCENARIOS:
+        report[name] = run_scenario(name, args.runs, args.requests, args.live)
+    lazy, warm = report["lazy"], report["warm"]
+    report["first_request_saved_ms"] = round(lazy["first_request_ms"] - warm["first_request_ms"], 1)
+    report["billable_prompt_token_reduction"] = round(1 - warm["billable_tokens"] / lazy["billable_tokens"], 3)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
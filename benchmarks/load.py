@@ -0,0 +1,132 @@
+"""
+Load-test /api/v1/generate-description at fixed concurrency levels.
+
+For each level, sends --requests distinct listings (bypassing the cache) from
+--concurrency parallel clients. Reports requests/second, p50/p95/p99 latency, status
+counts and upstream attempts per success, read from /api/v1/api-status before and
+after the level.
+
+By default the app runs in-process with the fake model backend, so no key or network is
+needed. Its latency and faults are set with the FAKE_GEMINI_* variables (see
+services/fake_gemini.py). With --url, a running server is measured instead; start it with
+MODEL_BACKEND=fake to measure the service alone.
+
+Usage:
+    python -m benchmarks.load
+    python -m benchmarks.load --concurrency 1,8,32 --requests 200 --output load.json
+    FAKE_GEMINI_FAULTS=429=0.05,malformed=0.02 python -m benchmarks.load
+    python -m benchmarks.load --url http://localhost:8000
+"""
+
+import os
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter
+
+import httpx
+
+from services.hedging import LatencyTracker
+from services.observability import configure_logging
+from benchmarks.samples import SAMPLE_LISTINGS
+
+
+def configure_in_process():
+    """Defaults for running the app in this process against the fake backend."""
+    os.environ.setdefault("MODEL_BACKEND", "fake")
+    os.environ.setdefault("GOOGLE_API_KEYS", "fake-key-1,fake-key-2,fake-key-3,fake-key-4")
+    os.environ.setdefault("CACHE_ENABLED", "false")
+
+
+async def upstream_counters(client: httpx.AsyncClient) -> dict:
+    response = await client.get("/api/v1/api-status")
+    response.raise_for_status()
+    pool = response.json()["api_keys"]["pool"]
+    return {
+        "attempts": sum(key["total_requests"] for key in pool),
+        "failures": sum(key["total_failures"] for key in pool),
+    }
+
+
+async def run_level(client: httpx.AsyncClient, concurrency: int, requests: int, offset: int) -> dict:
+    latencies = LatencyTracker(window=requests)
+    statuses = Counter()
+    next_request = iter(range(requests))
+
+    async def client_loop():
+        for number in next_request:
+            raw_text, _ = SAMPLE_LISTINGS[number % len(SAMPLE_LISTINGS)]
+            payload = {"raw_text": f"{raw_text}\nکد {offset + number}", "bypass_cache": True}
+            started = time.perf_counter()
+            try:
+                response = await client.post("/api/v1/generate-description", json=payload)
+                statuses[str(response.status_code)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.record(time.perf_counter() - started)
+
+    before = await upstream_counters(client)
+    started = time.perf_counter()
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    after = await upstream_counters(client)
+
+    succeeded = statuses.get("200", 0)
+    attempts = after["attempts"] - before["attempts"]
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "succeeded": succeeded,
+        "failed": requests - succeeded,
+        "statuses": dict(statuses),
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 2),
+        "latency_ms": {
+            f"p{percent}": round(latencies.percentile(percent) * 1000, 1) for percent in (50, 95, 99)
+        },
+        "upstream_attempts": attempts,
+        "upstream_failures": after["failures"] - before["failures"],
+        "attempts_per_success": round(attempts / succeeded, 3) if succeeded else None,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base URL of a running server (default: in-process app with the fake backend)")
+    parser.add_argument("--concurrency", default="1,4,16", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="requests per concurrency level")
+    parser.add_argument("--timeout", type=float, default=120, help="client timeout per request in seconds")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    levels = [int(level) for level in args.concurrency.split(",")]
+
+    # Service logs go to stderr, so stdout stays valid JSON
+    configure_logging()
+    if args.url:
+        transport, base_url, target = None, args.url, args.url
+    else:
+        configure_in_process()
+        from main import app
+        transport, base_url, target = httpx.ASGITransport(app=app), "http://benchmark", "in-process"
+
+    report = {"target": target}
+    if not args.url:
+        from services.fake_gemini import FakeProfile
+        report["model_backend"] = os.environ["MODEL_BACKEND"]
+        report["fake_profile"] = FakeProfile.from_env().describe() if os.environ["MODEL_BACKEND"] == "fake" else None
+    report["levels"] = []
+
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout) as client:
+        for position, concurrency in enumerate(levels):
+            report["levels"].append(await run_level(client, concurrency, args.requests, position * args.requests))
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""
+Compare one-product-per-call generation with packed generation.
+
+Reports input tokens per product for both modes. With --live it also runs both modes
+against the configured Gemini keys (bypassing the cache) and reports products/second.
+
+Usage:
+    python -m benchmarks.packing            # token comparison only, no API calls
+    python -m benchmarks.packing --live     # also measure throughput
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from prompts import PRODUCT_GENERATION_PROMPT, PACKED_PRODUCT_GENERATION_PROMPT, format_packed_products
+from services.gemini_service import (
+    get_api_key_manager,
+    generate_product_json_batch,
+    generate_product_json_packed,
+    plan_packs,
+)
+from services.rate_limiter import estimate_tokens
+from benchmarks.samples import SAMPLE_LISTINGS
+
+
+async def count_tokens(prompt: str, live: bool) -> int:
+    """Count prompt tokens with Gemini when running live, otherwise estimate locally."""
+    if live:
+        manager = get_api_key_manager()
+        response = await manager.slots[0].model.count_tokens_async(prompt)
+        return response.total_tokens
+    return estimate_tokens(prompt)
+
+
+async def measure_tokens(raw_texts, live: bool) -> dict:
+    manager = get_api_key_manager()
+    single_tokens = 0
+    for text in raw_texts:
+        single_tokens += await count_tokens(f"{PRODUCT_GENERATION_PROMPT}\n\n{text}", live)
+
+    packs = plan_packs(raw_texts, manager)
+    packed_tokens = 0
+    for pack in packs:
+        packed_prompt = f"{PACKED_PRODUCT_GENERATION_PROMPT}\n\n{format_packed_products([raw_texts[i] for i in pack])}"
+        packed_tokens += await count_tokens(packed_prompt, live)
+
+    return {
+        "products": len(raw_texts),
+        "packs": len(packs),
+        "single_input_tokens_per_product": round(single_tokens / len(raw_texts), 1),
+        "packed_input_tokens_per_product": round(packed_tokens / len(raw_texts), 1),
+        "input_token_reduction": round(1 - packed_tokens / single_tokens, 3),
+        "token_source": "gemini" if live else "estimate",
+    }
+
+
+async def measure_throughput(raw_texts) -> dict:
+    bypass = [True] * len(raw_texts)
+    results = {}
+    for mode, generate in (("single", generate_product_json_batch), ("packed", generate_product_json_packed)):
+        started = time.perf_counter()
+        items = await generate(raw_texts, bypass_cache=bypass)
+        elapsed = time.perf_counter() - started
+        succeeded = sum(1 for item in items if "data" in item)
+        results[mode] = {
+            "seconds": round(elapsed, 2),
+            "succeeded": succeeded,
+            "products_per_second": round(succeeded / elapsed, 3) if elapsed else None,
+        }
+    return results
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="call Gemini to count tokens and measure throughput")
+    parser.add_argument("--repeat", type=int, default=1, help="repeat the sample listings N times")
+    args = parser.parse_args()
+
+    raw_texts = [text for text, _ in SAMPLE_LISTINGS] * args.repeat
+    report = {"tokens": await measure_tokens(raw_texts, args.live)}
+    if args.live:
+        report["throughput"] = await measure_throughput(raw_texts)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,83 @@
+"""
+Measure the input pre-processing stage.
+
+For the sample listings and a noisy copy of each (repeated emoji, Arabic letter forms,
+stray ZWNJ, redundant hashtags, repeated lines and whitespace), reports listing tokens
+before and after compaction, the tokens added by the hints line, the time per listing,
+and how many noisy copies end up with the same text, and so the same cache key, as
+their clean originals. With --live, tokens are counted by Gemini instead of the local estimator.
+
+Usage:
+    python -m benchmarks.preprocessing
+    python -m benchmarks.preprocessing --live
+"""
+
+import argparse
+import asyncio
+import json
+import time
+
+from services.gemini_service import get_api_key_manager
+from services.preprocessing import compact_listing, with_hints
+from services.rate_limiter import estimate_tokens
+from benchmarks.samples import SAMPLE_LISTINGS
+
+_ARABIC_FORMS = str.maketrans({"ی": "ي", "ک": "ك"})
+
+
+def add_noise(raw_text: str) -> str:
+    """A copy of a listing as resellers repost it."""
+    words = raw_text.translate(_ARABIC_FORMS).split()
+    noisy = "\u200c ".join(words[:3]) + "   " + "  ".join(words[3:])
+    return f"🔥🔥🔥 {noisy} ✨✨✨\n\n\n{noisy}\n#{words[0]} #{words[0]}_{words[1]}"
+
+
+async def count_tokens(text: str, live: bool) -> int:
+    """Count tokens with Gemini when running live, otherwise estimate locally."""
+    if live:
+        manager = get_api_key_manager()
+        response = await manager.slots[0].model.count_tokens_async(text)
+        return response.total_tokens
+    return estimate_tokens(text)
+
+
+async def measure(raw_texts, live: bool) -> dict:
+    raw_tokens = compact_tokens = hinted_tokens = 0
+    elapsed = 0.0
+    for text in raw_texts:
+        started = time.perf_counter()
+        compact = compact_listing(text)
+        hinted = with_hints(compact)
+        elapsed += time.perf_counter() - started
+        raw_tokens += await count_tokens(text, live)
+        compact_tokens += await count_tokens(compact, live)
+        hinted_tokens += await count_tokens(hinted, live)
+    return {
+        "listings": len(raw_texts),
+        "raw_tokens_per_listing": round(raw_tokens / len(raw_texts), 1),
+        "compact_tokens_per_listing": round(compact_tokens / len(raw_texts), 1),
+        "hint_tokens_per_listing": round((hinted_tokens - compact_tokens) / len(raw_texts), 1),
+        "compaction_token_reduction": round(1 - compact_tokens / raw_tokens, 3),
+        "microseconds_per_listing": round(elapsed / len(raw_texts) * 1e6, 1),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--live", action="store_true", help="count tokens with Gemini instead of estimating them")
+    args = parser.parse_args()
+
+    clean = [text for text, _ in SAMPLE_LISTINGS]
+    noisy = [add_noise(text) for text in clean]
+    same_text = sum(1 for original, copy in zip(clean, noisy) if compact_listing(original) == compact_listing(copy))
+    report = {
+        "token_source": "gemini" if args.live else "estimate",
+        "clean": await measure(clean, args.live),
+        "noisy": await measure(noisy, args.live),
+        "noisy_copies_matching_clean_text": f"{same_text}/{len(clean)}",
+    }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,20 @@
+# Representative raw listings used by the benchmark scripts.
+# Each entry pairs a raw text with the category_id a careful human would choose.
+SAMPLE_LISTINGS = [
+    ("مانتو کتان زنانه جلو باز با کمربند 👗 سایز ۳۸ تا ۴۶ رنگبندی: مشکی، کرم، طوسی قیمت ۴۸۰,۰۰۰ تومان", 248),
+    ("شلوار جین مردانه اسلیم فیت 👖 سایز ۳۰ تا ۳۸ جنس کش دار درجه یک فقط ۳۹۰ هزار تومان", 257),
+    ("ست نوزادی سه تکه پنبه ای 🍼 مناسب ۰ تا ۶ ماه رنگ سفید و آبی قیمت: 250000 تومان", 267),
+    ("کفش اسپرت زنانه رویه پارچه ای زیره پی یو سایز ۳۷ تا ۴۰ ✨ قیمت ۶۵۰ تومان", 242),
+    ("هودی پسرانه دورس توکرک دار سایز ۴ تا ۱۲ سال 🧥 رنگ سرمه ای و زرشکی ۳۲۰,۰۰۰ تومان", 204),
+    ("شال نخی زنانه طرح دار 🌸 قواره بزرگ ۷۰ در ۱۸۰ قیمت ۱۴۵ هزار تومان #شال #روسری", 238),
+    ("تیشرت مردانه نخ پنبه یقه گرد سایز M تا XXL 👕 رنگ سفید، مشکی، زیتونی قیمت ۱۹۰,۰۰۰ تومان", 252),
+    ("کیف دوشی زنانه چرم مصنوعی 👜 دارای بند بلند و کوتاه رنگ کرم و قهوه ای ۴۲۰ تومان", 244),
+    ("دامن پلیسه دخترانه مناسب ۸ تا ۱۲ سال 💃 رنگ صورتی و مشکی قیمت ۲۱۰ هزار تومان", 217),
+    ("ساعت مچی مردانه بند استیل ضد آب ⌚️ موتور ژاپن قیمت ۸۹۰,۰۰۰ تومان", 255),
+    ("لباس خواب زنانه ساتن دو تکه 😴 فری سایز تا ۴۶ رنگ یاسی، صورتی قیمت ۳۶۰ تومان", 246),
+    ("جوراب مردانه نخی بسته ۶ عددی 🧦 فری سایز قیمت ۹۵ هزار تومان", 253),
+    ("کاپشن پفی مردانه کلاه دار ضد آب ❄️ سایز L تا 3XL قیمت ۱,۲۵۰,۰۰۰ تومان", 251),
+    ("سرهمی نوزادی دکمه دار نخ پنبه ای 👶 سایز ۰ تا ۱۲ ماه قیمت ۱۸۰ تومان", 268),
+    ("بلوز مجلسی زنانه حریر آستین پفی 🌷 سایز ۳۶ تا ۴۲ رنگ سفید و مشکی ۳۹۰,۰۰۰ تومان", 229),
+    ("کلاه بافت دخترانه پوم پوم دار ❄️ مناسب ۳ تا ۸ سال رنگبندی متنوع قیمت ۸۵ هزار تومان", 224),
+]
@@ -0,0 +1,206 @@
+"""
+Compare time to first useful byte of /generate-description and its SSE variant.
+
+For each endpoint, sends --requests distinct listings (bypassing the cache) from
+--concurrency parallel clients and reports p50/p95 in milliseconds of:
+
+    first_byte         first response bytes
+    first_field        first product field (category_id, name or price)
+    name, price        those fields
+    first_description  first piece of the description
+    complete           the whole validated product
+
+The plain endpoint answers with everything at once, so all of its times are the same.
+
+By default the app runs in-process with the fake model backend (see benchmarks/load.py)
+and is called directly over ASGI, so the times exclude the network. Set
+FAKE_GEMINI_LATENCY and FAKE_GEMINI_FIRST_CHUNK_RATIO to shape the fake stream. With
+--url, a running server is measured over HTTP instead.
+
+Usage:
+    python -m benchmarks.ttfb
+    python -m benchmarks.ttfb --requests 50 --concurrency 4 --output ttfb.json
+    python -m benchmarks.ttfb --url http://localhost:8000
+"""
+
+import os
+import json
+import time
+import asyncio
+import argparse
+from collections import Counter
+from typing import AsyncIterator, Optional, Tuple
+
+import httpx
+
+from services.hedging import LatencyTracker
+from services.observability import configure_logging
+from benchmarks.load import configure_in_process
+from benchmarks.samples import SAMPLE_LISTINGS
+
+ENDPOINTS = {
+    "generate-description": "/api/v1/generate-description",
+    "generate-description/stream": "/api/v1/generate-description/stream",
+}
+MILESTONES = ("first_byte", "first_field", "name", "price", "first_description", "complete")
+
+
+async def asgi_chunks(app, path: str, payload: dict) -> AsyncIterator[Tuple[int, bytes]]:
+    """POST to an ASGI app and yield the status and each body chunk as the app sends it."""
+    body = json.dumps(payload).encode()
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+        "headers": [(b"host", b"benchmark"), (b"content-type", b"application/json")],
+        "client": ("127.0.0.1", 0), "server": ("benchmark", 80),
+    }
+    messages: asyncio.Queue = asyncio.Queue()
+    finished = asyncio.Event()
+    requested = False
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        await finished.wait()
+        return {"type": "http.disconnect"}
+
+    task = asyncio.create_task(app(scope, receive, messages.put))
+    status = None
+    try:
+        while True:
+            message = await messages.get()
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                continue
+            if message.get("body"):
+                yield status, message["body"]
+            if not message.get("more_body", False):
+                break
+    finally:
+        finished.set()
+        await task
+
+
+async def http_chunks(client: httpx.AsyncClient, path: str, payload: dict) -> AsyncIterator[Tuple[int, bytes]]:
+    async with client.stream("POST", path, json=payload) as response:
+        async for chunk in response.aiter_raw():
+            yield response.status_code, chunk
+
+
+def parse_events(buffer: str):
+    """Split complete SSE events off the buffer: ([(event, data), ...], rest)."""
+    events = []
+    while "\n\n" in buffer:
+        block, buffer = buffer.split("\n\n", 1)
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        events.append((fields.get("event"), json.loads(fields.get("data", "null"))))
+    return events, buffer
+
+
+async def measure(chunks: AsyncIterator[Tuple[int, bytes]], streamed: bool) -> Tuple[Optional[int], dict]:
+    """Milestone times in seconds for one request."""
+    started = time.perf_counter()
+    times = {}
+    status = None
+    buffer = ""
+    async for status, chunk in chunks:
+        elapsed = time.perf_counter() - started
+        times.setdefault("first_byte", elapsed)
+        if not streamed:
+            continue
+        events, buffer = parse_events(buffer + chunk.decode("utf-8"))
+        for event, data in events:
+            if event == "field":
+                times.setdefault("first_field", elapsed)
+                times.setdefault(data["name"], elapsed)
+            elif event == "delta":
+                times.setdefault("first_description", elapsed)
+            elif event == "result":
+                times["complete"] = elapsed
+            elif event == "error":
+                status = data["status_code"]
+    if not streamed and status == 200:
+        times.update({name: times["first_byte"] for name in MILESTONES})
+    return status, times
+
+
+async def run_endpoint(send, name: str, concurrency: int, requests: int, offset: int) -> dict:
+    trackers = {milestone: LatencyTracker(window=requests) for milestone in MILESTONES}
+    statuses = Counter()
+    next_request = iter(range(requests))
+    streamed = name.endswith("/stream")
+
+    async def client_loop():
+        for number in next_request:
+            raw_text, _ = SAMPLE_LISTINGS[number % len(SAMPLE_LISTINGS)]
+            payload = {"raw_text": f"{raw_text}\nکد {offset + number}", "bypass_cache": True}
+            try:
+                status, times = await measure(send(ENDPOINTS[name], payload), streamed)
+                statuses[str(status)] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+                continue
+            if status == 200 and "complete" in times:
+                for milestone, seconds in times.items():
+                    if milestone in trackers:
+                        trackers[milestone].record(seconds)
+
+    await asyncio.gather(*(client_loop() for _ in range(concurrency)))
+    return {
+        "endpoint": ENDPOINTS[name],
+        "statuses": dict(statuses),
+        "latency_ms": {
+            milestone: {
+                f"p{percent}": round(tracker.percentile(percent) * 1000, 1) if len(tracker) else None
+                for percent in (50, 95)
+            }
+            for milestone, tracker in trackers.items()
+        },
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base URL of a running server (default: in-process app with the fake backend)")
+    parser.add_argument("--concurrency", type=int, default=1, help="parallel clients per endpoint")
+    parser.add_argument("--requests", type=int, default=20, help="requests per endpoint")
+    parser.add_argument("--timeout", type=float, default=120, help="client timeout per request in seconds")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    # Service logs go to stderr, so stdout stays valid JSON
+    configure_logging()
+    report = {"target": args.url or "in-process"}
+    client = None
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=args.timeout)
+        send = lambda path, payload: http_chunks(client, path, payload)
+    else:
+        configure_in_process()
+        from main import app
+        from services.fake_gemini import FakeProfile
+        send = lambda path, payload: asgi_chunks(app, path, payload)
+        report["model_backend"] = os.environ["MODEL_BACKEND"]
+        report["fake_profile"] = FakeProfile.from_env().describe() if os.environ["MODEL_BACKEND"] == "fake" else None
+
+    report["endpoints"] = []
+    try:
+        for position, name in enumerate(ENDPOINTS):
+            report["endpoints"].append(
+                await run_endpoint(send, name, args.concurrency, args.requests, position * args.requests)
+            )
+    finally:
+        if client is not None:
+            await client.aclose()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            file.write(output + "\n")
+    print(output)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
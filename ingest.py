@@ -0,0 +1,63 @@
+"""
+Bulk-generate product JSON for a JSONL file of raw listings.
+
+Each input line is either {"raw_text": "..."} or a JSON string. Results are written as
+NDJSON in completion order, each carrying the 1-based input line number:
+
+    {"line": 3, "data": {...}}
+    {"line": 1, "error": "..."}
+
+Usage:
+    python ingest.py listings.jsonl > results.ndjson
+    python ingest.py listings.jsonl -o results.ndjson --concurrency 8
+    cat listings.jsonl | python ingest.py -
+"""
+
+import sys
+import json
+import asyncio
+import argparse
+from services.observability import configure_logging
+from services.ingest_service import iter_file_lines, stream_generation_results
+
+
+async def iter_stdin_lines():
+    """Read standard input line by line in a worker thread."""
+    while True:
+        line = await asyncio.to_thread(sys.stdin.readline)
+        if not line:
+            break
+        yield line.rstrip("\n")
+
+
+async def run(input_path: str, output, concurrency: int) -> int:
+    lines = iter_stdin_lines() if input_path == "-" else iter_file_lines(input_path)
+    failed = 0
+    async for result in stream_generation_results(lines, concurrency=concurrency):
+        if "error" in result:
+            failed += 1
+        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        output.flush()
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="JSONL file of raw listings, or - for standard input")
+    parser.add_argument("-o", "--output", help="write NDJSON results here instead of standard output")
+    parser.add_argument("--concurrency", type=int, default=None, help="maximum number of items generated at once")
+    args = parser.parse_args()
+
+    # Service logs go to stderr, so stdout stays valid NDJSON
+    configure_logging()
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        failed = asyncio.run(run(args.input, output, args.concurrency))
+    finally:
+        if args.output:
+            output.close()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
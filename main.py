@@ -1,12 +1,45 @@
+import os
+import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 # Import the CORSMiddleware
 from fastapi.middleware.cors import CORSMiddleware
-from api import endpoints
+from api import endpoints, jobs, metrics
+from services.gemini_service import shut_down, warm_up
+from services.job_service import get_job_workers
+from services.observability import configure_logging
+
+configure_logging()
+logger = logging.getLogger(__name__)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Warm up the Gemini keys (clients, connections and context caches) before the server
+    accepts requests, then start the background job workers, which resume any unfinished jobs.
+    """
+    if os.getenv("WARM_UP_ENABLED", "true").lower() in ("1", "true", "yes"):
+        try:
+            await warm_up()
+        except Exception as e:
+            # Requests report the problem (e.g. missing keys) as before
+            logger.error("Warm-up failed: %s", e)
+    workers = None
+    if os.getenv("JOB_WORKERS_ENABLED", "true").lower() in ("1", "true", "yes"):
+        workers = get_job_workers()
+        workers.start()
+    yield
+    if workers is not None:
+        await workers.stop()
+    await shut_down()
+
 
 app = FastAPI(
     title="Gemini Product Description Service",
     description="A service to generate structured product JSON from raw text using the Gemini API.",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Allow all origins by using the wildcard "*"
@@ -30,6 +63,19 @@ app.include_router(
     tags=["Product Generation"]
 )
 
+# Include the background job endpoints
+app.include_router(
+    jobs.router,
+    prefix="/api/v1",
+    tags=["Jobs"]
+)
+
+# Prometheus scrapes /metrics at the root, outside the versioned API
+app.include_router(
+    metrics.router,
+    tags=["Monitoring"]
+)
+
 @app.get("/", tags=["Health Check"])
 def read_root():
     """A simple health check endpoint."""
@@ -1,22 +1,16 @@
-# This prompt contains all the rules for the AI model.
-# It instructs Gemini to return a JSON object with a specific structure and content.
-PRODUCT_GENERATION_PROMPT = """
-You are a product data specialist. Your task is to analyze a raw Persian product description and generate a structured JSON output.
-
-**Rules:**
-1.  **JSON Only**: Your entire response must be a single, valid JSON object, with no additional text, comments, or formatting like "```json".
+# Field rules shared by the single-product and packed prompts.
+# Fixed values (status, unit_type, weights) and the Toman -> Rial conversion are applied
+# locally after generation (see services/postprocessing.py), so the model does not emit them.
+PRODUCT_FIELD_RULES = """\
 2.  **Category**: Choose the most relevant `category_id` from the provided list. Prefer categories with "زنانه" over "دخترانه" if applicable.
 3.  **Name**: The product `name` must be at least 3 words. If the original is too short, enhance it (e.g., by adding the fabric type).
 4.  **Description**: The `description` must be at least 25 words. Rewrite it in a friendly, engaging tone. Use emojis to make it appealing 😊. Do not include promotional or motivational slogans. Highlight features, sizes, and colors.
-5.  **Price**: The `price` is in Rial. If you see a price that looks like Toman (e.g., 150,000), convert it to Rial by multiplying by 10 (e.g., 1,500,000). The minimum price is 1,000,000 Rial.
-6.  **Fixed Values**:
-    * `status`: Always `2976`.
-    * `unit_type`: Always `6304`.
-    * `package_weight`: Always `200` (grams).
-    * `weight`: Always `100` (grams).
-7.  **Packaging**: For `packaging_dimensions`, provide a reasonable estimate like `{"length": 10, "width": 5, "height": 1}`. Never use 0.
+5.  **Price**: Put the price exactly as written in the text into `price` as a plain integer (e.g., "۴۸۰,۰۰۰ تومان" -> 480000, "۶۵۰ تومان" -> 650). Do not convert it. Set `price_currency` to "rial" only if the text says ریال, otherwise "toman".
+6.  **Packaging**: For `packaging_dimensions`, provide a reasonable estimate like `{"length": 10, "width": 5, "height": 1}`. Never use 0.
+7.  **Hints**: A listing may end with a `Hints:` line parsed from its text, e.g. `Hints: price=480000 toman; sizes=38-46`. Use it for `price` and `price_currency`, and mention the sizes in the description. Do not copy the line itself."""
 
-**Category List:**
+# The category list the model chooses `category_id` from.
+CATEGORY_LIST = """\
 * 201: اکسسوری و ساعت پسرانه
 * 202: بلوز/پیراهن/تیشرت پسرانه
 * 203: جوراب پسرانه
@@ -86,7 +80,69 @@ You are a product data specialist. Your task is to analyze a raw Persian product
 * 267: ست نوزادی
 * 268: شلوار/سرهمی نوزادی
 * 269: کفش/پاپوش نوزادی
-* 270: لباس زیر نوزاد
+* 270: لباس زیر نوزاد"""
+
+# This prompt contains all the rules for the AI model.
+# It instructs Gemini to return a JSON object with a specific structure and content.
+# build_product_prompt renders the same template with a reduced category list.
+_PRODUCT_PROMPT_TEMPLATE = """
+You are a product data specialist. Your task is to analyze a raw Persian product description and generate a structured JSON output.
+
+**Rules:**
+1.  **JSON Only**: Your entire response must be a single, valid JSON object, with no additional text, comments, or formatting like "```json".
+{rules}
+
+**Category List:**
+{categories}
+
+**Raw Product Text:**
+"""
+
+
+def build_product_prompt(category_lines=None):
+    """Render the single-product prompt, optionally with only the given category list lines."""
+    categories = "\n".join(category_lines) if category_lines else CATEGORY_LIST
+    return _PRODUCT_PROMPT_TEMPLATE.format(rules=PRODUCT_FIELD_RULES, categories=categories)
+
+
+PRODUCT_GENERATION_PROMPT = build_product_prompt()
+
+# Packed variant: several products in one call, answered as an indexed JSON array.
+# Each product is appended as a "### Product <index>" section (see format_packed_products).
+PACKED_PRODUCT_GENERATION_PROMPT = f"""
+You are a product data specialist. Your task is to analyze several raw Persian product descriptions and generate a structured JSON output for each of them.
+
+**Rules:**
+1.  **JSON Only**: Your entire response must be a single, valid JSON array with exactly one object per product, with no additional text, comments, or formatting like "```json".
+    Every object must include an integer `index` equal to the number in its "### Product" heading. Treat each product independently.
+{PRODUCT_FIELD_RULES}
+
+**Category List:**
+{CATEGORY_LIST}
+
+**Raw Product Texts:**
+"""
+
+
+def format_packed_products(raw_texts):
+    """Render raw texts as the indexed sections expected by PACKED_PRODUCT_GENERATION_PROMPT."""
+    return "\n\n".join(f"### Product {index}\n{text.strip()}" for index, text in enumerate(raw_texts))
+
+
+# Asks the model to regenerate only the fields of a product that failed validation.
+FIELD_REPAIR_PROMPT = """
+You are a product data specialist. A structured JSON product was generated from the raw Persian product description below, but some fields are invalid.
+
+**Rules:**
+1.  **JSON Only**: Your entire response must be a single, valid JSON object containing only these fields: {fields}.
+{rules}
+
+**Validation Errors:**
+{errors}
+
+**Current Product JSON:**
+{product}
 
 **Raw Product Text:**
-"""
\ No newline at end of file
+{raw_text}
+"""
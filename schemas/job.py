@@ -0,0 +1,26 @@
+from pydantic import BaseModel
+from typing import List, Optional
+from schemas.product import BatchItemResult
+
+# Returned when a job is submitted; poll /jobs/{job_id} with the id.
+class JobSubmissionResponse(BaseModel):
+    job_id: str
+    status: str
+    total: int
+
+# Progress of a job. "status" is one of: queued, running, completed.
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    created_at: float
+    total: int
+    succeeded: int
+    failed: int
+    running: int
+    pending: int
+
+# A page of finished items, by input index. Pass "next_after" as "after" to get the next page.
+class JobResultsResponse(BaseModel):
+    job_id: str
+    results: List[BatchItemResult]
+    next_after: Optional[int] = None
@@ -1,12 +1,109 @@
-from pydantic import BaseModel
-from typing import Dict, Any
+from pydantic import BaseModel, ConfigDict, Field, field_validator
+from typing import Dict, Any, List, Optional
 
 # This model defines the structure for the incoming request.
 # It expects a JSON object like: {"raw_text": "your product description"}
+# Set "bypass_cache" to true to force a fresh generation for this request.
 class ProductDescriptionRequest(BaseModel):
     raw_text: str
+    bypass_cache: bool = False
 
 # This model defines the structure for a successful response.
 # Since the output keys are dynamic, we use a flexible dictionary.
 class ProductJSONResponse(BaseModel):
-    data: Dict[str, Any]
\ No newline at end of file
+    data: Dict[str, Any]
+
+# Batch request: {"items": [{"raw_text": "..."}, {"raw_text": "..."}]}
+# Set "packed" to true to generate several products per Gemini call.
+class BatchProductDescriptionRequest(BaseModel):
+    items: List[ProductDescriptionRequest] = Field(..., min_length=1)
+    packed: bool = False
+
+# The outcome of one batch item. Exactly one of "data" or "error" is set.
+class BatchItemResult(BaseModel):
+    index: int
+    data: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+
+# Batch response with one result per input item, in input order.
+class BatchProductJSONResponse(BaseModel):
+    results: List[BatchItemResult]
+    succeeded: int
+    failed: int
+
+
+# Estimated package size in whole centimeters. Fractional values from the model are
+# rounded (to at least 1); zero or negative values are rejected.
+class PackagingDimensions(BaseModel):
+    length: int = Field(..., gt=0)
+    width: int = Field(..., gt=0)
+    height: int = Field(..., gt=0)
+
+    @field_validator("length", "width", "height", mode="before")
+    @classmethod
+    def round_to_centimeters(cls, value: Any) -> Any:
+        if isinstance(value, float) and value > 0:
+            return max(1, round(value))
+        return value
+
+# A fully post-processed product, as returned in ProductJSONResponse.data.
+# The fixed values are filled in locally; extra keys from the model are kept.
+class GeneratedProduct(BaseModel):
+    model_config = ConfigDict(extra="allow")
+
+    category_id: int = Field(..., ge=201, le=270)
+    name: str
+    description: str
+    price: int = Field(..., ge=1_000_000)
+    status: int = 2976
+    unit_type: int = 6304
+    package_weight: int = 200
+    weight: int = 100
+    packaging_dimensions: PackagingDimensions
+
+    @field_validator("name")
+    @classmethod
+    def name_has_three_words(cls, value: str) -> str:
+        if len(value.split()) < 3:
+            raise ValueError("name must be at least 3 words")
+        return value
+
+    @field_validator("description")
+    @classmethod
+    def description_has_25_words(cls, value: str) -> str:
+        if len(value.split()) < 25:
+            raise ValueError("description must be at least 25 words")
+        return value
+
+# The fields the model itself generates, as a Gemini response schema.
+# Fixed values and the Rial conversion are applied locally afterwards.
+PRODUCT_RESPONSE_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "category_id": {"type": "integer"},
+        "name": {"type": "string"},
+        "description": {"type": "string"},
+        "price": {"type": "integer"},
+        "price_currency": {"type": "string", "enum": ["toman", "rial"]},
+        "packaging_dimensions": {
+            "type": "object",
+            "properties": {
+                "length": {"type": "number"},
+                "width": {"type": "number"},
+                "height": {"type": "number"},
+            },
+            "required": ["length", "width", "height"],
+        },
+    },
+    "required": ["category_id", "name", "description", "price", "price_currency", "packaging_dimensions"],
+}
+
+# Packed responses: an array of products, each tagged with its input index.
+PACKED_PRODUCT_RESPONSE_SCHEMA = {
+    "type": "array",
+    "items": {
+        **PRODUCT_RESPONSE_SCHEMA,
+        "properties": {"index": {"type": "integer"}, **PRODUCT_RESPONSE_SCHEMA["properties"]},
+        "required": ["index", *PRODUCT_RESPONSE_SCHEMA["required"]],
+    },
+}
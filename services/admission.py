@@ -0,0 +1,239 @@
+import math
+import time
+import heapq
+import asyncio
+import itertools
+import contextlib
+from contextvars import Context, ContextVar, copy_context
+from typing import Awaitable, Dict, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+# Priority lanes, served lowest value first
+INTERACTIVE = 0
+BULK = 1
+LANES = {"interactive": INTERACTIVE, "bulk": BULK}
+
+# Deadline (time.monotonic() value) and lane of the request the current task works for.
+# Tasks copy these when they are created, so they follow a request into every helper task.
+_deadline: ContextVar[Optional[float]] = ContextVar("request_deadline", default=None)
+_priority: ContextVar[int] = ContextVar("request_priority", default=INTERACTIVE)
+
+
+class SharedLane:
+    """
+    The priority lane of work shared by several requests: the most urgent of their lanes.
+
+    When a more urgent request joins, the work is promoted, including the places it
+    already holds in admission queues.
+    """
+
+    def __init__(self, priority: int):
+        self.priority = priority
+        self._queued: List[Tuple["AdmissionController", list]] = []  # Admission queue entries of the work
+
+    def join(self, priority: int):
+        if priority >= self.priority:
+            return
+        self.priority = priority
+        for controller, entry in self._queued:
+            controller._move(entry, priority)
+
+
+# Set instead of _priority while a task works for several requests (see shared_work_context)
+_shared_lane: ContextVar[Optional[SharedLane]] = ContextVar("shared_lane", default=None)
+
+
+class DeadlineExceeded(Exception):
+    """The request's deadline passed before a result was ready."""
+    pass
+
+
+class Overloaded(Exception):
+    """The request was shed by admission control before any upstream work was done."""
+
+    def __init__(self, message: str, status_code: int, retry_after: float):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+
+
+@contextlib.contextmanager
+def request_context(timeout: Optional[float] = None, priority: int = INTERACTIVE):
+    """
+    Run the block with a deadline `timeout` seconds from now and the given priority lane.
+
+    A deadline inherited from an enclosing block is never extended. A timeout of None
+    (or 0) keeps the inherited deadline, if any.
+    """
+    deadline = _deadline.get()
+    if timeout:
+        own = time.monotonic() + timeout
+        deadline = own if deadline is None else min(deadline, own)
+    deadline_token = _deadline.set(deadline)
+    priority_token = _priority.set(priority)
+    shared_token = _shared_lane.set(None)
+    try:
+        yield
+    finally:
+        _shared_lane.reset(shared_token)
+        _priority.reset(priority_token)
+        _deadline.reset(deadline_token)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left until the current request's deadline, or None when it has none."""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def current_priority() -> int:
+    shared = _shared_lane.get()
+    return shared.priority if shared is not None else _priority.get()
+
+
+def shared_work_context() -> Tuple[Context, SharedLane]:
+    """
+    A copy of the current context for work that several requests will wait for.
+
+    The work has no deadline, since each request stops waiting at its own (see
+    with_deadline), and runs in a SharedLane starting at the current request's lane;
+    requests that join later call SharedLane.join with theirs.
+    """
+    lane = SharedLane(current_priority())
+    context = copy_context()
+    context.run(_deadline.set, None)
+    context.run(_shared_lane.set, lane)
+    return context, lane
+
+
+async def with_deadline(awaitable: Awaitable[T], what: str) -> T:
+    """Await `awaitable`, raising DeadlineExceeded if the request's deadline passes first."""
+    left = remaining()
+    if left is None:
+        return await awaitable
+    timeout = asyncio.timeout(max(left, 0))
+    try:
+        async with timeout:
+            return await awaitable
+    except TimeoutError:
+        if timeout.expired():
+            raise DeadlineExceeded(f"Deadline exceeded while {what}") from None
+        raise
+
+
+class AdmissionController:
+    """
+    Bounds concurrent upstream work and serves waiters by priority lane, then arrival order.
+
+    A request is shed before it queues when its lane's queue is full (429), or when the
+    queue wait, estimated from recent service times, would exceed its deadline (503).
+    A waiter whose deadline passes in the queue leaves it with DeadlineExceeded.
+    """
+
+    def __init__(self, capacity: int, max_queue: Dict[int, int], initial_service_time: float):
+        self.capacity = capacity
+        self.max_queue = max_queue  # Per lane, 0 means unbounded
+        self.service_time = initial_service_time  # Moving average of how long a slot is held
+        self.in_use = 0
+        self._waiters = []  # Heap of [priority, sequence, future]; cancelled futures are skipped
+        self._sequence = itertools.count()
+        self._queued = {lane: 0 for lane in LANES.values()}
+        self.stats = {
+            "admitted": 0,
+            "waited": 0,
+            "rejected_queue_full": 0,
+            "rejected_deadline": 0,
+            "expired_in_queue": 0,
+        }
+
+    def estimated_wait(self, priority: int) -> float:
+        """Expected queue wait for a new request in the given lane."""
+        if self.in_use < self.capacity:
+            return 0.0
+        ahead = sum(count for lane, count in self._queued.items() if lane <= priority)
+        return (ahead + 1) * self.service_time / self.capacity
+
+    @contextlib.asynccontextmanager
+    async def admit(self):
+        """Hold one unit of upstream capacity for the block, queueing or shedding as needed."""
+        priority = current_priority()
+        if self.in_use < self.capacity:
+            self.in_use += 1
+        else:
+            await self._wait_for_turn(priority)
+        self.stats["admitted"] += 1
+
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.service_time = 0.8 * self.service_time + 0.2 * (time.monotonic() - started)
+            self._release()
+
+    async def _wait_for_turn(self, priority: int):
+        wait = self.estimated_wait(priority)
+        limit = self.max_queue.get(priority, 0)
+        if limit and self._queued[priority] >= limit:
+            self.stats["rejected_queue_full"] += 1
+            raise Overloaded("Too many requests are queued, try again later", 429, wait)
+        left = remaining()
+        if left is not None and wait > left:
+            self.stats["rejected_deadline"] += 1
+            raise Overloaded(
+                f"Server is busy: expected wait {wait:.1f}s exceeds the {max(left, 0):.1f}s left", 503, wait
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._sequence), future]
+        heapq.heappush(self._waiters, entry)
+        self._queued[priority] += 1
+        self.stats["waited"] += 1
+        shared = _shared_lane.get()
+        if shared is not None:
+            shared._queued.append((self, entry))
+        try:
+            await with_deadline(future, "queued for an API key")
+        except BaseException as e:
+            if future.done() and not future.cancelled():
+                self._release()  # Our turn came just as we gave up: pass it on
+            else:
+                future.cancel()
+            if isinstance(e, DeadlineExceeded):
+                self.stats["expired_in_queue"] += 1
+            raise
+        finally:
+            self._queued[entry[0]] -= 1
+            if shared is not None:
+                shared._queued.remove((self, entry))
+
+    def _move(self, entry: list, priority: int):
+        """Move a queued waiter to another lane, keeping its arrival order."""
+        if entry[2].done():
+            return
+        self._queued[entry[0]] -= 1
+        self._queued[priority] += 1
+        entry[0] = priority
+        heapq.heapify(self._waiters)
+
+    def _release(self):
+        """Hand the released slot to the next live waiter, or return it to the pool."""
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.in_use -= 1
+
+    def status(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "in_use": self.in_use,
+            "queued": {name: self._queued[lane] for name, lane in LANES.items()},
+            "estimated_service_seconds": round(self.service_time, 3),
+            **self.stats,
+        }
+
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import hashlib
+import unicodedata
+from collections import OrderedDict
+from typing import Optional
+
+
+def normalize_text(raw_text: str) -> str:
+    """Normalize raw product text so trivially different copies share a cache key."""
+    text = unicodedata.normalize("NFC", raw_text or "")
+    return " ".join(text.split())
+
+
+def make_cache_key(raw_text: str, prompt: str, model_name: str) -> str:
+    """Build a content-addressed key from the normalized text, prompt version and model."""
+    prompt_version = hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:16]
+    payload = "\x1f".join([prompt_version, model_name, normalize_text(raw_text)])
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class MemoryLRUCache:
+    """A bounded in-process LRU cache of generated product dictionaries."""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+
+    def get(self, key: str) -> Optional[dict]:
+        value = self._entries.get(key)
+        if value is None:
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: dict):
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """A persistent cache tier backed by a local SQLite file, with per-entry TTL."""
+
+    def __init__(self, path: str, ttl_seconds: float):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS product_cache ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " expires_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> Optional[dict]:
+        row = self._conn.execute(
+            "SELECT value, expires_at FROM product_cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at < time.time():
+            self._conn.execute("DELETE FROM product_cache WHERE key = ?", (key,))
+            self._conn.commit()
+            return None
+        return json.loads(value)
+
+    def set(self, key: str, value: dict):
+        self._conn.execute(
+            "INSERT OR REPLACE INTO product_cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, json.dumps(value, ensure_ascii=False), time.time() + self.ttl_seconds),
+        )
+        self._conn.commit()
+
+    def purge_expired(self) -> int:
+        cursor = self._conn.execute("DELETE FROM product_cache WHERE expires_at < ?", (time.time(),))
+        self._conn.commit()
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        return self._conn.execute("SELECT COUNT(*) FROM product_cache").fetchone()[0]
+
+
+class ProductResultCache:
+    """
+    Two-tier cache in front of generate_product_json.
+
+    Lookups hit the in-process LRU first, then the optional SQLite tier. Disk hits are
+    promoted into memory. SQLite work runs in a thread so the event loop is not blocked.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.memory = MemoryLRUCache(int(os.getenv("CACHE_MAX_ENTRIES", "1024")))
+        db_path = os.getenv("CACHE_DB_PATH", "")
+        ttl_seconds = float(os.getenv("CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+        self.disk = SQLiteCache(db_path, ttl_seconds) if db_path else None
+        self._disk_lock = asyncio.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    async def get(self, key: str) -> Optional[dict]:
+        value = self.memory.get(key)
+        if value is not None:
+            self.memory_hits += 1
+            return value
+
+        if self.disk is not None:
+            async with self._disk_lock:
+                value = await asyncio.to_thread(self.disk.get, key)
+            if value is not None:
+                self.disk_hits += 1
+                self.memory.set(key, value)
+                return value
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: dict):
+        self.memory.set(key, value)
+        if self.disk is not None:
+            async with self._disk_lock:
+                await asyncio.to_thread(self.disk.set, key, value)
+
+    def stats(self) -> dict:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "memory_entries": len(self.memory),
+            "memory_max_entries": self.memory.max_entries,
+            "disk_enabled": self.disk is not None,
+            "disk_ttl_seconds": self.disk.ttl_seconds if self.disk is not None else None,
+            "hits": hits,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "bypassed": self.bypassed,
+            "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+        }
@@ -0,0 +1,177 @@
+import re
+from typing import Dict, List, Optional, Tuple
+from prompts import CATEGORY_LIST
+
+# Audience words used in category names, with the ways listings usually spell them
+AUDIENCE_SYNONYMS = {
+    "زنانه": ["زنانه", "زنونه", "خانم", "خانمها", "بانوان"],
+    "مردانه": ["مردانه", "مردونه", "آقایان", "آقا"],
+    "دخترانه": ["دخترانه", "دخترونه", "دختر", "دختربچه"],
+    "پسرانه": ["پسرانه", "پسرونه", "پسر", "پسربچه"],
+    "نوزادی": ["نوزادی", "نوزاد", "نوزادان", "سیسمونی"],
+}
+
+# Extra listing keywords for the garment words that appear in category names
+GARMENT_SYNONYMS = {
+    "تیشرت": ["تی شرت", "تیشرت"],
+    "پولوشرت": ["پولوشرت", "پولو"],
+    "شلوار": ["جین", "اسلش", "مام استایل"],
+    "ساپورت": ["لگ", "لگینگ"],
+    "کفش": ["کتونی", "بوت", "نیم بوت", "اسنیکر", "کالج", "پاشنه"],
+    "دمپایی": ["صندل", "سرپایی"],
+    "کیف": ["کوله", "کوله پشتی", "کیف دوشی", "کیف پول"],
+    "زیورآلات": ["گردنبند", "دستبند", "انگشتر", "گوشواره", "پابند", "سرویس طلا", "آویز"],
+    "اکسسوری": ["کمربند", "گیره", "کش مو", "تل مو", "بند عینک"],
+    "لباس زیر": ["شورت", "سوتین", "زیرپوش", "لباس زیر"],
+    "لباس راحتی": ["راحتی", "پیژامه", "ست راحتی"],
+    "خواب": ["لباس خواب", "پیژامه"],
+    "ژاکت": ["بافت", "کاردیگان", "پلیور"],
+    "کاپشن": ["پافر", "پفی", "بادگیر"],
+    "بارانی": ["ترنچ"],
+    "کت": ["بلیزر"],
+    "تاپ": ["نیم تنه", "کراپ"],
+    "چادر": ["مقنعه", "حجاب"],
+    "پوشش اسلامی": ["مقنعه"],
+    "لباس بارداری": ["بارداری", "حاملگی"],
+    "شالگردن": ["اسکارف"],
+    "سرهمی": ["اورال", "بادی"],
+    "ساعت": ["ساعت مچی"],
+}
+
+# Categories without an audience word in their name, and the audience they belong to
+_DEFAULT_AUDIENCE = "زنانه"
+
+_ARABIC_TO_PERSIAN = str.maketrans({"ي": "ی", "ى": "ی", "ك": "ک", "ة": "ه", "أ": "ا", "إ": "ا", "ؤ": "و"})
+_NON_LETTERS = re.compile(r"[^\u0600-\u06FFa-zA-Z]+")
+_DIACRITICS = re.compile(r"[\u064B-\u065F\u0670]")
+_CATEGORY_LINE = re.compile(r"^\* (\d+): (.+)$")
+
+
+def tokenize(text: str) -> List[str]:
+    """Normalize Persian text (letter variants, ZWNJ, diacritics) and split it into word tokens."""
+    text = text.translate(_ARABIC_TO_PERSIAN).replace("\u200c", " ")
+    text = _DIACRITICS.sub("", text)
+    return _NON_LETTERS.sub(" ", text).lower().split()
+
+
+class _PhraseTrie:
+    """A token-level trie that finds the longest known phrase at each position of a token list."""
+
+    def __init__(self):
+        self._root: Dict = {}
+
+    def add(self, phrase: str, value: str):
+        node = self._root
+        for token in tokenize(phrase):
+            node = node.setdefault(token, {})
+        node.setdefault(None, set()).add(value)
+
+    def find_all(self, tokens: List[str]) -> List[str]:
+        found = []
+        position = 0
+        while position < len(tokens):
+            node, step, match, match_length = self._root, position, None, 0
+            while step < len(tokens) and tokens[step] in node:
+                node = node[tokens[step]]
+                step += 1
+                if None in node:
+                    match, match_length = node[None], step - position
+            if match:
+                found.extend(match)
+                position += match_length
+            else:
+                position += 1
+        return found
+
+
+class CategoryClassifier:
+    """
+    Fast local pre-classifier that narrows the category list to a few candidates.
+
+    Category names from prompts.CATEGORY_LIST are split into an audience (زنانه, مردانه, ...)
+    and garment words (بلوز, شلوار, ...). Both are indexed in a phrase trie, together with
+    common listing synonyms. A listing is scored against each category by the garment
+    words it mentions (the first one counting most), then nudged by the audience it mentions.
+    """
+
+    def __init__(self, category_list: str = CATEGORY_LIST):
+        self.categories: Dict[int, str] = {}
+        self.category_lines: Dict[int, str] = {}
+        self.audience_of: Dict[int, str] = {}
+        self.garments_of: Dict[int, set] = {}
+        self._trie = _PhraseTrie()
+
+        for line in category_list.splitlines():
+            match = _CATEGORY_LINE.match(line.strip())
+            if not match:
+                continue
+            category_id, name = int(match.group(1)), match.group(2).strip()
+            self.categories[category_id] = name
+            self.category_lines[category_id] = line.strip()
+            self._index_category(category_id, name)
+
+        for audience, spellings in AUDIENCE_SYNONYMS.items():
+            for spelling in spellings:
+                self._trie.add(spelling, f"audience:{audience}")
+        for garment, spellings in GARMENT_SYNONYMS.items():
+            for spelling in spellings:
+                self._trie.add(spelling, f"garment:{' '.join(tokenize(garment))}")
+
+    def _index_category(self, category_id: int, name: str):
+        audience = next((a for a in AUDIENCE_SYNONYMS if name.endswith(a)), None)
+        garment_text = name[: -len(audience)].strip() if audience else name
+        self.audience_of[category_id] = audience or _DEFAULT_AUDIENCE
+
+        garments = set()
+        for part in re.split(r"[/،]| و ", garment_text):
+            part = " ".join(tokenize(part))
+            if not part:
+                continue
+            garments.add(part)
+            self._trie.add(part, f"garment:{part}")
+        self.garments_of[category_id] = garments
+
+    def rank(self, raw_text: str) -> List[Tuple[int, float]]:
+        """Score every category for the text; returns (category_id, score) best first."""
+        matches = self._trie.find_all(tokenize(raw_text))
+        garment_matches = [m.split(":", 1)[1] for m in matches if m.startswith("garment:")]
+        audiences = {m.split(":", 1)[1] for m in matches if m.startswith("audience:")}
+        # Listings usually open with the product type, so the first garment word counts more
+        garment_weights = {garment: 1.0 for garment in garment_matches}
+        if garment_matches:
+            garment_weights[garment_matches[0]] = 1.5
+
+        scores = []
+        for category_id, category_garments in self.garments_of.items():
+            garment_score = sum(garment_weights.get(garment, 0.0) for garment in category_garments)
+            if not garment_score:
+                continue
+            audience = self.audience_of[category_id]
+            if audience in audiences:
+                audience_score = 1.5
+            elif audiences:
+                audience_score = -1.0
+            else:
+                audience_score = 0.0
+            # Follow the prompt's rule of preferring زنانه over دخترانه when both fit
+            if audience == "زنانه":
+                audience_score += 0.1
+            scores.append((category_id, garment_score + audience_score))
+        scores.sort(key=lambda item: (-item[1], item[0]))
+        return scores
+
+    def candidates(self, raw_text: str, top_k: int, min_score: float) -> Optional[List[int]]:
+        """
+        The top-k category ids for the text, or None when confidence is too low.
+
+        Confidence is low when no garment word was recognized, or when the best score is
+        below `min_score`; callers should then fall back to the full category list.
+        """
+        ranked = self.rank(raw_text)
+        if not ranked or ranked[0][1] < min_score:
+            return None
+        return [category_id for category_id, _ in ranked[:top_k]]
+
+    def prompt_lines(self, category_ids: List[int]) -> List[str]:
+        """Category list lines for the given ids, in the original list order."""
+        return [self.category_lines[category_id] for category_id in sorted(category_ids)]
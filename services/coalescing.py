@@ -0,0 +1,63 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict
+from services.admission import SharedLane, current_priority, shared_work_context
+
+
+class _InFlightCall:
+    """A shared upstream call and the number of callers currently awaiting it."""
+
+    def __init__(self, task: asyncio.Task, lane: SharedLane):
+        self.task = task
+        self.lane = lane
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key into a single in-flight task.
+
+    The first caller for a key starts the work; later callers with the same key await
+    the same task. Results and exceptions are delivered to every waiter. A waiter that
+    is cancelled only stops waiting; the shared task is cancelled once nobody is left.
+
+    The task does not inherit the first caller's deadline: each caller bounds its own wait
+    (e.g. with admission.with_deadline). It runs in the most urgent priority lane among its
+    callers, and is promoted when a more urgent caller joins.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, _InFlightCall] = {}
+        self.started = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        call = self._calls.get(key)
+        if call is None:
+            context, lane = shared_work_context()
+            call = _InFlightCall(asyncio.get_running_loop().create_task(fn(), context=context), lane)
+            self._calls[key] = call
+            call.task.add_done_callback(lambda _task: self._forget(key, call))
+            self.started += 1
+        else:
+            call.lane.join(current_priority())
+            self.coalesced += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+                self._forget(key, call)
+
+    def _forget(self, key: str, call: _InFlightCall):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+
+    def stats(self) -> dict:
+        return {
+            "in_flight": len(self._calls),
+            "upstream_calls": self.started,
+            "coalesced_requests": self.coalesced,
+        }
@@ -0,0 +1,203 @@
+import os
+import time
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple
+from services.model_backends import ContextCacheFactory
+from services.rate_limiter import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# A cache this close to expiring is not used, so a request never races its expiry
+_EXPIRY_SAFETY_SECONDS = 30
+
+
+class _Entry:
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.cache = None
+        self.last_error = None
+        self.retry_at = 0.0  # time.time() after which a failed creation is retried
+        self.creating = False
+
+
+class ContextCachePool:
+    """
+    Keeps one static instruction registered as cached content for every key and model.
+
+    Cached content belongs to one API key and one model, so the pool holds one cache per
+    (key, model tier) pair, created with a TTL of CONTEXT_CACHE_TTL seconds (default 3600).
+    A background task checks them every CONTEXT_CACHE_CHECK_INTERVAL seconds (default 60)
+    and extends caches with less than CONTEXT_CACHE_REFRESH_MARGIN seconds (default 600)
+    left; a cache that is gone is created again. A cache that cannot be created (e.g. the
+    instruction is below the model's minimum cache size) is retried after
+    CONTEXT_CACHE_RETRY_SECONDS (default 600). Until a cache is ready, requests on that key
+    and model send the whole prompt.
+
+    CACHED_TOKEN_PRICE_RATIO (default 0.25, Gemini's discount) is the price of a cached
+    prompt token relative to a regular one; callers use cached_cost() to decide whether a
+    cached instruction is cheaper than a shorter uncached one.
+
+    Caching is on with CONTEXT_CACHE_ENABLED (default true) when the model backend supports
+    it. Each worker process keeps its own caches and deletes them on shutdown.
+    """
+
+    def __init__(self, factory: Optional[ContextCacheFactory], instruction: str, generation_config: dict):
+        self.factory = factory
+        self.instruction = instruction
+        self.generation_config = generation_config
+        self.enabled = factory is not None and os.getenv("CONTEXT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.ttl = float(os.getenv("CONTEXT_CACHE_TTL", "3600"))
+        self.refresh_margin = float(os.getenv("CONTEXT_CACHE_REFRESH_MARGIN", "600"))
+        self.check_interval = float(os.getenv("CONTEXT_CACHE_CHECK_INTERVAL", "60"))
+        self.retry_seconds = float(os.getenv("CONTEXT_CACHE_RETRY_SECONDS", "600"))
+        self.cached_token_price_ratio = float(os.getenv("CACHED_TOKEN_PRICE_RATIO", "0.25"))
+        self._entries: Dict[Tuple[int, str], _Entry] = {}
+        self._refresh_task = None
+        self.stats = {
+            "created": 0, "refreshed": 0, "create_failures": 0, "refresh_failures": 0, "invalidated": 0,
+            "cached_requests": 0, "full_prompt_requests": 0, "prompt_tokens": 0, "cached_tokens": 0,
+        }
+
+    def register(self, index: int, api_key: str, models: List[str]):
+        """Declare the key and models to keep caches for; prepare() creates them."""
+        if not self.enabled:
+            return
+        for model in models:
+            self._entries.setdefault((index, model), _Entry(api_key))
+
+    async def prepare(self):
+        """Create every missing cache that is due, concurrently, and wait for them."""
+        now = time.time()
+        due = [
+            (key, entry) for key, entry in self._entries.items()
+            if entry.cache is None and not entry.creating and entry.retry_at <= now
+        ]
+        await asyncio.gather(*(self._create(key, entry) for key, entry in due))
+
+    async def _create(self, key: Tuple[int, str], entry: _Entry):
+        index, model = key
+        entry.creating = True
+        try:
+            entry.cache = await asyncio.to_thread(
+                self.factory, entry.api_key, model, self.generation_config, self.instruction, self.ttl
+            )
+            entry.last_error = None
+            self.stats["created"] += 1
+            logger.info("Created context cache %s for key #%d and %s", entry.cache.name, index + 1, model)
+        except Exception as e:
+            entry.last_error = str(e)[:200]
+            entry.retry_at = time.time() + self.retry_seconds
+            self.stats["create_failures"] += 1
+            logger.warning("Could not create context cache for key #%d and %s: %s", index + 1, model, e)
+        finally:
+            entry.creating = False
+
+    async def _refresh(self, key: Tuple[int, str], entry: _Entry):
+        index, model = key
+        try:
+            await asyncio.to_thread(entry.cache.refresh, self.ttl)
+            self.stats["refreshed"] += 1
+        except Exception as e:
+            logger.warning("Could not refresh context cache for key #%d and %s: %s", index + 1, model, e)
+            self.stats["refresh_failures"] += 1
+            entry.cache = None  # Created again below
+            entry.last_error = str(e)[:200]
+
+    def ensure_refresh(self):
+        """Start the refresh loop on the running event loop, once."""
+        if not self.enabled or not self._entries:
+            return
+        loop = asyncio.get_running_loop()
+        task = self._refresh_task
+        if task is not None and not task.done() and task.get_loop() is loop:
+            return
+        self._refresh_task = loop.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            try:
+                now = time.time()
+                expiring = [
+                    (key, entry) for key, entry in self._entries.items()
+                    if entry.cache is not None and entry.cache.expires_at - now < self.refresh_margin
+                ]
+                await asyncio.gather(*(self._refresh(key, entry) for key, entry in expiring))
+                await self.prepare()
+            except Exception as e:
+                logger.warning("Context cache refresh failed: %s", e)
+            await asyncio.sleep(self.check_interval)
+
+    def ready(self, model: str) -> bool:
+        """Whether any key has a live cache for `model`."""
+        return any(
+            self._live(entry) for (_, entry_model), entry in self._entries.items() if entry_model == model
+        )
+
+    def cached_cost(self, instruction: str) -> float:
+        """What sending `instruction` from a cache costs, in regular prompt tokens."""
+        return estimate_tokens(instruction) * self.cached_token_price_ratio
+
+    @staticmethod
+    def _live(entry: _Entry) -> bool:
+        return entry.cache is not None and entry.cache.expires_at - time.time() >= _EXPIRY_SAFETY_SECONDS
+
+    def model_for(self, index: int, model: str, prefix: str):
+        """The cached model for a key and model if `prefix` is the cached instruction and it is live."""
+        if not self.enabled or prefix != self.instruction:
+            return None
+        entry = self._entries.get((index, model))
+        if entry is None or not self._live(entry):
+            return None
+        return entry.cache.model
+
+    def invalidate(self, index: int, model: str, reason: str):
+        """Stop using a cache the API no longer accepts; the refresh loop creates it again."""
+        entry = self._entries.get((index, model))
+        if entry is not None and entry.cache is not None:
+            logger.warning("Dropping context cache %s for key #%d and %s: %s", entry.cache.name, index + 1, model, reason)
+            entry.cache = None
+            entry.last_error = reason[:200]
+            self.stats["invalidated"] += 1
+
+    def record_usage(self, cached: bool, usage):
+        """Count a successful request and the prompt and cached tokens Gemini reported for it."""
+        self.stats["cached_requests" if cached else "full_prompt_requests"] += 1
+        if usage is not None:
+            self.stats["prompt_tokens"] += getattr(usage, "prompt_token_count", 0) or 0
+            self.stats["cached_tokens"] += getattr(usage, "cached_content_token_count", 0) or 0
+
+    async def close(self):
+        """Stop refreshing and delete the caches, which are billed for storage until they expire."""
+        if self._refresh_task is not None:
+            self._refresh_task.cancel()
+            self._refresh_task = None
+        caches = [entry.cache for entry in self._entries.values() if entry.cache is not None]
+        for entry in self._entries.values():
+            entry.cache = None
+        results = await asyncio.gather(*(asyncio.to_thread(cache.delete) for cache in caches), return_exceptions=True)
+        for cache, result in zip(caches, results):
+            if isinstance(result, Exception):
+                logger.warning("Could not delete context cache %s: %s", cache.name, result)
+
+    def status(self) -> dict:
+        now = time.time()
+        return {
+            "enabled": self.enabled,
+            "ttl_seconds": self.ttl,
+            "refresh_margin_seconds": self.refresh_margin,
+            "cached_token_price_ratio": self.cached_token_price_ratio,
+            "caches": [
+                {
+                    "key": index + 1,
+                    "model": model,
+                    "ready": entry.cache is not None,
+                    "expires_in_seconds": round(entry.cache.expires_at - now) if entry.cache is not None else None,
+                    "last_error": entry.last_error,
+                }
+                for (index, model), entry in sorted(self._entries.items())
+            ],
+            **self.stats,
+            "cached_token_ratio": round(self.stats["cached_tokens"] / self.stats["prompt_tokens"], 4)
+            if self.stats["prompt_tokens"] else 0.0,
+        }
@@ -0,0 +1,259 @@
+import os
+import re
+import math
+import json
+import time
+import random
+import asyncio
+from typing import Any, Dict, Optional, Tuple
+from google.api_core import exceptions as google_exceptions
+from schemas.product import PRODUCT_RESPONSE_SCHEMA
+from services.rate_limiter import estimate_tokens
+
+_CATEGORY_LINE = re.compile(r"^\* (\d+):", re.MULTILINE)
+_PACKED_ITEM = re.compile(r"^### Product \d+$", re.MULTILINE)
+
+FAULTS = ("429", "500", "empty", "malformed")
+
+# API keys whose fake connection is open (see FakeGeminiModel._connect)
+_CONNECTED_KEYS = set()
+
+_FAKE_DESCRIPTION = " ".join(
+    "این محصول نمونه برای آزمون بار سرویس تولید شده است و کیفیت دوخت و پارچه آن".split() * 2
+)
+
+
+class FakeProfile:
+    """
+    Latency distribution and fault rates of the fake backend.
+
+    Latency specs: "fixed:SECONDS", "uniform:MIN,MAX" or "lognormal:MEDIAN,SIGMA".
+    A tail of stragglers can be added with tail_rate/tail_seconds. Faults are
+    probabilities per call for each of FAULTS.
+    """
+
+    def __init__(self, latency: str = "lognormal:1.0,0.4", faults: Optional[Dict[str, float]] = None,
+                 tail_rate: float = 0.0, tail_seconds: float = 0.0):
+        self.latency = latency
+        self.kind, self.params = _parse_latency(latency)
+        self.faults = faults or {}
+        unknown = set(self.faults) - set(FAULTS)
+        if unknown:
+            raise ValueError(f"Unknown fake faults {sorted(unknown)}, expected some of {FAULTS}")
+        self.tail_rate = tail_rate
+        self.tail_seconds = tail_seconds
+
+    @classmethod
+    def from_env(cls) -> "FakeProfile":
+        """
+        Read FAKE_GEMINI_LATENCY, FAKE_GEMINI_FAULTS ("429=0.05,500=0.02,empty=0.01,malformed=0.02"),
+        FAKE_GEMINI_TAIL_RATE and FAKE_GEMINI_TAIL_SECONDS.
+        """
+        faults = {}
+        for item in filter(None, os.getenv("FAKE_GEMINI_FAULTS", "").split(",")):
+            name, _, rate = item.partition("=")
+            faults[name.strip()] = float(rate)
+        return cls(
+            latency=os.getenv("FAKE_GEMINI_LATENCY", "lognormal:1.0,0.4"),
+            faults=faults,
+            tail_rate=float(os.getenv("FAKE_GEMINI_TAIL_RATE", "0")),
+            tail_seconds=float(os.getenv("FAKE_GEMINI_TAIL_SECONDS", "0")),
+        )
+
+    def sample_latency(self) -> float:
+        if self.tail_rate and random.random() < self.tail_rate:
+            return self.tail_seconds
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return random.uniform(*self.params)
+        median, sigma = self.params
+        return random.lognormvariate(math.log(median), sigma)
+
+    def sample_fault(self) -> Optional[str]:
+        roll = random.random()
+        for fault in FAULTS:
+            roll -= self.faults.get(fault, 0.0)
+            if roll < 0:
+                return fault
+        return None
+
+    def describe(self) -> dict:
+        return {
+            "latency": self.latency,
+            "faults": dict(self.faults),
+            "tail_rate": self.tail_rate,
+            "tail_seconds": self.tail_seconds,
+        }
+
+
+def _parse_latency(spec: str) -> Tuple[str, Tuple[float, ...]]:
+    kind, _, args = spec.partition(":")
+    params = tuple(float(arg) for arg in args.split(",") if arg.strip())
+    expected = {"fixed": 1, "uniform": 2, "lognormal": 2}
+    if expected.get(kind) != len(params):
+        raise ValueError(f"Invalid fake latency spec {spec!r}")
+    return kind, params
+
+
+class _UsageMetadata:
+    def __init__(self, prompt_tokens: int, output_tokens: int, cached_tokens: int = 0):
+        self.prompt_token_count = prompt_tokens  # Includes the cached tokens, as with Gemini
+        self.cached_content_token_count = cached_tokens
+        self.candidates_token_count = output_tokens
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class _FakeResponse:
+    def __init__(self, text: str, prompt_tokens: int, cached_tokens: int = 0):
+        self.text = text
+        self.usage_metadata = _UsageMetadata(prompt_tokens, estimate_tokens(text) if text else 0, cached_tokens)
+
+
+class _FakeStream:
+    """Async iterator of response chunks, spread over the rest of the sampled latency."""
+
+    def __init__(self, text: str, prompt_tokens: int, seconds: float, chunk_chars: int, cached_tokens: int = 0):
+        self.chunks = [text[start:start + chunk_chars] for start in range(0, len(text), chunk_chars)]
+        self.prompt_tokens = prompt_tokens
+        self.cached_tokens = cached_tokens
+        self.delay = seconds / max(len(self.chunks), 1)
+
+    async def __aiter__(self):
+        for position, chunk in enumerate(self.chunks):
+            if position:
+                await asyncio.sleep(self.delay)
+            response = _FakeResponse(chunk, self.prompt_tokens, self.cached_tokens)
+            if position < len(self.chunks) - 1:
+                response.usage_metadata = None  # Only the last chunk reports usage, as Gemini does
+            yield response
+
+
+class _FakeTokenCount:
+    def __init__(self, total_tokens: int):
+        self.total_tokens = total_tokens
+
+
+class FakeGeminiModel:
+    """
+    Stands in for genai.GenerativeModel without network access.
+
+    Responses follow the response schema of each call (single, packed or field repair), so
+    they pass post-processing unless a fault is injected. Errors are raised as the same
+    google.api_core exceptions the real client raises.
+
+    FAKE_GEMINI_MODEL_LATENCY ("gemini-2.5-flash-lite=0.4,gemini-2.5-pro=2.5") scales the
+    sampled latency per model name, so model tiers can be told apart. The first call on
+    each API key also waits FAKE_GEMINI_CONNECT_SECONDS (default 0), like opening a
+    connection.
+
+    With stream=True the first chunk arrives after FAKE_GEMINI_FIRST_CHUNK_RATIO (default
+    0.2) of the sampled latency and the rest of the text follows in FAKE_GEMINI_CHUNK_CHARS
+    (default 40) character chunks over the remaining time.
+    """
+
+    def __init__(self, api_key: str, model_name: str, generation_config: Optional[dict], profile: FakeProfile,
+                 cached_instruction: str = ""):
+        self.api_key = api_key
+        self.model_name = model_name
+        self.generation_config = generation_config or {}
+        self.profile = profile
+        self.cached_instruction = cached_instruction  # Set on models created by FakeContextCache
+        scales = dict(item.split("=", 1) for item in filter(None, os.getenv("FAKE_GEMINI_MODEL_LATENCY", "").split(",")))
+        self.latency_scale = float(scales.get(model_name, 1.0))
+
+    async def _connect(self):
+        if self.api_key not in _CONNECTED_KEYS:
+            _CONNECTED_KEYS.add(self.api_key)
+            await asyncio.sleep(float(os.getenv("FAKE_GEMINI_CONNECT_SECONDS", "0")))
+
+    async def generate_content_async(self, prompt: str, generation_config: Optional[dict] = None,
+                                     stream: bool = False, **kwargs):
+        await self._connect()
+        latency = self.profile.sample_latency() * self.latency_scale
+        first_chunk = latency * float(os.getenv("FAKE_GEMINI_FIRST_CHUNK_RATIO", "0.2")) if stream else latency
+        await asyncio.sleep(first_chunk)
+        fault = self.profile.sample_fault()
+        if fault == "429":
+            raise google_exceptions.ResourceExhausted("Resource has been exhausted (e.g. check quota).")
+        if fault == "500":
+            raise google_exceptions.InternalServerError("An internal error has occurred.")
+
+        cached_tokens = estimate_tokens(self.cached_instruction) if self.cached_instruction else 0
+        if self.cached_instruction:
+            prompt = f"{self.cached_instruction}\n\n{prompt}"
+        prompt_tokens = estimate_tokens(prompt)
+        if fault == "empty":
+            return _FakeStream("", prompt_tokens, 0, 1) if stream else _FakeResponse("", prompt_tokens)
+
+        config = generation_config or self.generation_config
+        schema = config.get("response_schema") or PRODUCT_RESPONSE_SCHEMA
+        text = json.dumps(_fake_value("", schema, prompt), ensure_ascii=False)
+        if fault == "malformed":
+            text = text[: random.randint(1, max(1, len(text) - 1))]
+        if stream:
+            chunk_chars = int(os.getenv("FAKE_GEMINI_CHUNK_CHARS", "40"))
+            return _FakeStream(text, prompt_tokens, latency - first_chunk, chunk_chars, cached_tokens)
+        return _FakeResponse(text, prompt_tokens, cached_tokens)
+
+    async def count_tokens_async(self, contents: Any, **kwargs):
+        await self._connect()
+        return _FakeTokenCount(estimate_tokens(str(contents)))
+
+
+class FakeContextCache:
+    """
+    Stands in for Gemini cached content: its model prepends the instruction locally and
+    reports it as cached tokens. Creating one takes FAKE_GEMINI_CACHE_CREATE_SECONDS
+    (default 0.2), and FAKE_GEMINI_CACHE_MIN_TOKENS (default 0) rejects short instructions
+    like the real minimum cache size does.
+    """
+
+    def __init__(self, api_key: str, model_name: str, generation_config: dict, instruction: str,
+                 ttl_seconds: float):
+        time.sleep(float(os.getenv("FAKE_GEMINI_CACHE_CREATE_SECONDS", "0.2")))
+        min_tokens = int(os.getenv("FAKE_GEMINI_CACHE_MIN_TOKENS", "0"))
+        if estimate_tokens(instruction) < min_tokens:
+            raise google_exceptions.InvalidArgument(
+                f"Cached content is too small. total_token_count={estimate_tokens(instruction)}, min_total_token_count={min_tokens}"
+            )
+        self.name = f"cachedContents/fake-{random.getrandbits(48):012x}"
+        self.expires_at = time.time() + ttl_seconds
+        self.model = FakeGeminiModel(api_key, model_name, generation_config, FakeProfile.from_env(), instruction)
+
+    def refresh(self, ttl_seconds: float):
+        self.expires_at = time.time() + ttl_seconds
+
+    def delete(self):
+        pass
+
+
+def _fake_value(field: str, schema: dict, prompt: str) -> Any:
+    """A plausible value for a schema node, based on the field name where it matters."""
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: _fake_value(name, node, prompt) for name, node in schema.get("properties", {}).items()}
+    if kind == "array":
+        # A packed response (the top-level array, or a "products" member) has one product
+        # per "### Product" section of the prompt, each with its section's index
+        packed = field in ("", "products") and "index" in schema.get("items", {}).get("properties", {})
+        count = len(_PACKED_ITEM.findall(prompt)) if packed else 1
+        items = [_fake_value(field, schema.get("items", {}), prompt) for _ in range(max(count, 1))]
+        if packed:
+            for index, item in enumerate(items):
+                item["index"] = index
+        return items
+    if "enum" in schema:
+        return schema["enum"][0]
+    if field == "category_id":
+        match = _CATEGORY_LINE.search(prompt)
+        return int(match.group(1)) if match else 229
+    if field == "price":
+        return 250000
+    if field == "name":
+        return "محصول نمونه آزمایشی"
+    if field == "description":
+        return _FAKE_DESCRIPTION
+    if kind in ("integer", "number"):
+        return 10
+    return "نمونه"
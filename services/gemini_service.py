@@ -1,38 +1,288 @@
 import os
+import re
+import copy
 import json
+import math
 import time
 import asyncio
-import google.generativeai as genai
+import logging
+import contextlib
+from http import HTTPStatus
 from dotenv import load_dotenv
-from prompts import PRODUCT_GENERATION_PROMPT
-from typing import List, Optional
+from google.api_core import exceptions as google_exceptions
+from prompts import (
+    PRODUCT_GENERATION_PROMPT,
+    PACKED_PRODUCT_GENERATION_PROMPT,
+    PRODUCT_FIELD_RULES,
+    FIELD_REPAIR_PROMPT,
+    build_product_prompt,
+    format_packed_products,
+)
+from services.cache_service import ProductResultCache, make_cache_key
+from services.coalescing import SingleFlight
+from services.near_duplicate import NearDuplicateIndex
+from services.preprocessing import compact_listing, with_hints
+from services.category_classifier import CategoryClassifier
+from services.postprocessing import (
+    field_response_schema,
+    merge_fields,
+    normalize_price,
+    normalize_product,
+    parse_number,
+    repair_json,
+    validate_product,
+)
+from schemas.product import PRODUCT_RESPONSE_SCHEMA, PACKED_PRODUCT_RESPONSE_SCHEMA
+from services.admission import (
+    BULK,
+    INTERACTIVE,
+    AdmissionController,
+    DeadlineExceeded,
+    Overloaded,
+    current_priority,
+    remaining,
+    with_deadline,
+)
+from services.model_backends import ModelFactory, create_gemini_model, get_context_cache_factory, get_model_factory
+from services.model_router import ModelRouter
+from services.context_cache import ContextCachePool
+from services.key_state import create_key_state_backend, key_id, worker_id
+from services.hedging import HedgeBudget, LatencyTracker
+from services.json_stream import MEMBER, IncrementalObjectParser
+from services.metrics import registry
+from services.observability import span
+from services.rate_limiter import CircuitBreaker, TokenBucket, backoff_with_jitter, estimate_tokens
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 
 # Load environment variables from .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class GeminiException(Exception):
     """Custom exception for Gemini service errors."""
     pass
 
+class EmptyResponseError(Exception):
+    """Gemini answered without any text."""
+    pass
+
+class InvalidOutputError(GeminiException):
+    """The model's answer could not be turned into a valid product, even after field repair."""
+    pass
+
+# Prometheus metrics, rendered by /metrics (pool and cache state is collected at scrape time)
+UPSTREAM_REQUESTS = registry.counter(
+    "gemini_upstream_requests_total", "Upstream Gemini calls by key and outcome.", ["key", "outcome"]
+)
+UPSTREAM_LATENCY = registry.histogram(
+    "gemini_upstream_latency_seconds", "Latency of upstream Gemini calls that returned a response.", ["key"]
+)
+UPSTREAM_FIRST_CHUNK = registry.histogram(
+    "gemini_upstream_first_chunk_seconds", "Time to the first text chunk of streamed Gemini calls.", ["key"]
+)
+UPSTREAM_ERRORS = registry.counter(
+    "gemini_upstream_errors_total", "Failed upstream Gemini calls by key and error class.", ["key", "error_class"]
+)
+RETRIES = registry.counter(
+    "gemini_retries_total", "Repeated attempts within one failover call, by why the previous one failed.", ["reason"]
+)
+TOKENS = registry.counter(
+    "gemini_tokens_total", "Prompt and response tokens by key as reported by Gemini.", ["key", "kind"]
+)
+JSON_PARSE_FAILURES = registry.counter(
+    "gemini_json_parse_failures_total", "Model responses that were not valid JSON, by generation mode.", ["mode"]
+)
+PRODUCT_REQUESTS = registry.counter(
+    "product_generation_requests_total", "generate_product_json calls by outcome.", ["outcome"]
+)
+PRODUCT_LATENCY = registry.histogram(
+    "product_generation_seconds", "End-to-end generate_product_json latency by outcome.", ["outcome"]
+)
+
+class APIKeySlot:
+    """
+    One API key with its own client and a model instance per model tier, plus load and
+    health counters. Rate limits and the circuit breaker are per key, shared by its models.
+    """
+
+    def __init__(self, index: int, api_key: str, model_names: List[str], generation_config: dict,
+                 rpm_limit: int = 0, tpm_limit: int = 0, breaker: Optional[CircuitBreaker] = None,
+                 model_factory: ModelFactory = create_gemini_model):
+        self.index = index
+        self.api_key = api_key
+        self.key_id = key_id(api_key)
+        self.models = {name: model_factory(api_key, name, generation_config) for name in model_names}
+        self.model = self.models[model_names[0]]  # The default model
+        self.requests_bucket = TokenBucket(rpm_limit)
+        self.tokens_bucket = TokenBucket(tpm_limit)
+        self.breaker = breaker or CircuitBreaker(3, 1.0, 60.0)
+        self.in_flight = 0
+        self.total_requests = 0
+        self.total_failures = 0
+        self.total_tokens = 0
+        self.last_error = None
+        self.cooldown_until = 0.0  # Cooldown reported by other workers (time.monotonic())
+
+    def wait_time(self, prompt_tokens: int) -> float:
+        """Seconds until this key can accept a request of the given size."""
+        return max(
+            self.breaker.retry_in(),
+            self.cooldown_until - time.monotonic(),
+            self.requests_bucket.wait_time(1),
+            self.tokens_bucket.wait_time(prompt_tokens),
+        )
+
+    @property
+    def label(self) -> str:
+        return f"#{self.index + 1}"
+
+class _FailoverAttempts:
+    """
+    Key selection, retry accounting and backoff for one request, shared by the call and
+    stream failover loops: next_slot() reserves the key for the next attempt (or returns
+    None once every key has had its retries), and failed() records an attempt's error and
+    waits before the next one.
+    """
+
+    def __init__(self, manager: "GeminiAPIKeyManager", prompt_tokens: int):
+        self.manager = manager
+        self.prompt_tokens = prompt_tokens
+        self.attempts = 0
+        self.max_attempts = len(manager.slots) * manager.max_retries_per_key
+        self.failed_here = set()  # Keys that already failed for this request
+        self.last_error = None
+        self.retry_reason = None
+
+    async def next_slot(self) -> Optional[APIKeySlot]:
+        if self.attempts >= self.max_attempts:
+            return None
+        if len(self.failed_here) >= len(self.manager.slots):
+            self.failed_here.clear()
+        slot = await self.manager._acquire_slot(self.failed_here, self.prompt_tokens)
+        logger.debug("Attempt %d/%d with key %s", self.attempts + 1, self.max_attempts, slot.label)
+        if self.retry_reason is not None:
+            RETRIES.inc(reason=self.retry_reason)
+        return slot
+
+    async def failed(self, slot: APIKeySlot, error: Exception):
+        """
+        Record a failed attempt. Rate-limited keys are switched immediately; other errors
+        back off first, unless the deadline is closer.
+
+        Raises:
+            DeadlineExceeded: If the backoff would outlast the request's deadline.
+        """
+        self.attempts += 1
+        self.failed_here.add(slot.index)
+        self.last_error = error
+        if _is_rate_limit_error(error):
+            self.retry_reason = "rate_limited"
+            return
+        self.retry_reason = "error"
+        if self.attempts < self.max_attempts:
+            delay = backoff_with_jitter(self.manager.retry_delay, self.attempts - 1, self.manager.max_retry_delay)
+            left = remaining()
+            if left is not None and delay >= left:
+                raise DeadlineExceeded(
+                    f"Deadline exceeded after {self.attempts} attempts, last error: {self.last_error}"
+                )
+            await asyncio.sleep(delay)
+
+    def exhausted(self) -> GeminiException:
+        logger.error("Failed to get response after %d attempts, last error: %s", self.attempts, self.last_error)
+        return GeminiException(
+            f"Failed to get response after {self.attempts} attempts across {len(self.manager.slots)} API keys."
+        )
+
 class GeminiAPIKeyManager:
-    """Manages multiple Gemini API keys with automatic failover."""
+    """
+    Manages a pool of Gemini API keys, spreading concurrent requests across all healthy keys.
+
+    Each key has RPM/TPM token buckets, so requests wait for (or are routed to) free
+    capacity before they hit a 429, and a circuit breaker that takes a failing key out
+    of rotation and probes it again after an exponential, jittered backoff.
+    """
     
     def __init__(self):
         self.api_keys = self._load_api_keys()
-        self.current_key_index = 0
         self.max_retries_per_key = int(os.getenv("MAX_RETRIES_PER_KEY", "2"))
         self.retry_delay = float(os.getenv("RETRY_DELAY", "1"))
-        self.failed_keys = set()  # Track temporarily failed keys
-        self.model = None
+        self.max_retry_delay = float(os.getenv("MAX_RETRY_DELAY", "10"))
+        self.rpm_limit = int(os.getenv("KEY_RPM_LIMIT", "0"))  # 0 disables the limit
+        self.tpm_limit = int(os.getenv("KEY_TPM_LIMIT", "0"))
+        self.breaker_failure_threshold = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "3"))
+        self.breaker_base_backoff = float(os.getenv("BREAKER_BASE_BACKOFF", "2"))
+        self.breaker_max_backoff = float(os.getenv("BREAKER_MAX_BACKOFF", "120"))
+        self.invalid_keys = set()  # Keys whose client could not be created
+        
+        # Hedging: duplicate slow calls on another key (off by default, see _hedged_call)
+        self.hedge_enabled = os.getenv("HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+        self.hedge_percentile = float(os.getenv("HEDGE_PERCENTILE", "95"))
+        self.hedge_min_samples = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+        self.hedge_default_delay = float(os.getenv("HEDGE_DEFAULT_DELAY", "8"))
+        self.hedge_min_delay = float(os.getenv("HEDGE_MIN_DELAY", "0.5"))
+        self.hedge_budget = HedgeBudget(
+            ratio=float(os.getenv("HEDGE_BUDGET_RATIO", "0.1")),
+            burst=float(os.getenv("HEDGE_BUDGET_BURST", "10"))
+        )
+        self.hedge_stats = {"sent": 0, "won": 0, "over_budget": 0, "no_key": 0}
+        self.latency = LatencyTracker()
+        self.throttled_waits = 0
+        self.model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+        self.model_backend = os.getenv("MODEL_BACKEND", "gemini")  # "fake" for local load testing
+        # Model tiers and per-request routing between them (see services.model_router)
+        self.router = ModelRouter.from_env(self.model_name)
         self.generation_config = {
             "response_mime_type": "application/json",
         }
+        self._next_slot = 0  # Round-robin tie breaker between equally loaded keys
         
         if not self.api_keys:
             raise ValueError("No API keys found in .env file. Please set GOOGLE_API_KEYS.")
         
-        # Initialize with the first available key
-        self._initialize_model()
+        self.slots = self._initialize_slots()
+        
+        # The product instruction kept as cached content on every key and model (see services.context_cache)
+        self.context_cache = ContextCachePool(
+            get_context_cache_factory(self.model_backend), PRODUCT_GENERATION_PROMPT, self.generation_config
+        )
+        for slot in self.slots:
+            self.context_cache.register(slot.index, slot.api_key, list(slot.models))
+        self.warm_up_timeout = float(os.getenv("WARM_UP_TIMEOUT", "30"))
+        self.warm_up_status = None
+        
+        # Bounds how many batch items are generated at once, sized to the key pool
+        per_key = int(os.getenv("BATCH_CONCURRENCY_PER_KEY", "4"))
+        self.batch_concurrency = int(os.getenv("BATCH_CONCURRENCY", "0")) or len(self.slots) * per_key
+        self.batch_semaphore = asyncio.Semaphore(self.batch_concurrency)
+        
+        # Admission control: bounds concurrent upstream requests, interactive lane first
+        self.admission = AdmissionController(
+            capacity=int(os.getenv("ADMISSION_CONCURRENCY", "0")) or self.batch_concurrency,
+            max_queue={
+                INTERACTIVE: int(os.getenv("ADMISSION_MAX_QUEUE_INTERACTIVE", "100")),
+                BULK: int(os.getenv("ADMISSION_MAX_QUEUE_BULK", "0")),
+            },
+            initial_service_time=float(os.getenv("ADMISSION_INITIAL_SERVICE_SECONDS", "5"))
+        )
+        self._interactive_throttled = 0  # Interactive callers waiting for key capacity
+        
+        # Limits for packing several products into one call (see plan_packs)
+        self.pack_max_items = int(os.getenv("PACK_MAX_ITEMS", "8"))
+        self.pack_max_input_tokens = int(os.getenv("PACK_MAX_INPUT_TOKENS", "8000"))
+        self.pack_max_output_tokens = int(os.getenv("PACK_MAX_OUTPUT_TOKENS", "16000"))
+        self.pack_output_tokens_per_item = int(os.getenv("PACK_OUTPUT_TOKENS_PER_ITEM", "700"))
+        
+        # Key health and usage shared with other workers (see _sync_key_state)
+        self.key_state = create_key_state_backend()
+        self.worker_id = worker_id()
+        self.key_state_sync_interval = float(os.getenv("KEY_STATE_SYNC_INTERVAL", "1"))
+        self._pending_cooldowns = {}  # key_id -> (until, reason) not yet published
+        self._peer_usage = {}  # (worker, key_id) -> (requests, tokens) last seen
+        self._peer_snapshots = {}
+        self._key_state_task = None
+        self._key_state_wakeup = None
     
     def _load_api_keys(self) -> List[str]:
         """Load and parse API keys from environment variable."""
@@ -49,121 +299,638 @@ class GeminiAPIKeyManager:
         valid_keys = [key for key in keys if key and not key.startswith("YOUR_")]
         return valid_keys
     
-    def _initialize_model(self):
-        """Initialize the Gemini model with the current API key."""
-        if self.current_key_index >= len(self.api_keys):
-            raise GeminiException("All API keys have been exhausted.")
+    def _initialize_slots(self) -> List[APIKeySlot]:
+        """Create one client per API key, with a model instance for each model tier."""
+        model_factory = get_model_factory(self.model_backend)
+        model_names = [self.model_name] + [name for name in self.router.tiers if name != self.model_name]
+        slots = []
+        for index, api_key in enumerate(self.api_keys):
+            logger.info("Initializing %s model with API key #%d", self.model_backend, index + 1)
+            try:
+                breaker = CircuitBreaker(
+                    self.breaker_failure_threshold, self.breaker_base_backoff, self.breaker_max_backoff
+                )
+                slots.append(APIKeySlot(
+                    index, api_key, model_names, self.generation_config,
+                    rpm_limit=self.rpm_limit, tpm_limit=self.tpm_limit, breaker=breaker,
+                    model_factory=model_factory
+                ))
+            except Exception as e:
+                logger.error("Failed to initialize with key #%d: %s", index + 1, e)
+                self.invalid_keys.add(index)
         
-        current_key = self.api_keys[self.current_key_index]
-        print(f"Initializing Gemini with API key #{self.current_key_index + 1}")
+        if not slots:
+            raise GeminiException("No valid API keys available.")
+        return slots
+
+    @property
+    def failed_keys(self) -> set:
+        """Keys that are currently out of rotation (breaker not closed, cooling down elsewhere, or invalid)."""
+        now = time.monotonic()
+        open_keys = {
+            slot.index for slot in self.slots
+            if slot.breaker.state != CircuitBreaker.CLOSED or slot.cooldown_until > now
+        }
+        return open_keys | self.invalid_keys
+    
+    def _pick_slot(self, candidates: List[APIKeySlot]) -> APIKeySlot:
+        """Least outstanding requests first, round-robin between equally loaded keys."""
+        count = len(self.slots)
+        start = self._next_slot
+        return min(candidates, key=lambda s: (s.in_flight, (s.index - start) % count))
+    
+    def _try_acquire_slot(self, exclude: set, prompt_tokens: int, strict: bool = False) -> Optional[APIKeySlot]:
+        """
+        Reserve capacity on a ready key without waiting; returns None if no key is ready.
+
+        Keys in `exclude` are only used when no other key is ready, unless `strict` is set.
+        """
+        ready = [slot for slot in self.slots if slot.wait_time(prompt_tokens) == 0]
+        preferred = [slot for slot in ready if slot.index not in exclude]
+        candidates = preferred if strict else (preferred or ready)
+        if not candidates:
+            return None
         
+        slot = self._pick_slot(candidates)
+        self._next_slot = (slot.index + 1) % len(self.slots)
+        slot.breaker.on_attempt()
+        slot.requests_bucket.consume(1)
+        slot.tokens_bucket.consume(prompt_tokens)
+        slot.in_flight += 1
+        slot.total_requests += 1
+        slot.total_tokens += prompt_tokens
+        return slot
+    
+    async def _acquire_slot(self, exclude: set, prompt_tokens: int) -> APIKeySlot:
+        """
+        Reserve capacity on a key for one request, waiting if no key has capacity.
+
+        Keys in `exclude` already failed for the current request and are only used when no
+        other key is ready. Bulk callers also hold back while interactive callers are waiting
+        for capacity.
+
+        Raises:
+            DeadlineExceeded: If no key will have capacity before the request's deadline.
+        """
+        self._ensure_key_state_sync()
+        while True:
+            priority = current_priority()  # Shared work can be promoted while it waits
+            if priority == INTERACTIVE or not self._interactive_throttled:
+                slot = self._try_acquire_slot(exclude, prompt_tokens)
+                if slot is not None:
+                    return slot
+            
+            # No key has capacity right now: wait for the earliest one instead of hitting a 429
+            self.throttled_waits += 1
+            wait = min(slot.wait_time(prompt_tokens) for slot in self.slots)
+            left = remaining()
+            if left is not None and wait >= left:
+                raise DeadlineExceeded(f"No API key has capacity within the {max(left, 0):.1f}s left")
+            if priority == INTERACTIVE:
+                self._interactive_throttled += 1
+            try:
+                await asyncio.sleep(wait + 0.01)
+            finally:
+                if priority == INTERACTIVE:
+                    self._interactive_throttled -= 1
+    
+    def _release_slot(self, slot: APIKeySlot):
+        slot.in_flight -= 1
+    
+    def _slot_model(self, slot: APIKeySlot, model: str, prompt: str, cached_prompt: Optional[Tuple[str, str]]):
+        """
+        The model instance and contents to send on a key: the rest of `cached_prompt` when
+        the key has its instruction in the context cache, else `prompt`.
+
+        Returns (model instance, contents, whether the cache is used or None if not asked for).
+        """
+        if cached_prompt is None:
+            return slot.models[model], prompt, None
+        instruction, rest = cached_prompt
+        cached_model = self.context_cache.model_for(slot.index, model, instruction)
+        if cached_model is None:
+            return slot.models[model], prompt, False
+        return cached_model, rest, True
+
+    @contextlib.contextmanager
+    def _upstream_attempt(self, slot: APIKeySlot, model: str, cached: Optional[bool]):
+        """
+        Record the outcome of one request on a reserved key; always releases the key.
+
+        An error is recorded on the key's circuit breaker (opening it shares a cooldown with
+        the other workers) and re-raised. A cancelled or abandoned attempt is not counted
+        against the key. The block reports success with _record_success.
+        """
+        key = str(slot.index + 1)
         try:
-            genai.configure(api_key=current_key)
-            self.model = genai.GenerativeModel(
-                model_name="gemini-2.5-flash",
-                generation_config=self.generation_config
-            )
+            yield
+        except (asyncio.CancelledError, GeneratorExit):
+            slot.breaker.abandon_attempt()
+            UPSTREAM_REQUESTS.inc(key=key, outcome="cancelled")
+            raise
         except Exception as e:
-            print(f"Failed to initialize with key #{self.current_key_index + 1}: {e}")
-            self.failed_keys.add(self.current_key_index)
-            self.switch_to_next_key()
-    
-    def switch_to_next_key(self):
-        """Switch to the next available API key."""
-        self.current_key_index += 1
-        
-        # Skip any keys that are marked as failed
-        while self.current_key_index in self.failed_keys and self.current_key_index < len(self.api_keys):
-            self.current_key_index += 1
-        
-        if self.current_key_index >= len(self.api_keys):
-            # If we've exhausted all keys, reset and try again (keys might have recovered)
-            print("All keys exhausted. Resetting key rotation...")
-            self.current_key_index = 0
-            self.failed_keys.clear()  # Clear failed keys to retry them
+            slot.total_failures += 1
+            slot.last_error = str(e)[:200]
+            self.router.record_call(model, None)
+            if cached and _is_context_cache_error(e):
+                self.context_cache.invalidate(slot.index, model, str(e))
+            UPSTREAM_ERRORS.inc(key=key, error_class=type(e).__name__)
+            if _is_rate_limit_error(e):
+                logger.warning("Key %s hit rate limit: %s", slot.label, e, extra={"key": key})
+                UPSTREAM_REQUESTS.inc(key=key, outcome="rate_limited")
+                slot.breaker.record_failure(rate_limited=True, retry_after=_parse_retry_after(str(e)))
+            else:
+                logger.warning("Error with key %s: %s", slot.label, e, extra={"key": key})
+                UPSTREAM_REQUESTS.inc(key=key, outcome="empty" if isinstance(e, EmptyResponseError) else "error")
+                slot.breaker.record_failure()
+            if slot.breaker.state == CircuitBreaker.OPEN:
+                self._share_cooldown(slot)
+            raise
+        finally:
+            self._release_slot(slot)
+
+    def _record_success(self, slot: APIKeySlot, model: str, elapsed: float, response, prompt_tokens: int,
+                        cached: Optional[bool]):
+        """Record a successful request on a key: its health, latency and token usage."""
+        key = str(slot.index + 1)
+        logger.debug("Success with key %s", slot.label, extra={"key": key, "model": model, "seconds": round(elapsed, 3)})
+        slot.breaker.record_success()
+        self.latency.record(elapsed)
+        self.router.record_call(model, elapsed)
+        UPSTREAM_REQUESTS.inc(key=key, outcome="success")
+        UPSTREAM_LATENCY.observe(elapsed, key=key)
+        self._account_usage(slot, response, prompt_tokens, model, cached)
+
+    async def _call_slot(self, slot: APIKeySlot, prompt: str, generation_config: Optional[dict],
+                         prompt_tokens: int, model: str,
+                         cached_prompt: Optional[Tuple[str, str]] = None) -> str:
+        """
+        Send one request on a reserved key and update its health; always releases the key.
+
+        Raises the upstream error after recording it on the key's circuit breaker.
+        """
+        key = str(slot.index + 1)
+        started = time.monotonic()
+        instance, contents, cached = self._slot_model(slot, model, prompt, cached_prompt)
+        with self._upstream_attempt(slot, model, cached):
+            with span("gemini.upstream_call", key=key, model=model, prompt_tokens=prompt_tokens, context_cache=bool(cached)):
+                response = await instance.generate_content_async(contents, generation_config=generation_config)
+            if not (response and response.text):
+                raise EmptyResponseError("Empty response from API")
+            self._record_success(slot, model, time.monotonic() - started, response, prompt_tokens, cached)
+            return response.text
+    
+    async def _stream_slot(self, slot: APIKeySlot, prompt: str, generation_config: Optional[dict],
+                           prompt_tokens: int, model: str,
+                           cached_prompt: Optional[Tuple[str, str]] = None) -> AsyncIterator[str]:
+        """
+        Stream one request on a reserved key, yielding text chunks; always releases the key.
+
+        Health is recorded like in _call_slot once the stream ends. A consumer that stops
+        early abandons the attempt without counting it against the key.
+        """
+        key = str(slot.index + 1)
+        started = time.monotonic()
+        received = False
+        last_chunk = None
+        instance, contents, cached = self._slot_model(slot, model, prompt, cached_prompt)
+        with self._upstream_attempt(slot, model, cached):
+            with span("gemini.upstream_stream", key=key, model=model, prompt_tokens=prompt_tokens, context_cache=bool(cached)):
+                response = await instance.generate_content_async(
+                    contents, generation_config=generation_config, stream=True
+                )
+                async for chunk in response:
+                    last_chunk = chunk
+                    text = _chunk_text(chunk)
+                    if not text:
+                        continue
+                    if not received:
+                        received = True
+                        UPSTREAM_FIRST_CHUNK.observe(time.monotonic() - started, key=key)
+                    yield text
+            if not received:
+                raise EmptyResponseError("Empty response from API")
+            self._record_success(slot, model, time.monotonic() - started, last_chunk, prompt_tokens, cached)
+
+    async def warm_up(self):
+        """
+        Open every key's connection and create the context caches before the first request.
+
+        Each key's default model counts the tokens of a short text, which sets up its client
+        and connection without generating anything. Failures are logged and reported in
+        warm_up_status; the keys stay in rotation.
+        """
+        started = time.monotonic()
+
+        async def connect(slot: APIKeySlot) -> Optional[str]:
+            try:
+                await asyncio.wait_for(slot.model.count_tokens_async("warm-up"), timeout=self.warm_up_timeout)
+                return None
+            except Exception as e:
+                logger.warning("Warm-up of key %s failed: %s", slot.label, e)
+                return f"{type(e).__name__}: {str(e)[:200]}"
+
+        errors = await asyncio.gather(*(connect(slot) for slot in self.slots))
+        connected = time.monotonic()
+        try:
+            await asyncio.wait_for(self.context_cache.prepare(), timeout=self.warm_up_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Context caches not ready after %.0fs, continuing without the rest", self.warm_up_timeout)
+        self.context_cache.ensure_refresh()
+        self._ensure_key_state_sync()
+        self.warm_up_status = {
+            "connect_seconds": round(connected - started, 3),
+            "context_cache_seconds": round(time.monotonic() - connected, 3),
+            "keys_connected": errors.count(None),
+            "errors": {slot.label: error for slot, error in zip(self.slots, errors) if error is not None},
+        }
+        logger.info("Warmed up %d/%d keys", errors.count(None), len(self.slots), extra=self.warm_up_status)
+
+    def hedge_delay(self) -> float:
+        """How long to wait for the primary call before hedging: the configured latency percentile."""
+        if len(self.latency) < self.hedge_min_samples:
+            return self.hedge_default_delay
+        return max(self.hedge_min_delay, self.latency.percentile(self.hedge_percentile))
+    
+    def hedge_status(self) -> dict:
+        p = self.latency.percentile(self.hedge_percentile)
+        return {
+            "enabled": self.hedge_enabled,
+            "delay_seconds": round(self.hedge_delay(), 3),
+            f"p{self.hedge_percentile:g}_latency_seconds": round(p, 3) if p is not None else None,
+            "latency_samples": len(self.latency),
+            "budget_credits": round(self.hedge_budget.credits, 2),
+            **self.hedge_stats
+        }
+    
+    async def _hedged_call(self, slot: APIKeySlot, prompt: str, generation_config: Optional[dict],
+                           prompt_tokens: int, model: str,
+                           cached_prompt: Optional[Tuple[str, str]] = None) -> str:
+        """
+        Run the call on `slot`; if it is slower than hedge_delay(), race a duplicate on another key.
+
+        The first successful response wins and the other call is cancelled. If one call fails
+        the other is still awaited. The hedge budget caps how many duplicates are sent.
+        """
+        primary = asyncio.ensure_future(
+            self._call_slot(slot, prompt, generation_config, prompt_tokens, model, cached_prompt)
+        )
+        self.hedge_budget.earn()
+        pending = {primary}
+        try:
+            done, _ = await asyncio.wait(pending, timeout=self.hedge_delay())
+            if done:
+                return primary.result()
             
-            # If all keys are still failing after reset
-            if len(self.api_keys) == 0:
-                raise GeminiException("No valid API keys available.")
-        
-        self._initialize_model()
+            hedge = None
+            if self.hedge_budget.try_spend():
+                hedge_slot = self._try_acquire_slot({slot.index}, prompt_tokens, strict=True)
+                if hedge_slot is not None:
+                    logger.info("Key %s is slow, hedging on key %s", slot.label, hedge_slot.label)
+                    self.hedge_stats["sent"] += 1
+                    hedge = asyncio.ensure_future(
+                        self._call_slot(hedge_slot, prompt, generation_config, prompt_tokens, model, cached_prompt)
+                    )
+                    pending.add(hedge)
+                else:
+                    self.hedge_budget.refund()  # Nothing to hedge on
+                    self.hedge_stats["no_key"] += 1
+            else:
+                self.hedge_stats["over_budget"] += 1
+            
+            error = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.hedge_stats["won"] += 1
+                        return task.result()
+                    error = error or task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
     
-    async def generate_content_with_failover(self, prompt: str) -> str:
+    async def generate_content_with_failover(self, prompt: str, generation_config: Optional[dict] = None,
+                                             model: Optional[str] = None,
+                                             cached_prompt: Optional[Tuple[str, str]] = None) -> str:
         """
         Generate content with automatic key failover on failure.
         
+        Waits for admission in the current request's priority lane first. Every wait, call
+        and backoff is bounded by the current request's deadline (see services.admission).
+        
         Args:
             prompt: The prompt to send to Gemini API
+            generation_config: Optional per-call override of the model's generation config
+            model: The model tier to call (default: GEMINI_MODEL)
+            cached_prompt: Optional (instruction, rest): keys with the instruction in their
+                context cache send only `rest` instead of `prompt` (see services.context_cache)
             
         Returns:
             The response text from the API
             
         Raises:
             GeminiException: If all keys and retries are exhausted
+            Overloaded: If admission control sheds the request
+            DeadlineExceeded: If the deadline passes before a response arrives
         """
-        total_attempts = 0
-        max_total_attempts = len(self.api_keys) * self.max_retries_per_key
+        model = model or self.model_name
+        prompt_tokens = estimate_tokens(prompt)
+        attempts = _FailoverAttempts(self, prompt_tokens)
         
-        while total_attempts < max_total_attempts:
-            # Try with current key
-            for retry in range(self.max_retries_per_key):
-                try:
-                    print(f"Attempt {total_attempts + 1}/{max_total_attempts} with key #{self.current_key_index + 1}")
-                    
-                    if self.model is None:
-                        self._initialize_model()
-                    
-                    response = await self.model.generate_content_async(prompt)
-                    
-                    # Check if response is valid
-                    if response and response.text:
-                        print(f"Success with key #{self.current_key_index + 1}")
-                        return response.text
-                    else:
-                        print(f"Empty response from API with key #{self.current_key_index + 1}")
-                        raise Exception("Empty response from API")
-                    
-                except Exception as e:
-                    total_attempts += 1
-                    error_message = str(e).lower()
-                    
-                    # Check for quota/rate limit errors
-                    if any(keyword in error_message for keyword in ['quota', 'rate', 'limit', '429', '403']):
-                        print(f"Key #{self.current_key_index + 1} hit rate limit: {e}")
-                        self.failed_keys.add(self.current_key_index)
-                        break  # Switch to next key immediately
-                    
-                    # For other errors, retry with same key
-                    print(f"Error with key #{self.current_key_index + 1} (retry {retry + 1}/{self.max_retries_per_key}): {e}")
-                    
-                    if retry < self.max_retries_per_key - 1:
-                        await asyncio.sleep(self.retry_delay)
-                    else:
-                        # Mark this key as temporarily failed
-                        self.failed_keys.add(self.current_key_index)
+        with span("gemini.failover", model=model, prompt_tokens=prompt_tokens):
+            async with self.admission.admit():
+                while True:
+                    slot = await attempts.next_slot()
+                    if slot is None:
+                        break
+                    try:
+                        if self.hedge_enabled and len(self.slots) > 1:
+                            call = self._hedged_call(slot, prompt, generation_config, prompt_tokens, model, cached_prompt)
+                        else:
+                            call = self._call_slot(slot, prompt, generation_config, prompt_tokens, model, cached_prompt)
+                        return await with_deadline(call, "waiting for Gemini")
+                    except DeadlineExceeded:
+                        raise
+                    except Exception as e:
+                        await attempts.failed(slot, e)
+        
+        raise attempts.exhausted()
+
+    async def stream_content_with_failover(self, prompt: str, generation_config: Optional[dict] = None,
+                                           model: Optional[str] = None,
+                                           cached_prompt: Optional[Tuple[str, str]] = None) -> AsyncIterator[str]:
+        """
+        Stream generated text, failing over to another key until the first chunk arrives.
+        
+        Admission, key selection, backoff and deadlines work as in generate_content_with_failover,
+        and the admission slot is held until the stream ends. Once text has been yielded the
+        call stays on its key: a later error is raised to the caller, who has already used
+        part of the answer. Streamed calls are not hedged.
+        
+        Args:
+            prompt: The prompt to send to Gemini API
+            generation_config: Optional per-call override of the model's generation config
+            model: The model tier to call (default: GEMINI_MODEL)
+            cached_prompt: As for generate_content_with_failover
             
-            # Switch to next key if current key failed
-            if self.current_key_index < len(self.api_keys) - 1:
-                print(f"Switching from key #{self.current_key_index + 1} to next key...")
-                self.switch_to_next_key()
-            else:
-                # All keys exhausted, try resetting
-                print("All keys exhausted, attempting reset...")
-                self.current_key_index = 0
-                self.failed_keys.clear()
-                self._initialize_model()
-                
-                # If we've tried everything, raise exception
-                if total_attempts >= max_total_attempts - 1:
-                    break
-        
-        raise GeminiException(
-            f"Failed to get response after {total_attempts} attempts across {len(self.api_keys)} API keys."
-        )
+        Yields:
+            Chunks of the response text, in order
+            
+        Raises:
+            GeminiException: If all keys and retries are exhausted before the first chunk
+            Overloaded: If admission control sheds the request
+            DeadlineExceeded: If the deadline passes before the stream ends
+        """
+        model = model or self.model_name
+        prompt_tokens = estimate_tokens(prompt)
+        attempts = _FailoverAttempts(self, prompt_tokens)
+        
+        with span("gemini.stream_failover", model=model, prompt_tokens=prompt_tokens):
+            async with self.admission.admit():
+                while True:
+                    slot = await attempts.next_slot()
+                    if slot is None:
+                        break
+                    chunks = self._stream_slot(slot, prompt, generation_config, prompt_tokens, model, cached_prompt)
+                    try:
+                        first = await with_deadline(chunks.__anext__(), "waiting for Gemini")
+                    except DeadlineExceeded:
+                        raise
+                    except Exception as e:
+                        await attempts.failed(slot, e)
+                        continue
+                    
+                    try:
+                        yield first
+                        while True:
+                            try:
+                                chunk = await with_deadline(chunks.__anext__(), "streaming from Gemini")
+                            except StopAsyncIteration:
+                                return
+                            yield chunk
+                    finally:
+                        await chunks.aclose()
+        
+        raise attempts.exhausted()
+
+    def _account_usage(self, slot: APIKeySlot, response, prompt_tokens: int, model: str,
+                       cached: Optional[bool] = None):
+        """
+        Charge the key's TPM bucket with the difference between actual and estimated usage,
+        and count the tokens against the model tier (and the context cache, if it was asked for).
+        """
+        usage = getattr(response, "usage_metadata", None)
+        total_tokens = getattr(usage, "total_token_count", 0) if usage is not None else 0
+        key = str(slot.index + 1)
+        used_prompt = getattr(usage, "prompt_token_count", 0) or prompt_tokens
+        used_response = getattr(usage, "candidates_token_count", 0) or 0
+        TOKENS.inc(used_prompt, key=key, kind="prompt")
+        TOKENS.inc(used_response, key=key, kind="response")
+        self.router.record_tokens(model, used_prompt, used_response)
+        if cached is not None:
+            self.context_cache.record_usage(cached, usage)
+        if total_tokens:
+            slot.tokens_bucket.consume(total_tokens - prompt_tokens)
+            slot.total_tokens += total_tokens - prompt_tokens
+    
+    def _share_cooldown(self, slot: APIKeySlot):
+        """Queue an opened breaker's cooldown for publishing to the other workers."""
+        until = time.time() + slot.breaker.retry_in()
+        self._pending_cooldowns[slot.key_id] = (until, slot.last_error)
+        if self._key_state_wakeup is not None:
+            self._key_state_wakeup.set()
+    
+    def _ensure_key_state_sync(self):
+        """Start the key state sync loop on the running event loop, once."""
+        loop = asyncio.get_running_loop()
+        task = self._key_state_task
+        if task is not None and not task.done() and task.get_loop() is loop:
+            return
+        self._key_state_wakeup = asyncio.Event()
+        self._key_state_task = loop.create_task(self._sync_key_state())
+    
+    async def _sync_key_state(self):
+        """
+        Periodically exchange key state with the other workers through the shared backend.
+
+        Publishes this worker's cooldowns and counters, then adopts the cooldowns published
+        by others and charges the local RPM/TPM buckets with what others used since the last
+        sync, so the per-key limits hold across workers. A worker's usage from before it was
+        first seen is not charged. An opened breaker syncs right away.
+        """
+        while True:
+            self._key_state_wakeup.clear()
+            cooldowns, self._pending_cooldowns = self._pending_cooldowns, {}
+            try:
+                shared_cooldowns, workers = await asyncio.to_thread(
+                    self._exchange_key_state, cooldowns, self._worker_snapshot()
+                )
+                self._apply_key_state(shared_cooldowns, workers)
+            except Exception as e:
+                logger.warning("Key state sync with %s backend failed: %s", self.key_state.name, e)
+                # Publish these again next time
+                self._pending_cooldowns = {**cooldowns, **self._pending_cooldowns}
+            try:
+                await asyncio.wait_for(self._key_state_wakeup.wait(), timeout=self.key_state_sync_interval)
+            except asyncio.TimeoutError:
+                pass
+    
+    def _exchange_key_state(self, cooldowns: dict, snapshot: dict):
+        """Blocking backend round trip, run in a worker thread."""
+        for key, (until, reason) in cooldowns.items():
+            self.key_state.publish_cooldown(key, until, reason)
+        self.key_state.publish_worker(self.worker_id, snapshot)
+        return self.key_state.cooldowns(), self.key_state.workers()
+    
+    def _worker_snapshot(self) -> dict:
+        return {
+            "keys": {
+                slot.key_id: {
+                    "key": slot.index + 1,
+                    "in_flight": slot.in_flight,
+                    "total_requests": slot.total_requests,
+                    "total_tokens": slot.total_tokens,
+                    "total_failures": slot.total_failures,
+                    "breaker_state": slot.breaker.state,
+                    "last_error": slot.last_error,
+                }
+                for slot in self.slots
+            }
+        }
+    
+    def _apply_key_state(self, cooldowns: dict, workers: dict):
+        now, monotonic_now = time.time(), time.monotonic()
+        for slot in self.slots:
+            if slot.key_id in cooldowns:
+                until, _ = cooldowns[slot.key_id]
+                slot.cooldown_until = max(slot.cooldown_until, monotonic_now + until - now)
+        
+        by_key = {slot.key_id: slot for slot in self.slots}
+        for worker, snapshot in workers.items():
+            if worker == self.worker_id:
+                continue
+            for key, counters in snapshot.get("keys", {}).items():
+                slot = by_key.get(key)
+                if slot is None:
+                    continue
+                usage = (counters["total_requests"], counters["total_tokens"])
+                previous = self._peer_usage.get((worker, key))
+                self._peer_usage[(worker, key)] = usage
+                if previous is not None:
+                    slot.requests_bucket.consume(max(0, usage[0] - previous[0]))
+                    slot.tokens_bucket.consume(max(0, usage[1] - previous[1]))
+        self._peer_snapshots = {worker: snapshot for worker, snapshot in workers.items() if worker != self.worker_id}
+    
+    def shared_key_status(self) -> dict:
+        """
+        Merged per-key view across every worker that reported to the shared backend.
+
+        Other workers' counters are as of the last sync; this worker's are current.
+        """
+        snapshots = {**self._peer_snapshots, self.worker_id: self._worker_snapshot()}
+        monotonic_now = time.monotonic()
+        keys = []
+        for slot in self.slots:
+            reports = [s["keys"][slot.key_id] for s in snapshots.values() if slot.key_id in s.get("keys", {})]
+            keys.append({
+                "key": slot.index + 1,
+                "key_id": slot.key_id,
+                "in_flight": sum(report["in_flight"] for report in reports),
+                "total_requests": sum(report["total_requests"] for report in reports),
+                "total_tokens": sum(report["total_tokens"] for report in reports),
+                "total_failures": sum(report["total_failures"] for report in reports),
+                "open_on_workers": sum(report["breaker_state"] != CircuitBreaker.CLOSED for report in reports),
+                "cooldown_seconds": round(max(0.0, slot.cooldown_until - monotonic_now, slot.breaker.retry_in()), 2),
+            })
+        return {
+            "backend": self.key_state.name,
+            "worker_id": self.worker_id,
+            "workers": len(snapshots),
+            "keys": keys,
+        }
+
+    def key_status(self) -> List[dict]:
+        """Per-key load, capacity and circuit breaker information."""
+        return [
+            {
+                "key": slot.index + 1,
+                "healthy": slot.breaker.state == CircuitBreaker.CLOSED and slot.cooldown_until <= time.monotonic(),
+                "in_flight": slot.in_flight,
+                "total_requests": slot.total_requests,
+                "total_failures": slot.total_failures,
+                "requests_left": _finite(slot.requests_bucket.available()),
+                "tokens_left": _finite(slot.tokens_bucket.available()),
+                "breaker_state": slot.breaker.state,
+                "retry_in_seconds": round(slot.breaker.retry_in(), 2),
+                "shared_cooldown_seconds": round(max(0.0, slot.cooldown_until - time.monotonic()), 2),
+                "last_error": slot.last_error,
+            }
+            for slot in self.slots
+        ]
+
+def _is_rate_limit_error(error: Exception) -> bool:
+    """
+    Check for quota/rate limit errors by exception type and HTTP status, not message text
+    (words like "rate" also appear in ordinary errors, e.g. "GenerateContentRequest").
+    """
+    if isinstance(error, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests)):
+        return True
+    return isinstance(error, google_exceptions.GoogleAPICallError) and error.code == HTTPStatus.TOO_MANY_REQUESTS
+
+def _is_context_cache_error(error: Exception) -> bool:
+    """Whether the API rejected a request because its cached content is gone or invalid."""
+    error_message = str(error).lower()
+    return "cachedcontent" in error_message or "cached content" in error_message
+
+def _chunk_text(chunk) -> str:
+    """Text of one streamed chunk; chunks that only carry metadata have none."""
+    try:
+        return chunk.text or ""
+    except ValueError:
+        return ""
+
+def _parse_retry_after(error_message: str) -> Optional[float]:
+    """Extract the server-suggested retry delay from a quota error, if present."""
+    match = re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", error_message)
+    return float(match.group(1)) if match else None
+
+def _finite(value: float) -> Optional[int]:
+    """Render a bucket balance for JSON (None when the limit is disabled)."""
+    return None if math.isinf(value) else int(value)
 
 # Global instance of the key manager
 api_key_manager = None
 
+# Global result cache, shared by all requests in this process
+result_cache = ProductResultCache()
+
+# Reuses products of near-duplicate listings (in-process, see services.near_duplicate)
+near_duplicates = NearDuplicateIndex()
+
+# Coalesces concurrent generations of the same normalized text
+single_flight = SingleFlight()
+
+# Counters for the packed generation mode
+packing_stats = {"packs_sent": 0, "products_packed": 0, "products_rerun": 0}
+
+# Local pre-classifier that shrinks the category list sent with each prompt
+category_classifier = CategoryClassifier()
+classifier_enabled = os.getenv("CLASSIFIER_ENABLED", "true").lower() in ("1", "true", "yes")
+classifier_top_k = int(os.getenv("CLASSIFIER_TOP_K", "6"))
+classifier_min_score = float(os.getenv("CLASSIFIER_MIN_SCORE", "1.5"))
+classifier_stats = {"reduced": 0, "full_list": 0, "cached_instruction": 0, "prompt_tokens_saved": 0}
+
+# Input pre-processing: canonicalize and compact listings, and add parsed hints to prompts
+preprocessing_enabled = os.getenv("PREPROCESSING_ENABLED", "true").lower() in ("1", "true", "yes")
+preprocessing_stats = {"listings": 0, "raw_tokens": 0, "compact_tokens": 0, "hint_tokens": 0}
+
+# Local post-processing: regenerate only invalid fields, this many times at most
+field_repair_attempts = int(os.getenv("FIELD_REPAIR_ATTEMPTS", "2"))
+postprocessing_stats = {"invalid_json": 0, "field_regenerations": 0, "validation_failures": 0}
+
 def get_api_key_manager() -> GeminiAPIKeyManager:
     """Get or create the global API key manager instance."""
     global api_key_manager
@@ -171,41 +938,579 @@ def get_api_key_manager() -> GeminiAPIKeyManager:
         api_key_manager = GeminiAPIKeyManager()
     return api_key_manager
 
-async def generate_product_json(raw_text: str, max_retries: int = None) -> dict:
+async def warm_up() -> dict:
+    """
+    Build the key manager and warm up its keys at startup instead of on the first request.
+
+    Returns the warm-up timings, including how long building the clients took.
+    """
+    started = time.monotonic()
+    manager = get_api_key_manager()
+    built = time.monotonic() - started
+    await manager.warm_up()
+    manager.warm_up_status = {"build_seconds": round(built, 3), **manager.warm_up_status}
+    return manager.warm_up_status
+
+async def shut_down():
+    """Delete the context caches of the key manager, if it was built."""
+    if api_key_manager is not None:
+        await api_key_manager.context_cache.close()
+
+async def generate_product_json(raw_text: str, max_retries: int = None, bypass_cache: bool = False) -> dict:
     """
     Generates structured product JSON from raw text using the Gemini API with automatic failover.
 
+    Results are cached by a hash of the normalized text, the prompt version and the model name.
+    On a cache miss, the product of a near-duplicate listing is reused with the price taken
+    from this text (see services.near_duplicate). Otherwise the model tier is chosen per
+    request and output that fails validation is regenerated on a stronger tier (see
+    services.model_router).
+    The deadline and priority lane are taken from the caller's request_context().
+
     Args:
         raw_text: The raw product description text.
         max_retries: Deprecated parameter, kept for backward compatibility.
+        bypass_cache: Skip the cache lookup and force a fresh generation (the result is still stored).
 
     Returns:
         A dictionary containing the structured product data.
 
     Raises:
         GeminiException: If the API fails to return valid JSON after all keys and retries.
+        Overloaded: If admission control sheds the request.
+        DeadlineExceeded: If the request's deadline passes first.
     """
     # Get the key manager
     manager = get_api_key_manager()
-    
-    # Combine the main prompt with the user's raw text
-    full_prompt = f"{PRODUCT_GENERATION_PROMPT}\n\n{raw_text}"
+    with _product_request_metrics() as request:
+        raw_text = prepare_listing(raw_text)
+        cache_key = make_cache_key(raw_text, PRODUCT_GENERATION_PROMPT, manager.model_name)
+        cached = await _lookup_cache(cache_key, bypass_cache)
+        if cached is not None:
+            request["outcome"] = "cache_hit"
+            return copy.deepcopy(cached)
+        reused = await _reuse_near_duplicate(cache_key, raw_text, bypass_cache)
+        if reused is not None:
+            request["outcome"] = "near_duplicate"
+            return copy.deepcopy(reused)
+        
+        # Identical requests already in flight share one upstream call, which runs without
+        # a deadline in the most urgent lane among them; each caller stops waiting at its own
+        # deadline
+        product = await with_deadline(
+            single_flight.do(cache_key, lambda: _generate_and_cache(manager, raw_text, cache_key)),
+            "generating the product"
+        )
+        request["outcome"] = "generated"
+        return copy.deepcopy(product)
+
+async def stream_product_json(raw_text: str, bypass_cache: bool = False) -> AsyncIterator[tuple]:
+    """
+    Generates product JSON like generate_product_json, yielding parts as Gemini writes them.
+
+    The response is parsed while it streams: every top-level field is yielded as soon as
+    its value is complete (the price once its currency is known, converted to Rial), and
+    the description is yielded piece by piece. These early values are unvalidated; the
+    final "result" has gone through the same post-processing, field repair, escalation
+    and caching as generate_product_json and may differ from them. Streams are not coalesced.
+
+    Args:
+        raw_text: The raw product description text.
+        bypass_cache: Skip the cache lookup and force a fresh generation (the result is still stored).
+
+    Yields:
+        ("field", {"name", "value"}), ("delta", {"name": "description", "text"}) and
+        finally ("result", product). A cache hit yields its fields and the result at once.
+
+    Raises:
+        GeminiException: If generation fails, before or after the first event.
+        Overloaded: If admission control sheds the request.
+        DeadlineExceeded: If the request's deadline passes first.
+    """
+    manager = get_api_key_manager()
+    with _product_request_metrics() as request:
+        raw_text = prepare_listing(raw_text)
+        cache_key = make_cache_key(raw_text, PRODUCT_GENERATION_PROMPT, manager.model_name)
+        cached = await _lookup_cache(cache_key, bypass_cache)
+        if cached is not None:
+            request["outcome"] = "cache_hit"
+        else:
+            cached = await _reuse_near_duplicate(cache_key, raw_text, bypass_cache)
+            if cached is not None:
+                request["outcome"] = "near_duplicate"
+        if cached is not None:
+            product = copy.deepcopy(cached)
+            for name in ("category_id", "name", "price"):
+                yield "field", {"name": name, "value": product.get(name)}
+            yield "result", product
+            return
+        
+        model = route_model(manager, raw_text)
+        full_prompt, cached_prompt = product_prompt(manager, raw_text, model)
+        parser = IncrementalObjectParser(stream_keys=["description"])
+        members = {}
+        parts = []
+        try:
+            chunks = manager.stream_content_with_failover(
+                full_prompt, generation_config=_json_config(PRODUCT_RESPONSE_SCHEMA), model=model,
+                cached_prompt=cached_prompt
+            )
+            async for text in chunks:
+                parts.append(text)
+                for kind, name, value in parser.feed(text):
+                    if kind != MEMBER:
+                        yield "delta", {"name": name, "text": value}
+                        continue
+                    members[name] = value
+                    event = _streamed_field(name, members)
+                    if event is not None:
+                        yield "field", event
+            
+            product = await _finalize_or_escalate(manager, raw_text, full_prompt, cached_prompt, model, "".join(parts))
+            await _store_result(cache_key, raw_text, product)
+        except (DeadlineExceeded, Overloaded, GeminiException):
+            raise
+        except Exception as e:
+            logger.error("Failed to stream product JSON: %s", e)
+            raise GeminiException(f"Failed to generate product JSON: {str(e)}")
+        request["outcome"] = "generated"
+        yield "result", copy.deepcopy(product)
+
+def _streamed_field(name: str, members: dict) -> Optional[dict]:
+    """The field event for a newly completed top-level member, if it is shown before the result."""
+    if name == "description":
+        return None  # Already streamed piece by piece
+    if name in ("price", "price_currency"):
+        if "price" not in members or "price_currency" not in members:
+            return None
+        try:
+            return {"name": "price", "value": normalize_price(members["price"], members["price_currency"])}
+        except ValueError:
+            return None
+    if name == "category_id":
+        try:
+            return {"name": name, "value": parse_number(members[name])}
+        except ValueError:
+            return None
+    return {"name": name, "value": members[name]}
+
+@contextlib.contextmanager
+def _product_request_metrics():
+    """Count one product request and time it; the caller sets the "outcome" on success."""
+    started = time.monotonic()
+    request = {"outcome": "error"}
+    try:
+        yield request
+    except Overloaded:
+        request["outcome"] = "shed"
+        raise
+    except DeadlineExceeded:
+        request["outcome"] = "deadline_exceeded"
+        raise
+    except (asyncio.CancelledError, GeneratorExit):
+        request["outcome"] = "cancelled"
+        raise
+    finally:
+        PRODUCT_REQUESTS.inc(outcome=request["outcome"])
+        PRODUCT_LATENCY.observe(time.monotonic() - started, outcome=request["outcome"])
+
+def prepare_listing(raw_text: str) -> str:
+    """
+    Canonicalize and compact a raw listing before caching and prompt assembly.
+
+    Letter variants, digits, invisible characters, emoji runs, hashtags and whitespace are
+    normalized (see services.preprocessing), so copies that differ only in those share a
+    cache entry and cost fewer tokens. Estimated listing tokens before and after, and those
+    of the hints line added by _listing_prompt, are counted in preprocessing_stats.
+    """
+    if not preprocessing_enabled:
+        return raw_text
+    prepared = compact_listing(raw_text)
+    compact_tokens = estimate_tokens(prepared)
+    preprocessing_stats["listings"] += 1
+    preprocessing_stats["raw_tokens"] += estimate_tokens(raw_text)
+    preprocessing_stats["compact_tokens"] += compact_tokens
+    preprocessing_stats["hint_tokens"] += estimate_tokens(with_hints(prepared)) - compact_tokens
+    return prepared
+
+def _listing_prompt(raw_text: str) -> str:
+    """The listing as placed in a prompt: followed by its parsed price and size hints."""
+    return with_hints(raw_text) if preprocessing_enabled else raw_text
+
+def product_prompt(manager: GeminiAPIKeyManager, raw_text: str, model: str) -> Tuple[str, Optional[Tuple[str, str]]]:
+    """
+    The single-product prompt for a listing, narrowed to its likely categories, and its
+    cacheable form (PRODUCT_GENERATION_PROMPT, listing) or None.
+
+    The cacheable form is only returned when keys hold the full instruction in their
+    context cache for `model` and it is cheaper than the narrowed one: the full category
+    list billed at the cached token price (CACHED_TOKEN_PRICE_RATIO) usually is, although
+    more prompt tokens are processed. Keys without a ready cache then send the narrowed
+    prompt. Classifier savings are only counted when the narrowed prompt is chosen over
+    the cache.
+    """
+    listing = _listing_prompt(raw_text)
+    narrowed = narrow_product_prompt(raw_text)
+    instruction = narrowed or PRODUCT_GENERATION_PROMPT
+    cache = manager.context_cache
+    if cache.ready(model) and cache.cached_cost(PRODUCT_GENERATION_PROMPT) < estimate_tokens(instruction):
+        classifier_stats["cached_instruction"] += 1
+        return f"{instruction}\n\n{listing}", (PRODUCT_GENERATION_PROMPT, listing)
+    _record_prompt_choice(narrowed)
+    return f"{instruction}\n\n{listing}", None
+
+def route_model(manager: GeminiAPIKeyManager, raw_text: str) -> str:
+    """The model tier to generate a listing on, from its size and the pre-classifier's confidence."""
+    if not manager.router.enabled:
+        return manager.model_name
+    ranked = category_classifier.rank(raw_text) if classifier_enabled else []
+    return manager.router.route(estimate_tokens(raw_text), ranked[0][1] if ranked else None)
+
+def select_product_prompt(raw_text: str) -> str:
+    """
+    Return the product prompt with only the top-k likely categories.
+
+    Falls back to the full category list when the classifier is disabled or not confident.
+    """
+    narrowed = narrow_product_prompt(raw_text)
+    _record_prompt_choice(narrowed)
+    return narrowed or PRODUCT_GENERATION_PROMPT
+
+def narrow_product_prompt(raw_text: str) -> Optional[str]:
+    """The product prompt with only the top-k likely categories, or None when the classifier is disabled or not confident."""
+    if not classifier_enabled:
+        return None
+    candidates = category_classifier.candidates(raw_text, classifier_top_k, classifier_min_score)
+    if not candidates:
+        return None
+    return build_product_prompt(category_classifier.prompt_lines(candidates))
+
+def _record_prompt_choice(narrowed: Optional[str]):
+    """Count a prompt sent with the narrowed category list (and the tokens it saved) or the full one."""
+    if narrowed is None:
+        classifier_stats["full_list"] += 1
+        return
+    classifier_stats["reduced"] += 1
+    classifier_stats["prompt_tokens_saved"] += estimate_tokens(PRODUCT_GENERATION_PROMPT) - estimate_tokens(narrowed)
+
+async def _lookup_cache(cache_key: str, bypass_cache: bool) -> Optional[dict]:
+    """Return the cached product for a key, honouring the per-request bypass flag."""
+    if not result_cache.enabled:
+        return None
+    if bypass_cache:
+        result_cache.bypassed += 1
+        return None
+    return await result_cache.get(cache_key)
+
+async def _reuse_near_duplicate(cache_key: str, raw_text: str, bypass_cache: bool) -> Optional[dict]:
+    """Reuse the product of a near-duplicate listing with its price patched, caching it under this text."""
+    if bypass_cache:
+        return None
+    product = near_duplicates.find(raw_text)
+    if product is not None and result_cache.enabled:
+        await result_cache.set(cache_key, product)
+    return product
+
+async def _store_result(cache_key: str, raw_text: str, product: dict):
+    """Remember a freshly generated product in the result cache and the near-duplicate index."""
+    if result_cache.enabled:
+        await result_cache.set(cache_key, product)
+    near_duplicates.add(raw_text, product)
+
+async def _generate_and_cache(manager: GeminiAPIKeyManager, raw_text: str, cache_key: str) -> dict:
+    """Run one upstream generation, parse the JSON and store it in the result cache."""
+    model = route_model(manager, raw_text)
+    full_prompt, cached_prompt = product_prompt(manager, raw_text, model)
     
     try:
         # Use the manager to generate content with automatic failover
-        response_text = await manager.generate_content_with_failover(full_prompt)
+        response_text = await manager.generate_content_with_failover(
+            full_prompt, generation_config=_json_config(PRODUCT_RESPONSE_SCHEMA), model=model,
+            cached_prompt=cached_prompt
+        )
+        product = await _finalize_or_escalate(manager, raw_text, full_prompt, cached_prompt, model, response_text)
+
+        await _store_result(cache_key, raw_text, product)
+        return product
+    
+    except (DeadlineExceeded, Overloaded):
+        raise
+    except Exception as e:
+        logger.error("Failed to generate product JSON: %s", e)
+        raise GeminiException(f"Failed to generate product JSON: {str(e)}")
+
+def _json_config(response_schema: dict) -> dict:
+    """Generation config that makes Gemini answer with JSON matching the schema."""
+    return {"response_mime_type": "application/json", "response_schema": response_schema}
+
+async def _finalize_or_escalate(manager: GeminiAPIKeyManager, raw_text: str, prompt: str,
+                                cached_prompt: Optional[Tuple[str, str]], model: str, response_text: str) -> dict:
+    """
+    Validate a response generated on `model`; if it stays invalid, regenerate the product
+    on the next stronger tier until one passes or the strongest tier has failed.
+    """
+    while True:
+        try:
+            product = await _finalize_product(manager, raw_text, response_text, model)
+        except InvalidOutputError as e:
+            manager.router.record_output(model, valid=False)
+            stronger = manager.router.escalate(model)
+            if stronger is None:
+                raise
+            logger.info("Escalating from %s to %s after invalid output: %s", model, stronger, e)
+            model = stronger
+            response_text = await manager.generate_content_with_failover(
+                prompt, generation_config=_json_config(PRODUCT_RESPONSE_SCHEMA), model=model,
+                cached_prompt=cached_prompt
+            )
+            continue
+        manager.router.record_output(model, valid=True)
+        return product
+
+async def _finalize_product(manager: GeminiAPIKeyManager, raw_text: str, response_text: str,
+                            model: Optional[str] = None) -> dict:
+    """
+    Turn model output into a validated product.
+
+    Near-valid JSON is repaired, fixed fields and the Rial price are filled in locally, and
+    fields that still fail validation are regenerated on their own with the same model (up
+    to FIELD_REPAIR_ATTEMPTS times) instead of repeating the whole generation.
+
+    Raises:
+        InvalidOutputError: If the output is not JSON or still fails validation.
+    """
+    with span("product.parse"):
+        try:
+            raw_product = repair_json(response_text)
+        except ValueError as e:
+            # Log the first 500 chars for debugging
+            logger.warning("Failed to parse JSON response: %s", e, extra={"response_text": response_text[:500]})
+            postprocessing_stats["invalid_json"] += 1
+            JSON_PARSE_FAILURES.inc(mode="single")
+            raise InvalidOutputError("Invalid JSON response from Gemini API")
+        if not isinstance(raw_product, dict):
+            postprocessing_stats["invalid_json"] += 1
+            JSON_PARSE_FAILURES.inc(mode="single")
+            raise InvalidOutputError("Gemini API returned JSON that is not an object")
         
-        # Parse the JSON response
+        product, errors = validate_product(normalize_product(raw_product))
+    for attempt in range(field_repair_attempts):
+        if not errors:
+            break
+        fields = list(errors)
+        logger.info("Regenerating invalid fields %s (attempt %d/%d)", fields, attempt + 1, field_repair_attempts)
+        postprocessing_stats["field_regenerations"] += 1
+        repair_prompt = FIELD_REPAIR_PROMPT.format(
+            fields=", ".join(f"`{field}`" for field in fields),
+            rules=PRODUCT_FIELD_RULES,
+            errors="\n".join(f"* `{field}`: {message}" for field, message in errors.items()),
+            product=json.dumps(product, ensure_ascii=False),
+            raw_text=raw_text,
+        )
+        response_text = await manager.generate_content_with_failover(
+            repair_prompt, generation_config=_json_config(field_response_schema(fields)), model=model
+        )
         try:
-            return json.loads(response_text)
-        except json.JSONDecodeError as e:
-            print(f"Failed to parse JSON response: {e}")
-            print(f"Response text: {response_text[:500]}...")  # Log first 500 chars for debugging
-            raise GeminiException("Invalid JSON response from Gemini API")
-            
+            regenerated = repair_json(response_text)
+        except ValueError:
+            JSON_PARSE_FAILURES.inc(mode="field_repair")
+            continue
+        if isinstance(regenerated, dict):
+            raw_product = merge_fields(raw_product, regenerated, fields)
+            product, errors = validate_product(normalize_product(raw_product))
+    
+    if errors:
+        postprocessing_stats["validation_failures"] += 1
+        details = "; ".join(f"{field}: {message}" for field, message in errors.items())
+        raise InvalidOutputError(f"Generated product failed validation: {details}")
+    return product
+
+async def generate_product_json_batch(raw_texts: List[str], bypass_cache: Optional[List[bool]] = None) -> List[dict]:
+    """
+    Generates product JSON for many raw texts concurrently over the key pool.
+
+    Concurrency is bounded by the manager's batch semaphore, which is shared by all
+    batches in this process. A failing item never fails the batch.
+
+    Args:
+        raw_texts: The raw product description texts.
+        bypass_cache: Optional per-item flags to skip the cache lookup.
+
+    Returns:
+        One result per input, in input order: {"index", "data"} on success or
+        {"index", "error"} on failure.
+    """
+    manager = get_api_key_manager()
+    bypass_cache = bypass_cache or [False] * len(raw_texts)
+
+    async def run_item(index: int, raw_text: str) -> dict:
+        async with manager.batch_semaphore:
+            try:
+                data = await generate_product_json(raw_text, bypass_cache=bypass_cache[index])
+                return {"index": index, "data": data}
+            except Exception as e:
+                return {"index": index, "error": str(e)}
+
+    return await asyncio.gather(*(run_item(index, text) for index, text in enumerate(raw_texts)))
+
+async def generate_product_json_packed(raw_texts: List[str], bypass_cache: Optional[List[bool]] = None) -> List[dict]:
+    """
+    Generates product JSON for many raw texts, packing several products into each Gemini call.
+
+    The large static prompt is sent once per pack instead of once per product. Pack sizes
+    adapt to the input length (see plan_packs). Products that are missing or malformed in a
+    packed response are re-run one at a time with the single-product prompt. When admission
+    control sheds a pack or its deadline passes, its products fail without being re-run.
+
+    Args:
+        raw_texts: The raw product description texts.
+        bypass_cache: Optional per-item flags to skip the cache lookup.
+
+    Returns:
+        One result per input, in input order, in the same shape as generate_product_json_batch.
+    """
+    manager = get_api_key_manager()
+    bypass_cache = bypass_cache or [False] * len(raw_texts)
+    results = [None] * len(raw_texts)
+    raw_texts = [prepare_listing(text) for text in raw_texts]
+    cache_keys = [make_cache_key(text, PRODUCT_GENERATION_PROMPT, manager.model_name) for text in raw_texts]
+    
+    pending = []
+    for index, cache_key in enumerate(cache_keys):
+        cached = await _lookup_cache(cache_key, bypass_cache[index])
+        if cached is None:
+            cached = await _reuse_near_duplicate(cache_key, raw_texts[index], bypass_cache[index])
+        if cached is not None:
+            results[index] = {"index": index, "data": copy.deepcopy(cached)}
+        else:
+            pending.append(index)
+    
+    async def run_single(index: int):
+        async with manager.batch_semaphore:
+            try:
+                cache_key = cache_keys[index]
+                data = await with_deadline(
+                    single_flight.do(cache_key, lambda: _generate_and_cache(manager, raw_texts[index], cache_key)),
+                    "generating the product"
+                )
+                results[index] = {"index": index, "data": copy.deepcopy(data)}
+            except Exception as e:
+                results[index] = {"index": index, "error": str(e)}
+    
+    async def run_pack(indexes: List[int]):
+        if len(indexes) == 1:
+            await run_single(indexes[0])
+            return
+        async with manager.batch_semaphore:
+            try:
+                products = await _generate_pack(manager, [raw_texts[index] for index in indexes])
+            except (Overloaded, DeadlineExceeded) as e:
+                # Re-running the products one by one would only add load
+                for index in indexes:
+                    results[index] = {"index": index, "error": str(e)}
+                return
+        
+        reruns = []
+        for position, index in enumerate(indexes):
+            product = products.get(position)
+            if product is None:
+                reruns.append(index)
+                continue
+            await _store_result(cache_keys[index], raw_texts[index], product)
+            results[index] = {"index": index, "data": copy.deepcopy(product)}
+        
+        if reruns:
+            logger.info("Re-running %d/%d products missing from packed response", len(reruns), len(indexes))
+            packing_stats["products_rerun"] += len(reruns)
+            await asyncio.gather(*(run_single(index) for index in reruns))
+    
+    packs = plan_packs([raw_texts[index] for index in pending], manager)
+    await asyncio.gather(*(run_pack([pending[position] for position in pack]) for pack in packs))
+    return results
+
+def plan_packs(raw_texts: List[str], manager: GeminiAPIKeyManager) -> List[List[int]]:
+    """
+    Greedily group texts (by position) into packs that fit the context limits.
+
+    A pack is closed when adding the next text would exceed PACK_MAX_INPUT_TOKENS of raw
+    text, or when it holds as many products as the expected output fits in
+    PACK_MAX_OUTPUT_TOKENS (capped at PACK_MAX_ITEMS).
+    """
+    max_items = max(1, min(
+        manager.pack_max_items,
+        manager.pack_max_output_tokens // manager.pack_output_tokens_per_item
+    ))
+    packs, current, current_tokens = [], [], 0
+    for position, text in enumerate(raw_texts):
+        tokens = estimate_tokens(text)
+        if current and (len(current) >= max_items or current_tokens + tokens > manager.pack_max_input_tokens):
+            packs.append(current)
+            current, current_tokens = [], 0
+        current.append(position)
+        current_tokens += tokens
+    if current:
+        packs.append(current)
+    return packs
+
+async def _generate_pack(manager: GeminiAPIKeyManager, raw_texts: List[str]) -> Dict[int, dict]:
+    """
+    Run one packed generation and split the response back into products by index.
+
+    Returns only the products that came back valid after post-processing; a failed call
+    returns nothing, so every product in the pack is re-run individually. A pack is routed
+    like one listing of its combined size, on the least certain of its categories.
+
+    Raises:
+        Overloaded: If admission control sheds the call.
+        DeadlineExceeded: If the request's deadline passes first.
+    """
+    listings = [_listing_prompt(text) for text in raw_texts]
+    model = manager.model_name
+    if manager.router.enabled:
+        scores = []
+        for text in raw_texts:
+            ranked = category_classifier.rank(text) if classifier_enabled else []
+            scores.append(ranked[0][1] if ranked else None)
+        model = manager.router.route(
+            sum(estimate_tokens(text) for text in raw_texts),
+            None if None in scores else min(scores)
+        )
+    full_prompt = f"{PACKED_PRODUCT_GENERATION_PROMPT}\n\n{format_packed_products(listings)}"
+    packing_stats["packs_sent"] += 1
+    packing_stats["products_packed"] += len(raw_texts)
+    
+    try:
+        response_text = await manager.generate_content_with_failover(
+            full_prompt, generation_config=_json_config(PACKED_PRODUCT_RESPONSE_SCHEMA), model=model
+        )
+    except (Overloaded, DeadlineExceeded):
+        raise
     except Exception as e:
-        print(f"Failed to generate product JSON: {e}")
-        raise GeminiException(f"Failed to generate product JSON: {str(e)}")
+        logger.warning("Packed generation of %d products failed: %s", len(raw_texts), e)
+        return {}
+    try:
+        parsed = repair_json(response_text)
+    except ValueError as e:
+        logger.warning("Packed response of %d products is not valid JSON: %s", len(raw_texts), e)
+        JSON_PARSE_FAILURES.inc(mode="packed")
+        return {}
+    
+    if isinstance(parsed, dict):
+        parsed = parsed.get("products", [])
+    if not isinstance(parsed, list):
+        return {}
+    
+    products = {}
+    for item in parsed:
+        if not isinstance(item, dict) or not isinstance(item.get("index"), int):
+            continue
+        index = item.pop("index")
+        if not 0 <= index < len(raw_texts) or index in products:
+            continue
+        product, errors = validate_product(normalize_product(item))
+        if not errors:
+            products[index] = product
+    return products
 
 # Function to get API key status (useful for monitoring)
 def get_api_status() -> dict:
@@ -213,9 +1518,100 @@ def get_api_status() -> dict:
     manager = get_api_key_manager()
     return {
         "total_keys": len(manager.api_keys),
-        "current_key_index": manager.current_key_index + 1,
-        "failed_keys": list(manager.failed_keys),
+        "failed_keys": [index + 1 for index in sorted(manager.failed_keys)],
         "available_keys": len(manager.api_keys) - len(manager.failed_keys),
+        "keys": manager.key_status(),
+        "shared": manager.shared_key_status(),
         "max_retries_per_key": manager.max_retries_per_key,
-        "retry_delay": manager.retry_delay
-    }
\ No newline at end of file
+        "retry_delay": manager.retry_delay,
+        "rpm_limit": manager.rpm_limit,
+        "tpm_limit": manager.tpm_limit,
+        "throttled_waits": manager.throttled_waits,
+        "batch_concurrency": manager.batch_concurrency,
+        "hedging": manager.hedge_status(),
+        "routing": manager.router.status(),
+        "context_cache": manager.context_cache.status(),
+        "warm_up": manager.warm_up_status,
+        "admission": manager.admission.status(),
+        "packing": dict(packing_stats),
+        "postprocessing": dict(postprocessing_stats),
+        "classifier": {"enabled": classifier_enabled, "top_k": classifier_top_k, **classifier_stats},
+        "preprocessing": {
+            "enabled": preprocessing_enabled,
+            **preprocessing_stats,
+            "compaction_token_reduction": round(1 - preprocessing_stats["compact_tokens"] / preprocessing_stats["raw_tokens"], 4)
+            if preprocessing_stats["raw_tokens"] else 0.0,
+        },
+        "cache": result_cache.stats(),
+        "near_duplicates": near_duplicates.stats(),
+        "coalescing": single_flight.stats()
+    }
+
+def _collect_metrics():
+    """Scrape-time metric families for state kept in the manager, cache and stats dicts."""
+    manager = api_key_manager
+    if manager is not None:
+        keys = [{"key": str(slot.index + 1)} for slot in manager.slots]
+        yield ("gemini_key_in_flight", "gauge", "Requests currently running on each key.",
+               [("", labels, slot.in_flight) for labels, slot in zip(keys, manager.slots)])
+        yield ("gemini_key_available", "gauge", "1 if the key currently accepts requests, 0 if it is cooling down.",
+               [("", labels, 0 if slot.index in manager.failed_keys else 1) for labels, slot in zip(keys, manager.slots)])
+        routing = manager.router.status()["models"]
+        yield ("gemini_model_routes_total", "counter", "Generations started on each model tier, by reason.",
+               [("", {"model": model, "reason": reason}, count)
+                for model, tier in routing.items() for reason, count in tier["routed"].items()])
+        yield ("gemini_model_escalations_total", "counter", "Generations escalated from each model tier after invalid output.",
+               [("", {"model": model}, tier["escalated_from"]) for model, tier in routing.items()])
+        yield ("gemini_model_tokens_total", "counter", "Prompt and response tokens by model tier.",
+               [("", {"model": model, "kind": kind}, tier[f"{kind}_tokens"])
+                for model, tier in routing.items() for kind in ("prompt", "response")])
+        yield ("gemini_model_cost_usd_total", "counter", "Estimated spend by model tier at list prices.",
+               [("", {"model": model}, tier["estimated_cost_usd"])
+                for model, tier in routing.items() if tier["estimated_cost_usd"] is not None])
+        context_cache = manager.context_cache.status()
+        yield ("gemini_context_caches_ready", "gauge", "Context caches currently usable, out of one per key and model.",
+               [("", {}, sum(1 for cache in context_cache["caches"] if cache["ready"]))])
+        yield ("gemini_context_cache_requests_total", "counter", "Product requests by whether they used a context cache.",
+               [("", {"cached": "true"}, context_cache["cached_requests"]),
+                ("", {"cached": "false"}, context_cache["full_prompt_requests"])])
+        yield ("gemini_context_cache_tokens_total", "counter", "Prompt tokens of product requests, and how many were served from the cache.",
+               [("", {"kind": "prompt"}, context_cache["prompt_tokens"]),
+                ("", {"kind": "cached"}, context_cache["cached_tokens"])])
+        yield ("gemini_throttled_waits_total", "counter", "Requests that waited for a key's rate limit.",
+               [("", {}, manager.throttled_waits)])
+        hedging = manager.hedge_stats
+        yield ("gemini_hedges_total", "counter", "Hedged requests by result.",
+               [("", {"result": result}, count) for result, count in hedging.items()])
+        admission = manager.admission.status()
+        yield ("admission_in_use", "gauge", "Admitted requests currently holding an upstream slot.",
+               [("", {}, admission["in_use"])])
+        yield ("admission_queued", "gauge", "Requests waiting for admission by lane.",
+               [("", {"lane": lane}, count) for lane, count in admission["queued"].items()])
+        yield ("admission_rejected_total", "counter", "Requests shed by admission control by reason.",
+               [("", {"reason": "queue_full"}, admission["rejected_queue_full"]),
+                ("", {"reason": "deadline"}, admission["rejected_deadline"]),
+                ("", {"reason": "expired_in_queue"}, admission["expired_in_queue"])])
+    cache = result_cache.stats()
+    yield ("product_cache_lookups_total", "counter", "Result cache lookups by result.",
+           [("", {"result": "memory_hit"}, cache["memory_hits"]), ("", {"result": "disk_hit"}, cache["disk_hits"]),
+            ("", {"result": "miss"}, cache["misses"]), ("", {"result": "bypassed"}, cache["bypassed"])])
+    reuse = near_duplicates.stats()
+    yield ("product_near_duplicate_lookups_total", "counter", "Near-duplicate index lookups after an exact cache miss.",
+           [("", {}, reuse["lookups"])])
+    yield ("product_near_duplicate_reused_total", "counter", "Products reused from a near-duplicate listing.",
+           [("", {}, reuse["reused"])])
+    yield ("product_near_duplicate_entries", "gauge", "Products in the near-duplicate index.",
+           [("", {}, reuse["entries"])])
+    coalescing = single_flight.stats()
+    yield ("product_coalesced_requests_total", "counter", "Requests that shared an identical in-flight generation.",
+           [("", {}, coalescing["coalesced_requests"])])
+    yield ("product_packed_total", "counter", "Packed generation counters.",
+           [("", {"kind": kind}, count) for kind, count in packing_stats.items()])
+    yield ("product_postprocessing_total", "counter", "Local post-processing events.",
+           [("", {"kind": kind}, count) for kind, count in postprocessing_stats.items()])
+    yield ("product_listing_tokens_total", "counter", "Estimated listing tokens before and after pre-processing.",
+           [("", {"stage": stage}, preprocessing_stats[f"{stage}_tokens"]) for stage in ("raw", "compact", "hint")])
+    yield ("classifier_prompt_tokens_saved_total", "counter", "Prompt tokens saved by narrowing the category list.",
+           [("", {}, classifier_stats["prompt_tokens_saved"])])
+
+registry.add_collector(_collect_metrics)
@@ -0,0 +1,57 @@
+import logging
+from typing import Dict
+import google.generativeai as genai
+from google.generativeai import caching
+from google.generativeai import client as genai_client
+
+logger = logging.getLogger(__name__)
+
+# Every use of private google-generativeai internals goes through this module.
+#
+# The SDK keeps one process-wide API key: genai.configure() replaces the client of every
+# model, and caching.CachedContent always goes through that global client. Serving many
+# keys concurrently from one process needs a client per key, which the SDK has no public
+# way to create or attach. So each key gets its own private _ClientManager, and models and
+# cached content are pointed at its clients directly.
+#
+# These internals can change in any release (the SDK is deprecated in favour of
+# google-genai), so requirements.txt pins the version they were written against. Check
+# each function below before changing that pin.
+SUPPORTED_VERSION = "0.8.6"
+
+if genai.__version__ != SUPPORTED_VERSION:
+    logger.warning(
+        "google-generativeai %s is installed, but the Gemini backend was written against %s",
+        genai.__version__, SUPPORTED_VERSION
+    )
+
+# One client manager per API key, shared by the models (tiers) and caches of that key
+_CLIENT_MANAGERS: Dict[str, object] = {}
+
+
+def _client_manager(api_key: str):
+    if api_key not in _CLIENT_MANAGERS:
+        client_manager = genai_client._ClientManager()
+        client_manager.configure(api_key=api_key)
+        _CLIENT_MANAGERS[api_key] = client_manager
+    return _CLIENT_MANAGERS[api_key]
+
+
+def bind_to_key(model: genai.GenerativeModel, api_key: str) -> genai.GenerativeModel:
+    """Make a model send its requests with the key's own client."""
+    model._async_client = _client_manager(api_key).get_default_client("generative_async")
+    return model
+
+
+def cache_client(api_key: str):
+    """The key's own CacheServiceClient."""
+    return _client_manager(api_key).get_default_client("cache")
+
+
+def create_cached_content(api_key: str, model_name: str, instruction: str, ttl_seconds: int) -> caching.CachedContent:
+    """Create cached content holding `instruction` as the system instruction, with the key's own client."""
+    request = caching.CachedContent._prepare_create_request(
+        model=model_name, display_name="product-generation-prompt",
+        system_instruction=instruction, ttl=ttl_seconds
+    )
+    return caching.CachedContent._from_obj(cache_client(api_key).create_cached_content(request))
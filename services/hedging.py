@@ -0,0 +1,51 @@
+import math
+from collections import deque
+from typing import Optional
+
+
+class LatencyTracker:
+    """Keeps a sliding window of recent upstream latencies and reports percentiles."""
+
+    def __init__(self, window: int = 500):
+        self._samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, percent: float) -> Optional[float]:
+        """Nearest-rank percentile of the window, or None when it is empty."""
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        rank = max(1, math.ceil(percent / 100 * len(ordered)))
+        return ordered[rank - 1]
+
+
+class HedgeBudget:
+    """
+    Caps hedged requests to a fraction of primary requests.
+
+    Every primary request earns `ratio` credits (up to `burst`), and every hedge spends one,
+    so over time at most `ratio` extra upstream calls are made per request.
+    """
+
+    def __init__(self, ratio: float, burst: float):
+        self.ratio = ratio
+        self.burst = burst
+        self.credits = burst
+
+    def earn(self):
+        self.credits = min(self.burst, self.credits + self.ratio)
+
+    def refund(self):
+        """Return a credit that was spent on a hedge that could not be sent."""
+        self.credits = min(self.burst, self.credits + 1)
+
+    def try_spend(self) -> bool:
+        if self.credits >= 1:
+            self.credits -= 1
+            return True
+        return False
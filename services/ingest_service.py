@@ -0,0 +1,124 @@
+import os
+import json
+import asyncio
+import tempfile
+from typing import AsyncIterator, Optional
+from services.admission import BULK, request_context
+from services.gemini_service import generate_product_json, get_api_key_manager
+
+# Marks the end of the result stream
+_DONE = object()
+
+
+def parse_listing_line(line: str) -> dict:
+    """
+    Parse one JSONL line into generate_product_json arguments.
+
+    A line is either an object with "raw_text" (and optionally "bypass_cache")
+    or a bare JSON string holding the raw text.
+    """
+    item = json.loads(line)
+    if isinstance(item, str):
+        return {"raw_text": item, "bypass_cache": False}
+    if isinstance(item, dict) and isinstance(item.get("raw_text"), str):
+        return {"raw_text": item["raw_text"], "bypass_cache": bool(item.get("bypass_cache", False))}
+    raise ValueError("Line must be a JSON string or an object with a 'raw_text' string")
+
+
+async def spool_to_file(chunks: AsyncIterator[bytes]) -> str:
+    """
+    Write an uploaded body to a temporary file and return its path.
+
+    The request body cannot be read while a streaming response is being sent (both
+    compete for the ASGI receive channel), so uploads are spooled to disk first. This
+    keeps memory use constant regardless of the upload size.
+    """
+    handle = tempfile.NamedTemporaryFile(prefix="ingest-", suffix=".jsonl", delete=False)
+    try:
+        async for chunk in chunks:
+            await asyncio.to_thread(handle.write, chunk)
+    except BaseException:
+        handle.close()
+        os.unlink(handle.name)
+        raise
+    handle.close()
+    return handle.name
+
+
+async def iter_file_lines(path: str, delete: bool = False) -> AsyncIterator[str]:
+    """Read a text file line by line in a worker thread, optionally deleting it afterwards."""
+    try:
+        with open(path, "r", encoding="utf-8") as handle:
+            while True:
+                line = await asyncio.to_thread(handle.readline)
+                if not line:
+                    break
+                yield line.rstrip("\n")
+    finally:
+        if delete:
+            os.unlink(path)
+
+
+async def stream_generation_results(
+    lines: AsyncIterator[str], concurrency: Optional[int] = None,
+    priority: int = BULK, timeout: Optional[float] = None
+) -> AsyncIterator[dict]:
+    """
+    Generate product JSON for every JSONL line and yield results in completion order.
+
+    At most `concurrency` items are in flight, and at most `concurrency` finished results
+    wait for the consumer. When the consumer is slow, workers block on the result queue,
+    which in turn stops the reader, so memory use does not grow with the input size.
+    Items run in the given priority lane, each with its own `timeout` (if any).
+
+    Yields:
+        {"line": n, "data": {...}} or {"line": n, "error": "..."} with 1-based line numbers.
+        Blank lines are skipped.
+    """
+    concurrency = concurrency or get_api_key_manager().batch_concurrency
+    slots = asyncio.Semaphore(concurrency)
+    results: asyncio.Queue = asyncio.Queue(maxsize=concurrency)
+    workers = set()
+
+    async def process(line_number: int, line: str):
+        try:
+            try:
+                item = parse_listing_line(line)
+                with request_context(timeout=timeout, priority=priority):
+                    data = await generate_product_json(item["raw_text"], bypass_cache=item["bypass_cache"])
+                result = {"line": line_number, "data": data}
+            except Exception as e:
+                result = {"line": line_number, "error": str(e)}
+            await results.put(result)
+        finally:
+            slots.release()
+
+    async def read_input():
+        line_number = 0
+        try:
+            async for line in lines:
+                line_number += 1
+                if not line.strip():
+                    continue
+                await slots.acquire()
+                worker = asyncio.create_task(process(line_number, line))
+                workers.add(worker)
+                worker.add_done_callback(workers.discard)
+        except Exception as e:
+            await results.put({"line": line_number + 1, "error": f"Failed to read input: {e}"})
+        if workers:
+            await asyncio.gather(*workers)
+        await results.put(_DONE)
+
+    reader = asyncio.create_task(read_input())
+    try:
+        while True:
+            result = await results.get()
+            if result is _DONE:
+                break
+            yield result
+    finally:
+        # The consumer went away (or we finished): stop reading and cancel pending work
+        reader.cancel()
+        for worker in list(workers):
+            worker.cancel()
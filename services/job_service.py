@@ -0,0 +1,320 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import sqlite3
+import threading
+from typing import List, Optional
+from services.admission import BULK, request_context
+from services.gemini_service import generate_product_json
+
+# Item states
+PENDING = "pending"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+logger = logging.getLogger(__name__)
+
+
+class JobStore:
+    """
+    SQLite-backed queue of generation jobs and their items.
+
+    Every item is claimed with a short lease that the worker renews while it is working.
+    A worker that dies (or a container that restarts) stops renewing, and its items are
+    handed out again once the lease expires, unless it has used up max_attempts (e.g. it
+    crashes the worker every time), in which case it fails with "lease expired". Each
+    finished item is committed on its own, so a job's progress is checkpointed per item.
+    Delivery is at-least-once: an item may be generated twice, but never lost.
+
+    A claim's attempt number is its lease token: renew, complete, fail and release only
+    apply while the item is still running under that attempt, so a worker whose lease
+    expired cannot overwrite the outcome of the worker that took the item over.
+    """
+
+    def __init__(self, path: str, lease_seconds: float, max_attempts: int):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                created_at REAL NOT NULL,
+                total INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS job_items (
+                job_id TEXT NOT NULL,
+                item_index INTEGER NOT NULL,
+                raw_text TEXT NOT NULL,
+                bypass_cache INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                leased_until REAL,
+                result TEXT,
+                error TEXT,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (job_id, item_index)
+            );
+            CREATE INDEX IF NOT EXISTS job_items_claim ON job_items (status, leased_until);
+            """
+        )
+
+    def submit(self, raw_texts: List[str], bypass_cache: Optional[List[bool]] = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        bypass_cache = bypass_cache or [False] * len(raw_texts)
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute(
+                    "INSERT INTO jobs (id, created_at, total) VALUES (?, ?, ?)", (job_id, now, len(raw_texts))
+                )
+                self._conn.executemany(
+                    "INSERT INTO job_items (job_id, item_index, raw_text, bypass_cache, status, updated_at)"
+                    " VALUES (?, ?, ?, ?, ?, ?)",
+                    [(job_id, index, text, int(bypass_cache[index]), PENDING, now) for index, text in enumerate(raw_texts)],
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        return job_id
+
+    def claim_next(self) -> Optional[dict]:
+        """Lease the oldest pending item (or one whose lease expired) to the caller."""
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Expired items that have no attempts left are not retried
+                self._conn.execute(
+                    "UPDATE job_items SET status = ?, error = ?, leased_until = NULL, updated_at = ?"
+                    " WHERE status = ? AND leased_until < ? AND attempts >= ?",
+                    (FAILED, "lease expired", now, RUNNING, now, self.max_attempts),
+                )
+                row = self._conn.execute(
+                    "SELECT job_items.job_id, item_index, raw_text, bypass_cache, attempts"
+                    " FROM job_items JOIN jobs ON jobs.id = job_items.job_id"
+                    " WHERE status = ? OR (status = ? AND leased_until < ? AND attempts < ?)"
+                    " ORDER BY jobs.created_at, item_index LIMIT 1",
+                    (PENDING, RUNNING, now, self.max_attempts),
+                ).fetchone()
+                if row is not None:
+                    self._conn.execute(
+                        "UPDATE job_items SET status = ?, attempts = attempts + 1, leased_until = ?, updated_at = ?"
+                        " WHERE job_id = ? AND item_index = ?",
+                        (RUNNING, now + self.lease_seconds, now, row[0], row[1]),
+                    )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        job_id, index, raw_text, bypass_cache, attempts = row
+        return {
+            "job_id": job_id,
+            "index": index,
+            "raw_text": raw_text,
+            "bypass_cache": bool(bypass_cache),
+            "attempt": attempts + 1,
+        }
+
+    def renew(self, job_id: str, index: int, attempt: int) -> bool:
+        """Extend the lease of a claimed item; False if the claim was lost."""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE job_items SET leased_until = ?"
+                " WHERE job_id = ? AND item_index = ? AND status = ? AND attempts = ?",
+                (time.time() + self.lease_seconds, job_id, index, RUNNING, attempt),
+            ).rowcount > 0
+
+    def complete(self, job_id: str, index: int, result: dict, attempt: int) -> bool:
+        """Store the result of a claimed item; False (and nothing written) if the claim was lost."""
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE job_items SET status = ?, result = ?, error = NULL, leased_until = NULL, updated_at = ?"
+                " WHERE job_id = ? AND item_index = ? AND status = ? AND attempts = ?",
+                (DONE, json.dumps(result, ensure_ascii=False), time.time(), job_id, index, RUNNING, attempt),
+            ).rowcount > 0
+
+    def fail(self, job_id: str, index: int, error: str, attempt: int) -> bool:
+        """
+        Record a failed attempt; the item goes back to the queue until max_attempts is reached.
+        Returns False (and writes nothing) if the claim was lost.
+        """
+        status = FAILED if attempt >= self.max_attempts else PENDING
+        with self._lock:
+            return self._conn.execute(
+                "UPDATE job_items SET status = ?, error = ?, leased_until = NULL, updated_at = ?"
+                " WHERE job_id = ? AND item_index = ? AND status = ? AND attempts = ?",
+                (status, error, time.time(), job_id, index, RUNNING, attempt),
+            ).rowcount > 0
+
+    def release(self, job_id: str, index: int, attempt: int):
+        """Put an item that was interrupted (e.g. by shutdown) back in the queue."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE job_items SET status = ?, attempts = MAX(attempts - 1, 0), leased_until = NULL, updated_at = ?"
+                " WHERE job_id = ? AND item_index = ? AND status = ? AND attempts = ?",
+                (PENDING, time.time(), job_id, index, RUNNING, attempt),
+            )
+
+    def get_job(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._conn.execute("SELECT created_at, total FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if job is None:
+                return None
+            counts = dict(self._conn.execute(
+                "SELECT status, COUNT(*) FROM job_items WHERE job_id = ? GROUP BY status", (job_id,)
+            ).fetchall())
+        created_at, total = job
+        finished = counts.get(DONE, 0) + counts.get(FAILED, 0)
+        if finished == total:
+            status = "completed"
+        elif counts.get(RUNNING, 0) or finished:
+            status = "running"
+        else:
+            status = "queued"
+        return {
+            "job_id": job_id,
+            "status": status,
+            "created_at": created_at,
+            "total": total,
+            "succeeded": counts.get(DONE, 0),
+            "failed": counts.get(FAILED, 0),
+            "running": counts.get(RUNNING, 0),
+            "pending": counts.get(PENDING, 0),
+        }
+
+    def get_results(self, job_id: str, after: int, limit: int) -> List[dict]:
+        """Finished items of a job with an input index greater than `after`, by index."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT item_index, status, result, error FROM job_items"
+                " WHERE job_id = ? AND item_index > ? AND status IN (?, ?) ORDER BY item_index LIMIT ?",
+                (job_id, after, DONE, FAILED, limit),
+            ).fetchall()
+        results = []
+        for index, status, result, error in rows:
+            if status == DONE:
+                results.append({"index": index, "data": json.loads(result)})
+            else:
+                results.append({"index": index, "error": error})
+        return results
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = dict(self._conn.execute("SELECT status, COUNT(*) FROM job_items GROUP BY status").fetchall())
+            jobs = self._conn.execute("SELECT COUNT(*) FROM jobs").fetchone()[0]
+        return {"jobs": jobs, **{status: counts.get(status, 0) for status in (PENDING, RUNNING, DONE, FAILED)}}
+
+
+class JobWorkerPool:
+    """A pool of async workers that drain the JobStore through generate_product_json in the bulk lane."""
+
+    def __init__(self, store: JobStore, workers: int, poll_interval: float):
+        self.store = store
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup = asyncio.Event()
+
+    def start(self):
+        if self._tasks:
+            return
+        logger.info("Starting %d job workers", self.workers)
+        self._tasks = [asyncio.create_task(self._run()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def notify(self):
+        """Wake idle workers after new work was submitted."""
+        self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            try:
+                item = await asyncio.to_thread(self.store.claim_next)
+                if item is not None:
+                    await self._process(item)
+                    continue
+            except Exception as e:
+                # E.g. the database stayed locked past its busy timeout: keep the worker alive
+                logger.error("Job worker error: %s", e, exc_info=True)
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _process(self, item: dict):
+        job_id, index, attempt = item["job_id"], item["index"], item["attempt"]
+        heartbeat = asyncio.create_task(self._renew_lease(job_id, index, attempt))
+        try:
+            with request_context(priority=BULK):
+                result = await generate_product_json(item["raw_text"], bypass_cache=item["bypass_cache"])
+        except asyncio.CancelledError:
+            # Shutting down: hand the item back instead of waiting for its lease to expire
+            await asyncio.shield(asyncio.to_thread(self.store.release, job_id, index, attempt))
+            raise
+        except Exception as e:
+            logger.warning("Job %s item %d failed (attempt %d): %s", job_id, index, attempt, e,
+                           extra={"job_id": job_id, "item": index})
+            recorded = await asyncio.to_thread(self.store.fail, job_id, index, str(e), attempt)
+        else:
+            recorded = await asyncio.to_thread(self.store.complete, job_id, index, result, attempt)
+        finally:
+            heartbeat.cancel()
+        if not recorded:
+            logger.warning("Job %s item %d: lease of attempt %d was lost, outcome dropped", job_id, index, attempt,
+                           extra={"job_id": job_id, "item": index})
+
+    async def _renew_lease(self, job_id: str, index: int, attempt: int):
+        while True:
+            await asyncio.sleep(self.store.lease_seconds / 3)
+            if not await asyncio.to_thread(self.store.renew, job_id, index, attempt):
+                return  # Another worker took the item over
+
+
+job_store = None
+job_workers = None
+
+
+def get_job_store() -> JobStore:
+    """Get or create the global job store."""
+    global job_store
+    if job_store is None:
+        job_store = JobStore(
+            os.getenv("JOB_DB_PATH", "data/jobs.sqlite3"),
+            lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", "30")),
+            max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", "3")),
+        )
+    return job_store
+
+
+def get_job_workers() -> JobWorkerPool:
+    """Get or create the global job worker pool."""
+    global job_workers
+    if job_workers is None:
+        job_workers = JobWorkerPool(
+            get_job_store(),
+            workers=int(os.getenv("JOB_WORKERS", "4")),
+            poll_interval=float(os.getenv("JOB_POLL_INTERVAL", "2")),
+        )
+    return job_workers
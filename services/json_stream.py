@@ -0,0 +1,156 @@
+import json
+from typing import Any, Iterable, List, Tuple
+
+# Events returned by IncrementalObjectParser.feed()
+MEMBER = "member"  # (MEMBER, key, value): a top-level member is complete
+TEXT = "text"      # (TEXT, key, fragment): new characters of a streamed string member
+
+_WHITESPACE = " \t\r\n"
+
+
+class IncrementalObjectParser:
+    """
+    Parse the top-level members of a JSON object while its text is still arriving.
+
+    feed() takes the next chunk of model output and returns the events it completed: a
+    MEMBER event as soon as a member's value is closed, and TEXT events with the decoded
+    characters added so far to string members listed in `stream_keys`, so long fields can
+    be shown while they are being written. Member order does not matter.
+
+    The parser never raises. Text before the opening brace (e.g. a code fence) is skipped;
+    on anything else it does not understand it stops producing events and sets `failed`.
+    The complete text should still go through postprocessing.repair_json at the end.
+    """
+
+    def __init__(self, stream_keys: Iterable[str] = ()):
+        self.stream_keys = set(stream_keys)
+        self.failed = False
+        self.done = False
+        self._text = ""
+        self._pos = 0
+        self._state = "object"  # object, key, colon, value, string, nested, scalar
+        self._key = None
+        self._start = 0         # Start of the current key or value in _text
+        self._escaped = False
+        self._in_string = False  # Inside a string within a nested value
+        self._depth = 0
+        self._emitted = 0       # Decoded characters of the current streamed string already sent
+
+    def feed(self, chunk: str) -> List[Tuple[str, str, Any]]:
+        if self.failed or self.done:
+            return []
+        self._text += chunk
+        events = []
+        try:
+            self._scan(events)
+        except ValueError:
+            self.failed = True
+            return events
+        if self._state == "string" and self._key in self.stream_keys:
+            self._stream_text(events, self._text[self._start + 1:self._pos])
+        return events
+
+    def _scan(self, events: list):
+        text = self._text
+        while self._pos < len(text):
+            char = text[self._pos]
+            state = self._state
+            if state == "object":
+                if char == "{":
+                    self._state = "key"
+            elif state == "key":
+                if char == '"':
+                    end = self._string_end(text, self._pos + 1)
+                    if end is None:
+                        return  # Wait for the rest of the key
+                    self._key = json.loads(text[self._pos:end + 1])
+                    self._pos = end
+                    self._state = "colon"
+                elif char == "}":
+                    self.done = True
+                    return
+                elif char not in _WHITESPACE and char != ",":
+                    raise ValueError(f"Unexpected {char!r} before a key")
+            elif state == "colon":
+                if char == ":":
+                    self._state = "value"
+                elif char not in _WHITESPACE:
+                    raise ValueError(f"Unexpected {char!r} after a key")
+            elif state == "value":
+                if char not in _WHITESPACE:
+                    self._start = self._pos
+                    self._escaped = False
+                    if char == '"':
+                        self._state = "string"
+                        self._emitted = 0
+                    elif char in "{[":
+                        self._state = "nested"
+                        self._depth = 1
+                        self._in_string = False
+                    else:
+                        self._state = "scalar"
+            elif state == "string":
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    raw = text[self._start:self._pos + 1]
+                    if self._key in self.stream_keys:
+                        self._stream_text(events, raw[1:-1])
+                    self._member(events, json.loads(raw))
+            elif state == "nested":
+                if self._in_string:
+                    if self._escaped:
+                        self._escaped = False
+                    elif char == "\\":
+                        self._escaped = True
+                    elif char == '"':
+                        self._in_string = False
+                elif char == '"':
+                    self._in_string = True
+                elif char in "{[":
+                    self._depth += 1
+                elif char in "}]":
+                    self._depth -= 1
+                    if self._depth == 0:
+                        self._member(events, json.loads(text[self._start:self._pos + 1]))
+            elif state == "scalar":
+                if char in ",}" or char in _WHITESPACE:
+                    self._member(events, json.loads(text[self._start:self._pos]))
+                    if char == "}":
+                        self.done = True
+                        return
+            self._pos += 1
+
+    def _member(self, events: list, value: Any):
+        events.append((MEMBER, self._key, value))
+        self._state = "key"
+
+    def _stream_text(self, events: list, raw: str):
+        """Send the newly decoded part of a string member, holding back a split escape."""
+        for cut in range(len(raw), max(len(raw) - 12, -1), -1):
+            try:
+                decoded = json.loads(f'"{raw[:cut]}"')
+            except ValueError:
+                continue
+            if decoded and "\ud800" <= decoded[-1] <= "\udbff":
+                decoded = decoded[:-1]  # First half of a surrogate pair
+            if len(decoded) > self._emitted:
+                events.append((TEXT, self._key, decoded[self._emitted:]))
+                self._emitted = len(decoded)
+            return
+
+    @staticmethod
+    def _string_end(text: str, position: int):
+        """Index of the closing quote of a string whose content starts at `position`, if present."""
+        escaped = False
+        for index in range(position, len(text)):
+            char = text[index]
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                return index
+        return None
@@ -0,0 +1,166 @@
+import os
+import json
+import time
+import socket
+import hashlib
+import sqlite3
+import threading
+from typing import Dict, Tuple
+
+
+def key_id(api_key: str) -> str:
+    """A short, stable identifier for an API key that is safe to store and report."""
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:12]
+
+
+def worker_id() -> str:
+    """Identifies this process among the workers and replicas sharing a backend."""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class KeyStateBackend:
+    """
+    Where worker processes share what they know about each API key.
+
+    Two kinds of state are shared, both keyed by key_id() rather than the key itself:
+    - cooldowns: a key must not be used before a wall-clock time, because some worker
+      saw it rate limited or failing. Publishing only ever extends a cooldown.
+    - worker snapshots: each worker's cumulative per-key request/token/failure counters
+      and current load, which expire when the worker stops reporting.
+
+    All methods are blocking and are called from a worker thread. A Redis-compatible
+    store can implement this with a sorted set for cooldowns (ZADD GT / ZRANGEBYSCORE)
+    and one expiring key per worker snapshot (SET EX / SCAN).
+    """
+
+    name = "base"
+
+    def __init__(self, worker_ttl: float):
+        self.worker_ttl = worker_ttl
+
+    def publish_cooldown(self, key: str, until: float, reason: str):
+        raise NotImplementedError
+
+    def cooldowns(self) -> Dict[str, Tuple[float, str]]:
+        """Active cooldowns as {key_id: (until, reason)}, with `until` in wall-clock seconds."""
+        raise NotImplementedError
+
+    def publish_worker(self, worker: str, snapshot: dict):
+        raise NotImplementedError
+
+    def workers(self) -> Dict[str, dict]:
+        """Snapshots of all workers that reported within the worker TTL, including this one."""
+        raise NotImplementedError
+
+
+class MemoryKeyState(KeyStateBackend):
+    """Process-local state: the default for a single worker, where nothing needs sharing."""
+
+    name = "memory"
+
+    def __init__(self, worker_ttl: float):
+        super().__init__(worker_ttl)
+        self._lock = threading.Lock()
+        self._cooldowns: Dict[str, Tuple[float, str]] = {}
+        self._workers: Dict[str, Tuple[float, dict]] = {}
+
+    def publish_cooldown(self, key: str, until: float, reason: str):
+        with self._lock:
+            if until > self._cooldowns.get(key, (0.0, ""))[0]:
+                self._cooldowns[key] = (until, reason)
+
+    def cooldowns(self) -> Dict[str, Tuple[float, str]]:
+        now = time.time()
+        with self._lock:
+            return {key: value for key, value in self._cooldowns.items() if value[0] > now}
+
+    def publish_worker(self, worker: str, snapshot: dict):
+        with self._lock:
+            self._workers[worker] = (time.time(), snapshot)
+
+    def workers(self) -> Dict[str, dict]:
+        cutoff = time.time() - self.worker_ttl
+        with self._lock:
+            return {worker: snapshot for worker, (seen, snapshot) in self._workers.items() if seen > cutoff}
+
+
+class SQLiteKeyState(KeyStateBackend):
+    """
+    State shared through a SQLite file, for several uvicorn workers on one host.
+
+    The file must be on a local filesystem that every worker can write to.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, worker_ttl: float):
+        super().__init__(worker_ttl)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA busy_timeout=5000")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS key_cooldowns (
+                key_id TEXT PRIMARY KEY,
+                until REAL NOT NULL,
+                reason TEXT
+            );
+            CREATE TABLE IF NOT EXISTS key_state_workers (
+                worker_id TEXT PRIMARY KEY,
+                snapshot TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            """
+        )
+
+    def publish_cooldown(self, key: str, until: float, reason: str):
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO key_cooldowns (key_id, until, reason) VALUES (?, ?, ?)"
+                " ON CONFLICT (key_id) DO UPDATE SET until = excluded.until, reason = excluded.reason"
+                " WHERE excluded.until > key_cooldowns.until",
+                (key, until, reason),
+            )
+
+    def cooldowns(self) -> Dict[str, Tuple[float, str]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT key_id, until, reason FROM key_cooldowns WHERE until > ?", (time.time(),)
+            ).fetchall()
+        return {key: (until, reason) for key, until, reason in rows}
+
+    def publish_worker(self, worker: str, snapshot: dict):
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO key_state_workers (worker_id, snapshot, updated_at) VALUES (?, ?, ?)",
+                (worker, json.dumps(snapshot, ensure_ascii=False), now),
+            )
+            # Forget workers that have been gone for a while
+            self._conn.execute(
+                "DELETE FROM key_state_workers WHERE updated_at < ?", (now - 10 * self.worker_ttl,)
+            )
+
+    def workers(self) -> Dict[str, dict]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT worker_id, snapshot FROM key_state_workers WHERE updated_at > ?",
+                (time.time() - self.worker_ttl,),
+            ).fetchall()
+        return {worker: json.loads(snapshot) for worker, snapshot in rows}
+
+
+def create_key_state_backend() -> KeyStateBackend:
+    """Build the backend selected by KEY_STATE_BACKEND ("memory" or "sqlite")."""
+    backend = os.getenv("KEY_STATE_BACKEND", "memory").lower()
+    worker_ttl = float(os.getenv("KEY_STATE_WORKER_TTL", "10"))
+    if backend == "memory":
+        return MemoryKeyState(worker_ttl)
+    if backend == "sqlite":
+        return SQLiteKeyState(os.getenv("KEY_STATE_DB_PATH", "data/key_state.sqlite3"), worker_ttl)
+    raise ValueError(f"Unknown KEY_STATE_BACKEND: {backend!r} (expected 'memory' or 'sqlite')")
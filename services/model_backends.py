@@ -0,0 +1,92 @@
+import time
+import google.generativeai as genai
+from google.generativeai import protos
+from google.protobuf import field_mask_pb2
+from typing import Callable, Dict, Optional
+from services.fake_gemini import FakeContextCache, FakeGeminiModel, FakeProfile
+from services.genai_internals import bind_to_key, cache_client, create_cached_content
+
+# A factory builds one model for one API key: factory(api_key, model_name, generation_config).
+# The model must provide `async generate_content_async(prompt, generation_config=None, stream=False)`
+# returning an object with `.text` (and optionally `.usage_metadata`), or with stream=True
+# an async iterable of such chunks.
+ModelFactory = Callable[[str, str, dict], object]
+
+# A context cache factory registers a static instruction as cached content for one key and
+# model: factory(api_key, model_name, generation_config, instruction, ttl_seconds). It blocks,
+# and returns an object with `.name`, `.expires_at` (time.time()), `.model` (a model as above
+# that sends only the rest of each prompt), `refresh(ttl_seconds)` and `delete()`.
+ContextCacheFactory = Callable[[str, str, dict, str, float], object]
+
+MODEL_BACKENDS: Dict[str, ModelFactory] = {}
+CONTEXT_CACHE_BACKENDS: Dict[str, ContextCacheFactory] = {}
+
+
+def register_model_backend(name: str, factory: ModelFactory,
+                           context_cache_factory: Optional[ContextCacheFactory] = None):
+    """Make a model backend selectable with MODEL_BACKEND=<name>, optionally with context caching."""
+    MODEL_BACKENDS[name] = factory
+    if context_cache_factory is not None:
+        CONTEXT_CACHE_BACKENDS[name] = context_cache_factory
+
+
+def get_model_factory(name: str) -> ModelFactory:
+    try:
+        return MODEL_BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown MODEL_BACKEND {name!r}, expected one of {sorted(MODEL_BACKENDS)}") from None
+
+
+def get_context_cache_factory(name: str) -> Optional[ContextCacheFactory]:
+    """The context cache factory of a backend, or None if it has none."""
+    return CONTEXT_CACHE_BACKENDS.get(name)
+
+
+def create_gemini_model(api_key: str, model_name: str, generation_config: dict):
+    """Create a Gemini model bound to the key's own client instead of the process-global one."""
+    model = genai.GenerativeModel(
+        model_name=model_name,
+        generation_config=generation_config
+    )
+    return bind_to_key(model, api_key)
+
+
+class GeminiContextCache:
+    """
+    Cached content holding a static instruction for one key and model.
+
+    Uses the key's own cache client (see services.genai_internals), since
+    caching.CachedContent always goes through the process-global one. `model` generates with the cached instruction as its system
+    instruction, so each call sends only the rest of the prompt.
+    """
+
+    def __init__(self, api_key: str, model_name: str, generation_config: dict, instruction: str,
+                 ttl_seconds: float):
+        self._client = cache_client(api_key)
+        cached = create_cached_content(api_key, model_name, instruction, int(ttl_seconds))
+        self.name = cached.name
+        self.expires_at = cached.expire_time.timestamp() if cached.expire_time else time.time() + ttl_seconds
+        self.model = bind_to_key(
+            genai.GenerativeModel.from_cached_content(cached, generation_config=generation_config), api_key
+        )
+
+    def refresh(self, ttl_seconds: float):
+        """Extend the cache to expire `ttl_seconds` from now."""
+        request = protos.UpdateCachedContentRequest(
+            cached_content=protos.CachedContent(name=self.name, ttl={"seconds": int(ttl_seconds)}),
+            update_mask=field_mask_pb2.FieldMask(paths=["ttl"]),
+        )
+        updated = self._client.update_cached_content(request)
+        self.expires_at = updated.expire_time.timestamp() if updated.expire_time else time.time() + ttl_seconds
+
+    def delete(self):
+        self._client.delete_cached_content(protos.DeleteCachedContentRequest(name=self.name))
+
+
+def create_fake_model(api_key: str, model_name: str, generation_config: dict):
+    """Create a local fake model (see services.fake_gemini), configured from FAKE_GEMINI_* variables."""
+    return FakeGeminiModel(api_key, model_name, generation_config, FakeProfile.from_env())
+
+
+register_model_backend("gemini", create_gemini_model, GeminiContextCache)
+register_model_backend("fake", create_fake_model, FakeContextCache)
@@ -0,0 +1,188 @@
+import os
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+from services.hedging import LatencyTracker
+
+# List prices in USD per million prompt and response tokens, used to estimate cost per tier.
+# Override or extend with MODEL_PRICES="model=prompt/response,...".
+DEFAULT_MODEL_PRICES = {
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+
+
+def parse_model_prices(spec: str) -> Dict[str, Tuple[float, float]]:
+    """Parse "model=prompt/response,..." into {model: (prompt_price, response_price)}."""
+    prices = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, values = item.partition("=")
+        prompt_price, _, response_price = values.partition("/")
+        prices[name.strip()] = (float(prompt_price), float(response_price or prompt_price))
+    return prices
+
+
+class _TierStats:
+    """Live call and output health of one model tier."""
+
+    def __init__(self, window: int):
+        self.latency = LatencyTracker(window=window)
+        self.call_errors = deque(maxlen=window)      # True for each failed upstream call
+        self.output_invalid = deque(maxlen=window)   # True for each generation that failed validation
+        self.routed: Dict[str, int] = {}
+        self.escalated_from = 0
+        self.escalated_to = 0
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.response_tokens = 0
+
+    @staticmethod
+    def rate(window: deque) -> float:
+        return sum(window) / len(window) if window else 0.0
+
+
+class ModelRouter:
+    """
+    Picks the Gemini model for each product generation from an ordered list of tiers.
+
+    MODEL_TIERS lists the models from fastest to strongest (default: GEMINI_MODEL alone,
+    which disables routing). A listing starts on the fastest tier when it is short (at most
+    ROUTER_FAST_MAX_TOKENS, default 150) and the category pre-classifier is confident about
+    it (top score at least ROUTER_FAST_MIN_SCORE, default 3.0, i.e. garment and audience
+    recognized); otherwise it starts on GEMINI_MODEL.
+
+    A tier is passed over for the next stronger one while, over its last ROUTER_WINDOW calls,
+    its upstream error rate is above ROUTER_MAX_ERROR_RATE (default 0.5), its outputs
+    failed validation more often than ROUTER_MAX_INVALID_RATE (default 0.2), or its median
+    latency is no better than the next tier's. These checks wait for ROUTER_MIN_SAMPLES
+    (default 20) samples. A generation whose output fails validation is escalated one tier
+    up (see escalate); upstream errors are left to key failover.
+    """
+
+    def __init__(self, tiers: List[str], default: str):
+        self.tiers = list(dict.fromkeys(tiers))
+        if default not in self.tiers:
+            raise ValueError(f"GEMINI_MODEL {default!r} must be one of MODEL_TIERS {self.tiers}")
+        self.default = default
+        self.fast_max_tokens = int(os.getenv("ROUTER_FAST_MAX_TOKENS", "150"))
+        self.fast_min_score = float(os.getenv("ROUTER_FAST_MIN_SCORE", "3.0"))
+        self.max_error_rate = float(os.getenv("ROUTER_MAX_ERROR_RATE", "0.5"))
+        self.max_invalid_rate = float(os.getenv("ROUTER_MAX_INVALID_RATE", "0.2"))
+        self.min_samples = int(os.getenv("ROUTER_MIN_SAMPLES", "20"))
+        window = int(os.getenv("ROUTER_WINDOW", "200"))
+        self.prices = {**DEFAULT_MODEL_PRICES, **parse_model_prices(os.getenv("MODEL_PRICES", ""))}
+        self.stats = {model: _TierStats(window) for model in self.tiers}
+
+    @classmethod
+    def from_env(cls, default: str) -> "ModelRouter":
+        tiers = [name.strip() for name in os.getenv("MODEL_TIERS", default).split(",") if name.strip()]
+        return cls(tiers, default)
+
+    @property
+    def enabled(self) -> bool:
+        return len(self.tiers) > 1
+
+    def route(self, listing_tokens: int, classifier_score: Optional[float]) -> str:
+        """The model to start a generation on, recorded with the reason it was chosen."""
+        if listing_tokens > self.fast_max_tokens:
+            position, reason = self.tiers.index(self.default), "large_input"
+        elif classifier_score is None or classifier_score < self.fast_min_score:
+            position, reason = self.tiers.index(self.default), "uncertain_category"
+        else:
+            position, reason = 0, "simple_listing"
+
+        while position < len(self.tiers) - 1:
+            skip = self._skip_reason(position)
+            if skip is None:
+                break
+            position, reason = position + 1, skip
+        model = self.tiers[position]
+        routed = self.stats[model].routed
+        routed[reason] = routed.get(reason, 0) + 1
+        return model
+
+    def _skip_reason(self, position: int) -> Optional[str]:
+        """Why the tier at `position` should be passed over for the next one, if it should."""
+        stats = self.stats[self.tiers[position]]
+        if len(stats.call_errors) >= self.min_samples and stats.rate(stats.call_errors) > self.max_error_rate:
+            return "tier_errors"
+        if len(stats.output_invalid) >= self.min_samples and stats.rate(stats.output_invalid) > self.max_invalid_rate:
+            return "tier_invalid_output"
+        stronger = self.stats[self.tiers[position + 1]]
+        if len(stats.latency) >= self.min_samples and len(stronger.latency) >= self.min_samples:
+            if stats.latency.percentile(50) >= stronger.latency.percentile(50):
+                return "tier_latency"
+        return None
+
+    def escalate(self, model: str) -> Optional[str]:
+        """The next stronger model after `model` produced invalid output, or None if it is the strongest."""
+        position = self.tiers.index(model) if model in self.tiers else len(self.tiers) - 1
+        if position >= len(self.tiers) - 1:
+            return None
+        stronger = self.tiers[position + 1]
+        self.stats[model].escalated_from += 1
+        self.stats[stronger].escalated_to += 1
+        return stronger
+
+    def record_call(self, model: str, seconds: Optional[float]):
+        """Record one upstream call: its latency, or None if it failed."""
+        stats = self.stats.get(model)
+        if stats is None:
+            return
+        stats.calls += 1
+        stats.call_errors.append(seconds is None)
+        if seconds is None:
+            stats.errors += 1
+        else:
+            stats.latency.record(seconds)
+
+    def record_tokens(self, model: str, prompt_tokens: int, response_tokens: int):
+        stats = self.stats.get(model)
+        if stats is not None:
+            stats.prompt_tokens += prompt_tokens
+            stats.response_tokens += response_tokens
+
+    def record_output(self, model: str, valid: bool):
+        """Record whether a generation on `model` passed validation (after field repair)."""
+        stats = self.stats.get(model)
+        if stats is not None:
+            stats.output_invalid.append(not valid)
+
+    def cost(self, model: str) -> Optional[float]:
+        """Estimated USD spent on `model` so far, or None when its price is unknown."""
+        if model not in self.prices:
+            return None
+        prompt_price, response_price = self.prices[model]
+        stats = self.stats[model]
+        return (stats.prompt_tokens * prompt_price + stats.response_tokens * response_price) / 1_000_000
+
+    def status(self) -> dict:
+        models = {}
+        for model, stats in self.stats.items():
+            cost = self.cost(model)
+            p50, p95 = stats.latency.percentile(50), stats.latency.percentile(95)
+            successful = stats.calls - stats.errors
+            models[model] = {
+                "routed": dict(stats.routed),
+                "escalated_from": stats.escalated_from,
+                "escalated_to": stats.escalated_to,
+                "calls": stats.calls,
+                "errors": stats.errors,
+                "recent_error_rate": round(stats.rate(stats.call_errors), 4),
+                "recent_invalid_output_rate": round(stats.rate(stats.output_invalid), 4),
+                "p50_latency_seconds": round(p50, 3) if p50 is not None else None,
+                "p95_latency_seconds": round(p95, 3) if p95 is not None else None,
+                "prompt_tokens": stats.prompt_tokens,
+                "response_tokens": stats.response_tokens,
+                "estimated_cost_usd": round(cost, 6) if cost is not None else None,
+                "estimated_cost_per_call_usd": round(cost / successful, 6) if cost is not None and successful else None,
+            }
+        return {
+            "enabled": self.enabled,
+            "tiers": self.tiers,
+            "default": self.default,
+            "fast_max_tokens": self.fast_max_tokens,
+            "fast_min_score": self.fast_min_score,
+            "models": models,
+        }
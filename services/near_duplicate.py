@@ -0,0 +1,170 @@
+import os
+import re
+import copy
+import random
+import hashlib
+from collections import OrderedDict
+from typing import Dict, FrozenSet, List, Optional, Set, Tuple
+from services.postprocessing import PRICE_PATTERN, extract_price
+from services.preprocessing import canonicalize
+
+_WORD = re.compile(r"\w+")
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def similarity_tokens(raw_text: str) -> FrozenSet[str]:
+    """
+    The set of words that decides whether two listings describe the same product.
+
+    The text is canonicalized (see services.preprocessing), ZWNJ splits words and the
+    price is removed, since it is patched locally. Emoji and punctuation are dropped, and word
+    order does not matter, so reordered colors or an added emoji do not make a new product.
+    """
+    text = canonicalize(raw_text).replace("\u200c", " ").lower()
+    text = PRICE_PATTERN.sub(" ", text)
+    return frozenset(_WORD.findall(text))
+
+
+def jaccard(first: FrozenSet[str], second: FrozenSet[str]) -> float:
+    if not first and not second:
+        return 1.0
+    return len(first & second) / len(first | second)
+
+
+def _lsh_shape(permutations: int, threshold: float) -> Tuple[int, int]:
+    """
+    Bands and rows per band for MinHash LSH.
+
+    Pairs become candidates above roughly (1/bands) ** (1/rows) similarity. The shape whose
+    cut-off is closest below `threshold` is used, so candidates are rarely missed and the
+    exact check weeds out the rest.
+    """
+    shapes = [(permutations // rows, rows) for rows in range(1, permutations + 1) if permutations % rows == 0]
+    below = [shape for shape in shapes if (1 / shape[0]) ** (1 / shape[1]) <= threshold]
+    return max(below, key=lambda shape: (1 / shape[0]) ** (1 / shape[1])) if below else shapes[0]
+
+
+class MinHasher:
+    """MinHash signatures of word sets, with seeded universal hash permutations."""
+
+    def __init__(self, permutations: int, seed: int = 1):
+        rng = random.Random(seed)
+        self.params = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(permutations)]
+
+    def signature(self, tokens: FrozenSet[str]) -> Tuple[int, ...]:
+        hashes = [int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+                  for token in tokens]
+        return tuple(min((a * value + b) % _MERSENNE_PRIME for value in hashes) for a, b in self.params)
+
+
+class NearDuplicateIndex:
+    """
+    Finds earlier generations for listings that are near-duplicates of a new one.
+
+    Resellers repost the same product with a new price, an emoji or reordered colors,
+    which the exact-match cache misses. Listings are compared by the Jaccard similarity of
+    their word sets (see similarity_tokens); MinHash LSH keeps lookups from scanning every
+    entry. A match at or above NEAR_DUPLICATE_THRESHOLD (default 0.9) is reused with its
+    price re-extracted from the new text.
+
+    Only products whose price matches what extract_price finds in their own text are
+    indexed, so the local patch is known to agree with the model. A listing whose price
+    cannot be extracted is never reused. The index is in-process and keeps the latest
+    NEAR_DUPLICATE_MAX_ENTRIES (default 10000) products.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("NEAR_DUPLICATE_ENABLED", "true").lower() in ("1", "true", "yes")
+        self.threshold = float(os.getenv("NEAR_DUPLICATE_THRESHOLD", "0.9"))
+        self.max_entries = int(os.getenv("NEAR_DUPLICATE_MAX_ENTRIES", "10000"))
+        permutations = int(os.getenv("NEAR_DUPLICATE_PERMUTATIONS", "64"))
+        self.bands, self.rows = _lsh_shape(permutations, self.threshold)
+        self.hasher = MinHasher(permutations)
+        self._entries: "OrderedDict[int, Tuple[FrozenSet[str], List[tuple], dict]]" = OrderedDict()
+        self._buckets: List[Dict[tuple, Set[int]]] = [{} for _ in range(self.bands)]
+        self._next_id = 0
+        self.lookups = 0
+        self.reused = 0
+        self.unpatchable = 0
+        self.indexed = 0
+        self.not_indexed = 0
+
+    def _band_keys(self, tokens: FrozenSet[str]) -> List[tuple]:
+        signature = self.hasher.signature(tokens)
+        return [signature[band * self.rows:(band + 1) * self.rows] for band in range(self.bands)]
+
+    def add(self, raw_text: str, product: dict):
+        """Index a freshly generated product, if its price can be re-derived from its text."""
+        if not self.enabled or self.max_entries <= 0:
+            return
+        tokens = similarity_tokens(raw_text)
+        if not tokens or extract_price(raw_text) != product.get("price"):
+            self.not_indexed += 1
+            return
+        entry_id = self._next_id
+        self._next_id += 1
+        keys = self._band_keys(tokens)
+        self._entries[entry_id] = (tokens, keys, copy.deepcopy(product))
+        for buckets, key in zip(self._buckets, keys):
+            buckets.setdefault(key, set()).add(entry_id)
+        self.indexed += 1
+        while len(self._entries) > self.max_entries:
+            self._evict()
+
+    def _evict(self):
+        entry_id, (_, keys, _) = self._entries.popitem(last=False)
+        for buckets, key in zip(self._buckets, keys):
+            members = buckets.get(key)
+            if members is not None:
+                members.discard(entry_id)
+                if not members:
+                    del buckets[key]
+
+    def find(self, raw_text: str) -> Optional[dict]:
+        """
+        Return a copy of the most similar earlier product with the price taken from
+        `raw_text`, or None if there is no match above the threshold or the price is unclear.
+        """
+        if not self.enabled or not self._entries:
+            return None
+        tokens = similarity_tokens(raw_text)
+        if not tokens:
+            return None
+        self.lookups += 1
+        candidates = set()
+        for buckets, key in zip(self._buckets, self._band_keys(tokens)):
+            candidates.update(buckets.get(key, ()))
+        best, best_score = None, self.threshold
+        for entry_id in candidates:
+            score = jaccard(tokens, self._entries[entry_id][0])
+            if score >= best_score:
+                best, best_score = entry_id, score
+        if best is None:
+            return None
+
+        price = extract_price(raw_text)
+        if price is None:
+            self.unpatchable += 1
+            return None
+        self._entries.move_to_end(best)
+        self.reused += 1
+        product = copy.deepcopy(self._entries[best][2])
+        product["price"] = price
+        return product
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "lsh_bands": self.bands,
+            "lsh_rows": self.rows,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "indexed": self.indexed,
+            "not_indexed": self.not_indexed,
+            "lookups": self.lookups,
+            "reused": self.reused,
+            "unpatchable": self.unpatchable,
+            "reuse_rate": round(self.reused / self.lookups, 4) if self.lookups else 0.0,
+        }
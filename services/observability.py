@@ -0,0 +1,92 @@
+import os
+import json
+import queue
+import atexit
+import logging
+import contextlib
+import logging.handlers
+from typing import Optional
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:  # Tracing is optional
+    otel_trace = None
+
+# Attributes every LogRecord has; anything else on a record came from `extra=`
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    return {name: value for name, value in vars(record).items() if name not in _RECORD_FIELDS}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and any `extra` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record, "%Y-%m-%dT%H:%M:%S"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **_extra_fields(record),
+        }
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """A plain log line with the `extra` fields appended as key=value pairs."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s: %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = " ".join(f"{name}={value}" for name, value in _extra_fields(record).items())
+        return f"{line} {fields}" if fields else line
+
+
+def configure_logging():
+    """
+    Route all logging through a queue to a background thread that formats and writes it.
+
+    Request handlers only enqueue records, so a slow stderr or log collector never blocks
+    the event loop. LOG_LEVEL sets the level (default INFO) and LOG_FORMAT the output,
+    "text" (default) or "json". Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    handler = logging.StreamHandler()
+    handler.setFormatter(JsonFormatter() if os.getenv("LOG_FORMAT", "text").lower() == "json" else TextFormatter())
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(log_queue, handler)
+
+    root = logging.getLogger()
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    root.handlers = [logging.handlers.QueueHandler(log_queue)]
+    _listener.start()
+    atexit.register(_listener.stop)
+
+
+_tracer = None
+if otel_trace is not None and os.getenv("TRACING_ENABLED", "false").lower() in ("1", "true", "yes"):
+    _tracer = otel_trace.get_tracer("gemini_service")
+
+
+@contextlib.contextmanager
+def span(name: str, **attributes):
+    """
+    An OpenTelemetry span around the block when tracing is enabled, otherwise a no-op.
+
+    Tracing needs TRACING_ENABLED=true and the opentelemetry packages; spans are exported
+    by whatever OpenTelemetry SDK the process configures. Exceptions are recorded on the span.
+    """
+    if _tracer is None:
+        yield None
+        return
+    with _tracer.start_as_current_span(name, attributes=attributes) as current:
+        yield current
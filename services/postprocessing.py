@@ -0,0 +1,242 @@
+import re
+import json
+from typing import Any, Dict, List, Optional, Tuple
+from pydantic import ValidationError
+from schemas.product import GeneratedProduct, PRODUCT_RESPONSE_SCHEMA
+
+# Values every product gets, filled in locally instead of generated by the model
+FIXED_FIELDS = {
+    "status": 2976,
+    "unit_type": 6304,
+    "package_weight": 200,
+    "weight": 100,
+}
+
+DEFAULT_PACKAGING_DIMENSIONS = {"length": 10, "width": 5, "height": 1}
+MIN_PRICE_RIAL = 1_000_000
+
+_DIGITS = str.maketrans("۰۱۲۳۴۵۶۷۸۹٠١٢٣٤٥٦٧٨٩", "01234567890123456789")
+_CODE_FENCE = re.compile(r"^\s*```(?:json)?\s*|\s*```\s*$")
+_TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+# A price in a listing: an amount with a currency ("۳۹۰ هزار تومان", "۱,۲۵۰,۰۰۰ ریال"), or an
+# amount after "قیمت" without one (Toman). Matches text whose digits are already ASCII.
+PRICE_PATTERN = re.compile(
+    r"(?:قیمت\s*:?\s*)?(?P<amount>\d[\d,٬.]*)\s*(?P<unit>هزار|میلیون)?\s*(?P<currency>تومان|تومن|ریال)"
+    r"|قیمت\s*:?\s*(?P<bare_amount>\d[\d,٬.]*)\s*(?P<bare_unit>هزار|میلیون)?"
+)
+_UNITS = {"هزار": 1_000, "میلیون": 1_000_000}
+
+
+def repair_json(text: str) -> Any:
+    """
+    Parse model output as JSON, repairing common near-valid forms.
+
+    Handles code fences, text around the JSON value, trailing commas, and output that was
+    cut off before its closing brackets (dropping the member that was cut, see
+    _close_brackets).
+
+    Raises:
+        ValueError: If the text cannot be turned into JSON.
+    """
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+
+    candidate = _CODE_FENCE.sub("", text.strip())
+    starts = [i for i in (candidate.find("{"), candidate.find("[")) if i != -1]
+    if not starts:
+        raise ValueError("No JSON object or array found in response")
+    candidate = candidate[min(starts):]
+    end = max(candidate.rfind("}"), candidate.rfind("]"))
+    candidates = [candidate[:end + 1]] if end != -1 else []
+    candidates.append(_close_brackets(candidate))
+
+    for option in candidates:
+        try:
+            return json.loads(_TRAILING_COMMA.sub(r"\1", option))
+        except json.JSONDecodeError:
+            continue
+    raise ValueError("Response is not valid JSON and could not be repaired")
+
+
+def _close_brackets(text: str) -> str:
+    """
+    Close the objects and arrays left open by a truncated response.
+
+    The member that was being written when the output was cut off (a partial key, a key
+    without its value, or a partial string or number) is dropped rather than guessed, so
+    validation reports the field and it is regenerated. Complete members are kept.
+    """
+    stack = []  # [closer, start of the current member] per open object and array
+    in_string, escaped = False, False
+    for position, char in enumerate(text):
+        if in_string:
+            if escaped:
+                escaped = False
+            elif char == "\\":
+                escaped = True
+            elif char == '"':
+                in_string = False
+        elif char == '"':
+            in_string = True
+        elif char in "{[":
+            stack.append(["}" if char == "{" else "]", position + 1])
+        elif char in "}]" and stack:
+            stack.pop()
+        elif char == "," and stack:
+            stack[-1][1] = position + 1
+    if not stack:
+        return text
+
+    closer, start = stack[-1]
+    if not _is_complete_member(text[start:], closer):
+        text = text[:start]
+    text = re.sub(r",\s*$", "", text.rstrip())
+    return text + "".join(closer for closer, _ in reversed(stack))
+
+
+def _is_complete_member(member: str, closer: str) -> bool:
+    """Whether the last member of a container cut off at the end of the text is whole."""
+    if not member.strip():
+        return True
+    if member[-1].isdigit() or member[-1] == ".":
+        return False  # A number at the very end may have lost digits
+    try:
+        json.loads(("{" if closer == "}" else "[") + member + closer)
+    except json.JSONDecodeError:
+        return False
+    return True
+
+
+def parse_number(value: Any) -> int:
+    """Parse an int from a number or a string with Persian/Arabic digits and separators."""
+    if isinstance(value, bool):
+        raise ValueError("price must be a number")
+    if isinstance(value, (int, float)):
+        return int(value)
+    digits = re.sub(r"[^\d.]", "", str(value).translate(_DIGITS))
+    if not digits:
+        raise ValueError(f"No number in {value!r}")
+    return int(float(digits))
+
+
+def normalize_price(price: Any, currency: str = "toman") -> int:
+    """
+    Convert a price as written in the listing to Rial.
+
+    Toman prices are multiplied by 10. Very small Toman amounts use the common shorthand
+    for thousands ("۶۵۰ تومان" means 650,000 Toman). The result is at least 1,000,000 Rial.
+    """
+    amount = parse_number(price)
+    if (currency or "toman").lower() != "rial":
+        if 0 < amount < 10_000:
+            amount *= 1000
+        amount *= 10
+    return max(amount, MIN_PRICE_RIAL)
+
+
+def extract_written_price(raw_text: str) -> Optional[Tuple[int, str]]:
+    """
+    The price written in a listing as (amount, "toman" or "rial"), with هزار/میلیون applied.
+
+    Returns None if the text has no price or mentions several different ones.
+    """
+    prices = {}
+    for match in PRICE_PATTERN.finditer((raw_text or "").translate(_DIGITS)):
+        amount = match.group("amount") or match.group("bare_amount")
+        unit = match.group("unit") or match.group("bare_unit")
+        currency = "rial" if match.group("currency") == "ریال" else "toman"
+        try:
+            value = int(_parse_amount(amount) * _UNITS.get(unit, 1))
+            prices.setdefault(normalize_price(value, currency), (value, currency))
+        except ValueError:
+            continue
+    return next(iter(prices.values())) if len(prices) == 1 else None
+
+
+def extract_price(raw_text: str) -> Optional[int]:
+    """The price written in a listing, in Rial as normalize_price returns it, or None."""
+    price = extract_written_price(raw_text)
+    return normalize_price(*price) if price is not None else None
+
+
+def _parse_amount(amount: str) -> float:
+    """Parse "1,250,000", "1.250.000" or "1.5"; dots are thousands separators only in groups of three."""
+    amount = amount.rstrip(",٬.").replace(",", "").replace("٬", "")
+    groups = amount.split(".")
+    if len(groups) > 1 and all(len(group) == 3 for group in groups[1:]):
+        return float("".join(groups))
+    return float(amount)
+
+
+def normalize_product(data: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill the fixed fields, convert the price to Rial and fix the packaging dimensions."""
+    product = dict(data)
+    product.update(FIXED_FIELDS)
+
+    currency = product.pop("price_currency", "toman")
+    if product.get("price") not in (None, ""):
+        try:
+            product["price"] = normalize_price(product["price"], currency)
+        except ValueError:
+            pass  # Left for validation to report
+
+    if "category_id" in product:
+        try:
+            product["category_id"] = parse_number(product["category_id"])
+        except ValueError:
+            pass
+
+    dimensions = product.get("packaging_dimensions")
+    if not isinstance(dimensions, dict):
+        dimensions = {}
+    product["packaging_dimensions"] = {
+        axis: dimensions[axis] if _positive(dimensions.get(axis)) else default
+        for axis, default in DEFAULT_PACKAGING_DIMENSIONS.items()
+    }
+    return product
+
+
+def _positive(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value > 0
+
+
+def validate_product(product: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, str]]:
+    """
+    Validate a normalized product against GeneratedProduct.
+
+    Returns:
+        (product, errors) where errors maps each invalid top-level field to its message.
+        The product is returned validated when there are no errors.
+    """
+    try:
+        return GeneratedProduct.model_validate(product).model_dump(), {}
+    except ValidationError as e:
+        errors = {}
+        for error in e.errors():
+            field = str(error["loc"][0]) if error["loc"] else "__root__"
+            errors.setdefault(field, error["msg"])
+        return product, errors
+
+
+def merge_fields(product: Dict[str, Any], fields: Dict[str, Any], allowed: List[str]) -> Dict[str, Any]:
+    """Overwrite only the allowed fields of a product with regenerated values."""
+    merged = dict(product)
+    for field in allowed:
+        if field in fields:
+            merged[field] = fields[field]
+    if "price" in allowed and "price_currency" in fields:
+        merged["price_currency"] = fields["price_currency"]
+    return merged
+
+
+def field_response_schema(fields: List[str]) -> Dict[str, Any]:
+    """A Gemini response schema restricted to the given product fields."""
+    if "price" in fields:
+        fields = [*fields, "price_currency"]
+    properties = {
+        field: schema for field, schema in PRODUCT_RESPONSE_SCHEMA["properties"].items() if field in fields
+    }
+    return {"type": "object", "properties": properties, "required": list(properties)}
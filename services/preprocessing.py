@@ -0,0 +1,111 @@
+import re
+import unicodedata
+from typing import Dict, List, Optional
+from services.postprocessing import extract_written_price
+
+# Arabic letter forms and digits that Persian listings mix in, mapped to one spelling
+_CHARACTERS = str.maketrans({
+    "ي": "ی", "ى": "ی", "ك": "ک",
+    **{digit: str(value) for value, digit in enumerate("۰۱۲۳۴۵۶۷۸۹")},
+    **{digit: str(value) for value, digit in enumerate("٠١٢٣٤٥٦٧٨٩")},
+    "٬": ",", "٫": ".",
+})
+# Invisible characters: zero-width spaces and joiners, bidi marks, BOM, soft hyphen,
+# emoji variation selectors, plus tatweel and diacritics
+_INVISIBLE = re.compile(r"[\u200b\u200d\u200e\u200f\u202a-\u202e\u2066-\u2069\ufeff\u00ad\ufe0e\ufe0f\u0640\u064b-\u065f\u0670]")
+_ZWNJ_RUN = re.compile(r"\u200c+")
+_LOOSE_ZWNJ = re.compile(r"(?<![^\W\d_])\u200c|\u200c(?![^\W\d_])")  # Not between two letters
+_EMOJI = "\U0001F000-\U0001FAFF\u2300-\u23FF\u2600-\u27BF\u2B00-\u2BFF"
+_EMOJI_RUN = re.compile(rf"[{_EMOJI}]+")
+_HASHTAG = re.compile(r"#([^\W_][\w]*)")
+_PUNCTUATION_RUN = re.compile(r"([!?.,،؛:;\-_=*~+])\1+")
+_SPACES = re.compile(r"[ \t\u00a0\u2000-\u200a\u202f\u3000]+")
+_WORD = re.compile(r"\w+")
+
+_SIZE = re.compile(r"سایز\s*:?\s*([0-9]*[A-Za-z]+|\d+)(?:\s*(?:تا|-|الی)\s*([0-9]*[A-Za-z]+|\d+))?", re.IGNORECASE)
+_FREE_SIZE = re.compile(r"فری\s*سایز")
+_AGE = re.compile(r"(\d+)\s*(?:تا|-|الی)\s*(\d+)\s*(ماه|سال)")
+_AGE_UNIT = re.compile(r"\s*(?:ماه|سال)")
+_DIMENSIONS = re.compile(r"(\d+)\s*(?:در|x|×|\*)\s*(\d+)(?:\s*(?:در|x|×|\*)\s*(\d+))?", re.IGNORECASE)
+
+
+def canonicalize(text: str) -> str:
+    """
+    One spelling for text that looks the same: NFKC, Persian letters and ASCII digits,
+    no invisible characters or diacritics, and ZWNJ only between two letters.
+    """
+    text = unicodedata.normalize("NFKC", text or "").translate(_CHARACTERS)
+    text = _ZWNJ_RUN.sub("\u200c", _INVISIBLE.sub("", text))
+    return _LOOSE_ZWNJ.sub("", text)
+
+
+def compact_listing(raw_text: str) -> str:
+    """
+    Canonicalize a raw listing and drop what only costs tokens.
+
+    Emoji are removed (the model adds its own to the description), repeated punctuation is
+    collapsed, and whitespace, blank and repeated lines are removed. Hashtags become plain
+    words on a last line, without the ones the text already contains.
+    """
+    text = canonicalize(raw_text)
+    words = set(_WORD.findall(_HASHTAG.sub(" ", text).lower()))
+    tags = []
+    for tag in _HASHTAG.findall(text):
+        tag = tag.replace("_", " ")
+        if tag not in tags and not words.issuperset(tag.lower().split()):
+            tags.append(tag)
+    text = _HASHTAG.sub(" ", text)
+    text = _PUNCTUATION_RUN.sub(r"\1", _EMOJI_RUN.sub(" ", text))
+
+    lines = []
+    for line in text.splitlines():
+        line = _SPACES.sub(" ", line).strip()
+        if line and line not in lines and re.search(r"[^\W_]", line):
+            lines.append(line)
+    if tags:
+        lines.append(" ".join(tags))
+    return "\n".join(lines)
+
+
+def extract_hints(text: str) -> Dict[str, object]:
+    """
+    Structured facts a parser can read off a listing: the price as written (amount and
+    currency) and any sizes, age ranges or dimensions, e.g.
+    {"price": 390000, "price_currency": "toman", "sizes": ["38-46", "M-XXL"]}.
+    """
+    hints: Dict[str, object] = {}
+    price = extract_written_price(text)
+    if price is not None:
+        hints["price"], hints["price_currency"] = price
+    sizes: List[str] = []
+    for match in _SIZE.finditer(text):
+        if _AGE_UNIT.match(text, match.end()):
+            continue  # An age range, added below
+        sizes.append("-".join(part.upper() for part in match.groups() if part))
+    if _FREE_SIZE.search(text):
+        sizes.append("free size")
+    for low, high, unit in _AGE.findall(text):
+        sizes.append(f"{low}-{high} {unit}")
+    for match in _DIMENSIONS.finditer(text):
+        sizes.append("x".join(part for part in match.groups() if part))
+    if sizes:
+        hints["sizes"] = list(dict.fromkeys(sizes))
+    return hints
+
+
+def format_hints(hints: Dict[str, object]) -> Optional[str]:
+    """The hints as the one-line "Hints:" footer the product prompts explain, or None."""
+    if not hints:
+        return None
+    parts = []
+    if "price" in hints:
+        parts.append(f"price={hints['price']} {hints['price_currency']}")
+    if "sizes" in hints:
+        parts.append(f"sizes={', '.join(hints['sizes'])}")
+    return "Hints: " + "; ".join(parts)
+
+
+def with_hints(text: str) -> str:
+    """A compacted listing followed by its hints line, as sent to the model."""
+    footer = format_hints(extract_hints(text))
+    return f"{text}\n{footer}" if footer else text
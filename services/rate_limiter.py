@@ -0,0 +1,128 @@
+import math
+import time
+import random
+from typing import Optional
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap local estimate of the number of tokens in a prompt (about 3 characters per token)."""
+    return max(1, math.ceil(len(text) / 3))
+
+
+def backoff_with_jitter(base: float, attempt: int, cap: float) -> float:
+    """Exponential backoff for the given attempt number, with "equal jitter" applied."""
+    delay = min(cap, base * (2 ** attempt))
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class TokenBucket:
+    """
+    A token bucket refilled continuously at `capacity` tokens per minute.
+
+    A capacity of 0 disables the bucket. Tokens may be taken on credit with `consume`
+    (the balance can go negative) so actual usage reported after a call is accounted for.
+    """
+
+    def __init__(self, capacity: float):
+        self.capacity = capacity
+        self.refill_per_second = capacity / 60.0
+        self.tokens = capacity
+        self._updated_at = time.monotonic()
+
+    @property
+    def enabled(self) -> bool:
+        return self.capacity > 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated_at) * self.refill_per_second)
+        self._updated_at = now
+
+    def available(self) -> float:
+        if not self.enabled:
+            return math.inf
+        self._refill()
+        return self.tokens
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 if they are available now)."""
+        if not self.enabled:
+            return 0.0
+        self._refill()
+        # Requests larger than the bucket can only ever wait for a full bucket
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.refill_per_second
+
+    def consume(self, amount: float):
+        if self.enabled:
+            self._refill()
+            self.tokens -= amount
+
+
+class CircuitBreaker:
+    """
+    Per-key circuit breaker with half-open probing.
+
+    The breaker opens after `failure_threshold` consecutive failures, or immediately on a
+    rate-limit error. While open, no requests are routed to the key. Once the backoff has
+    elapsed it lets a single probe through (half-open); success closes it, failure re-opens
+    it with an exponentially longer, jittered backoff.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int, base_backoff: float, max_backoff: float):
+        self.failure_threshold = failure_threshold
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.open_count = 0  # Consecutive openings, drives the backoff exponent
+        self.next_retry_at = 0.0
+        self._probe_in_flight = False
+
+    def retry_in(self) -> float:
+        """Seconds until the breaker will accept a request."""
+        if self.state == self.OPEN:
+            return max(0.0, self.next_retry_at - time.monotonic())
+        if self.state == self.HALF_OPEN and self._probe_in_flight:
+            return self.base_backoff
+        return 0.0
+
+    def can_attempt(self) -> bool:
+        return self.retry_in() == 0.0
+
+    def on_attempt(self):
+        """Register that a request is being sent through the breaker."""
+        if self.state == self.OPEN and time.monotonic() >= self.next_retry_at:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            self._probe_in_flight = True
+
+    def abandon_attempt(self):
+        """Forget an attempt that ended without a result (e.g. it was cancelled)."""
+        self._probe_in_flight = False
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.open_count = 0
+        self._probe_in_flight = False
+
+    def record_failure(self, rate_limited: bool = False, retry_after: Optional[float] = None):
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if rate_limited or self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self._open(retry_after)
+
+    def _open(self, retry_after: Optional[float]):
+        delay = backoff_with_jitter(self.base_backoff, self.open_count, self.max_backoff)
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        self.state = self.OPEN
+        self.open_count += 1
+        self.next_retry_at = time.monotonic() + delay
@@ -0,0 +1,183 @@
+"""
+Tests for request deadlines and admission control (services.admission).
+
+Run with: python -m pytest test_admission.py
+"""
+
+import asyncio
+import pytest
+from services.admission import (
+    BULK,
+    INTERACTIVE,
+    AdmissionController,
+    DeadlineExceeded,
+    Overloaded,
+    request_context,
+    retry_after_header,
+    shared_work_context,
+)
+
+
+async def hold(controller: AdmissionController, release: asyncio.Event, order: list, name: str,
+               priority: int = INTERACTIVE, timeout: float = None):
+    with request_context(timeout=timeout, priority=priority):
+        async with controller.admit():
+            order.append(name)
+            await release.wait()
+
+
+def test_admits_up_to_capacity_without_queueing():
+    async def scenario():
+        controller = AdmissionController(2, {}, 1.0)
+        release, order = asyncio.Event(), []
+        tasks = [asyncio.create_task(hold(controller, release, order, name)) for name in "ab"]
+        await asyncio.sleep(0)
+        status = controller.status()
+        release.set()
+        await asyncio.gather(*tasks)
+        return status, controller.status()
+
+    during, after = asyncio.run(scenario())
+    assert during["in_use"] == 2 and during["waited"] == 0
+    assert after["in_use"] == 0 and after["admitted"] == 2
+
+
+def test_interactive_waiters_go_before_bulk_then_in_arrival_order():
+    async def scenario():
+        controller = AdmissionController(1, {}, 1.0)
+        release, order = asyncio.Event(), []
+        tasks = [asyncio.create_task(hold(controller, release, order, "holder"))]
+        await asyncio.sleep(0)
+        for name, priority in (("bulk-1", BULK), ("interactive-1", INTERACTIVE),
+                               ("bulk-2", BULK), ("interactive-2", INTERACTIVE)):
+            tasks.append(asyncio.create_task(hold(controller, release, order, name, priority)))
+            await asyncio.sleep(0)
+        queued = controller.status()["queued"]
+        release.set()
+        await asyncio.gather(*tasks)
+        return queued, order
+
+    queued, order = asyncio.run(scenario())
+    assert queued == {"interactive": 2, "bulk": 2}
+    assert order == ["holder", "interactive-1", "interactive-2", "bulk-1", "bulk-2"]
+
+
+def test_full_lane_is_rejected_with_429():
+    async def scenario():
+        controller = AdmissionController(1, {INTERACTIVE: 0, BULK: 1}, 2.0)
+        release, order = asyncio.Event(), []
+        tasks = [asyncio.create_task(hold(controller, release, order, "holder"))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(hold(controller, release, order, "bulk-1", BULK)))
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as rejected:
+            await hold(controller, release, order, "bulk-2", BULK)
+        # Lane limits are independent, and 0 means unbounded
+        tasks.append(asyncio.create_task(hold(controller, release, order, "interactive", INTERACTIVE)))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+        return controller, rejected.value, order
+
+    controller, error, order = asyncio.run(scenario())
+    assert error.status_code == 429
+    # One bulk request waits ahead of the rejected one: (1 + 1) * 2.0s / capacity 1
+    assert error.retry_after == pytest.approx(4.0)
+    assert controller.stats["rejected_queue_full"] == 1
+    assert order == ["holder", "interactive", "bulk-1"]
+
+
+def test_wait_longer_than_the_deadline_is_rejected_with_503():
+    async def scenario():
+        controller = AdmissionController(2, {}, 3.0)
+        release, order = asyncio.Event(), []
+        tasks = [asyncio.create_task(hold(controller, release, order, name)) for name in "ab"]
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as rejected:
+            await hold(controller, release, order, "late", timeout=1.0)
+        release.set()
+        await asyncio.gather(*tasks)
+        return controller, rejected.value
+
+    controller, error = asyncio.run(scenario())
+    assert error.status_code == 503
+    assert error.retry_after == pytest.approx(1.5)  # 1 * 3.0s / capacity 2
+    assert controller.stats["rejected_deadline"] == 1
+
+
+def test_waiter_whose_deadline_passes_leaves_the_queue():
+    async def scenario():
+        controller = AdmissionController(1, {}, 0.01)
+        release, order = asyncio.Event(), []
+        holder = asyncio.create_task(hold(controller, release, order, "holder"))
+        await asyncio.sleep(0)
+        with pytest.raises(DeadlineExceeded):
+            await hold(controller, release, order, "expired", timeout=0.05)
+        release.set()
+        await holder
+        # The slot is free again once the holder is done
+        await hold(controller, release, order, "next")
+        return controller, order
+
+    controller, order = asyncio.run(scenario())
+    assert order == ["holder", "next"]
+    assert controller.stats["expired_in_queue"] == 1
+    assert controller.status()["queued"] == {"interactive": 0, "bulk": 0}
+    assert controller.in_use == 0
+
+
+def test_cancelled_waiter_does_not_leak_capacity():
+    async def scenario():
+        controller = AdmissionController(1, {}, 1.0)
+        release, order = asyncio.Event(), []
+        holder = asyncio.create_task(hold(controller, release, order, "holder"))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(hold(controller, release, order, "cancelled"))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        release.set()
+        await asyncio.gather(holder, waiter, return_exceptions=True)
+        return controller, order
+
+    controller, order = asyncio.run(scenario())
+    assert order == ["holder"]
+    assert controller.in_use == 0
+
+
+def test_queued_shared_work_is_promoted_with_its_lane():
+    async def admit_shared(controller, order):
+        async with controller.admit():
+            order.append("shared")
+
+    async def scenario():
+        controller = AdmissionController(1, {}, 1.0)
+        release, order = asyncio.Event(), []
+        tasks = [asyncio.create_task(hold(controller, release, order, "holder"))]
+        await asyncio.sleep(0)
+        with request_context(priority=BULK):
+            context, lane = shared_work_context()
+        tasks.append(asyncio.get_running_loop().create_task(admit_shared(controller, order), context=context))
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(hold(controller, release, order, "interactive")))
+        await asyncio.sleep(0)
+        before = controller.status()["queued"]
+        lane.join(INTERACTIVE)
+        after = controller.status()["queued"]
+        release.set()
+        await asyncio.gather(*tasks)
+        return before, after, order
+
+    before, after, order = asyncio.run(scenario())
+    assert before == {"interactive": 1, "bulk": 1}
+    assert after == {"interactive": 2, "bulk": 0}
+    # Promoted work keeps its place by arrival among the interactive waiters
+    assert order == ["holder", "shared", "interactive"]
+
+
+@pytest.mark.parametrize("seconds, header", [(0.0, "1"), (0.2, "1"), (1.0, "1"), (1.01, "2"), (7.5, "8")])
+def test_retry_after_header_is_whole_seconds_and_at_least_one(seconds, header):
+    assert retry_after_header(seconds) == header
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,193 @@
+"""
+Tests for coalescing identical in-flight calls (services.coalescing).
+
+Run with: python -m pytest test_coalescing.py
+"""
+
+import asyncio
+import pytest
+from services.admission import (
+    BULK,
+    INTERACTIVE,
+    DeadlineExceeded,
+    current_priority,
+    remaining,
+    request_context,
+    with_deadline,
+)
+from services.coalescing import SingleFlight
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return {"name": "product"}
+
+        results = await asyncio.gather(*(flight.do("key", work) for _ in range(5)))
+        return flight, calls, results
+
+    flight, calls, results = asyncio.run(scenario())
+    assert calls == 1
+    assert all(result is results[0] for result in results)
+    assert flight.stats() == {"in_flight": 0, "upstream_calls": 1, "coalesced_requests": 4}
+
+
+def test_different_keys_do_not_coalesce():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def work(value):
+            await asyncio.sleep(0.01)
+            return value
+
+        return await asyncio.gather(flight.do("a", lambda: work(1)), flight.do("b", lambda: work(2)))
+
+    assert asyncio.run(scenario()) == [1, 2]
+
+
+def test_error_reaches_every_waiter_and_is_not_kept():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+
+        async def failing():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            raise ValueError("upstream failed")
+
+        results = await asyncio.gather(*(flight.do("key", failing) for _ in range(3)), return_exceptions=True)
+        # The failure is not cached: the next call starts a new upstream call
+        retried = await asyncio.gather(flight.do("key", failing), return_exceptions=True)
+        return flight, calls, results + retried
+
+    flight, calls, results = asyncio.run(scenario())
+    assert calls == 2
+    assert all(isinstance(result, ValueError) and str(result) == "upstream failed" for result in results)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_cancelled_waiter_leaves_the_shared_call_running():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "done"
+
+        first = asyncio.create_task(flight.do("key", work))
+        second = asyncio.create_task(flight.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        release.set()
+        return first, await second
+
+    first, result = asyncio.run(scenario())
+    assert first.cancelled()
+    assert result == "done"
+
+
+def test_shared_call_is_cancelled_when_every_waiter_leaves():
+    async def scenario():
+        flight = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def work():
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiters = [asyncio.create_task(flight.do("key", work)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.wait_for(cancelled.wait(), 1)
+        return flight
+
+    flight = asyncio.run(scenario())
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_caller_timeout_does_not_cancel_other_waiters():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        impatient = asyncio.wait_for(flight.do("key", work), 0.01)
+        patient = flight.do("key", work)
+        return await asyncio.gather(impatient, patient, return_exceptions=True)
+
+    impatient, patient = asyncio.run(scenario())
+    assert isinstance(impatient, (asyncio.TimeoutError, TimeoutError))
+    assert patient == "done"
+
+
+def test_waiters_keep_their_own_deadlines():
+    # Like generate_product_json: the shared call is bounded by each caller's own deadline
+    async def scenario():
+        flight = SingleFlight()
+        seen = {}
+
+        async def work():
+            seen["remaining"] = remaining()
+            await asyncio.sleep(0.2)
+            return "done"
+
+        async def caller(timeout, priority):
+            with request_context(timeout=timeout, priority=priority):
+                return await with_deadline(flight.do("key", work), "generating the product")
+
+        interactive = asyncio.create_task(caller(0.1, INTERACTIVE))
+        await asyncio.sleep(0)
+        bulk = asyncio.create_task(caller(None, BULK))
+        results = await asyncio.gather(interactive, bulk, return_exceptions=True)
+        return seen, results
+
+    seen, (interactive, bulk) = asyncio.run(scenario())
+    assert seen["remaining"] is None  # The shared call did not inherit the first deadline
+    assert isinstance(interactive, DeadlineExceeded)
+    assert bulk == "done"
+
+
+def test_shared_call_is_promoted_to_the_most_urgent_lane():
+    async def scenario():
+        flight = SingleFlight()
+        joined = asyncio.Event()
+        lanes = []
+
+        async def work():
+            lanes.append(current_priority())
+            await joined.wait()
+            lanes.append(current_priority())
+            return "done"
+
+        async def caller(priority):
+            with request_context(priority=priority):
+                return await flight.do("key", work)
+
+        bulk = asyncio.create_task(caller(BULK))
+        await asyncio.sleep(0)
+        interactive = asyncio.create_task(caller(INTERACTIVE))
+        await asyncio.sleep(0)
+        joined.set()
+        await asyncio.gather(bulk, interactive)
+        return lanes
+
+    assert asyncio.run(scenario()) == [BULK, INTERACTIVE]
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -58,7 +58,8 @@ async def test_failover():
         final_status = get_api_status()
         print("\n" + "-" * 40)
         print("Final API Status:")
-        print(f"- Current active key: #{final_status['current_key_index']}")
+        for key in final_status['keys']:
+            print(f"- Key #{key['key']}: {key['total_requests']} requests, {key['in_flight']} in flight")
         print(f"- Failed keys: {final_status['failed_keys'] if final_status['failed_keys'] else 'None'}")
         print(f"- Available keys: {final_status['available_keys']}")
         
@@ -0,0 +1,175 @@
+"""
+Tests for the persistent job queue and its workers (services.job_service).
+
+Run with: python -m pytest test_jobs.py
+"""
+
+import time
+import asyncio
+import sqlite3
+import pytest
+import services.job_service as job_service
+from services.job_service import DONE, FAILED, PENDING, RUNNING, JobStore, JobWorkerPool
+
+
+@pytest.fixture
+def store(tmp_path):
+    return JobStore(str(tmp_path / "jobs.db"), lease_seconds=0.05, max_attempts=2)
+
+
+def item_state(store: JobStore, job_id: str, index: int = 0) -> tuple:
+    return store._conn.execute(
+        "SELECT status, attempts, error FROM job_items WHERE job_id = ? AND item_index = ?", (job_id, index)
+    ).fetchone()
+
+
+def test_items_are_claimed_once_until_the_lease_expires(store):
+    job_id = store.submit(["a"])
+    first = store.claim_next()
+    assert first["job_id"] == job_id and first["attempt"] == 1
+    assert store.claim_next() is None
+    time.sleep(0.06)
+    # The first worker stopped renewing: the item is handed out again
+    second = store.claim_next()
+    assert second["index"] == 0 and second["attempt"] == 2
+    assert item_state(store, job_id) == (RUNNING, 2, None)
+
+
+def test_renewed_lease_is_not_reclaimed(store):
+    store.submit(["a"])
+    item = store.claim_next()
+    for _ in range(3):
+        time.sleep(0.03)
+        assert store.renew(item["job_id"], item["index"], item["attempt"])
+    assert store.claim_next() is None
+
+
+def test_failed_items_are_retried_until_max_attempts(store):
+    job_id = store.submit(["a"])
+    item = store.claim_next()
+    assert store.fail(job_id, 0, "boom", item["attempt"])
+    assert item_state(store, job_id) == (PENDING, 1, "boom")
+    item = store.claim_next()
+    assert store.fail(job_id, 0, "boom again", item["attempt"])
+    assert item_state(store, job_id) == (FAILED, 2, "boom again")
+    assert store.claim_next() is None
+
+
+def test_expired_lease_counts_against_max_attempts(store):
+    job_id = store.submit(["a"])
+    for _ in range(2):
+        assert store.claim_next() is not None
+        time.sleep(0.06)
+    # An item whose worker keeps dying is not handed out forever
+    assert store.claim_next() is None
+    assert item_state(store, job_id) == (FAILED, 2, "lease expired")
+    assert store.get_results(job_id, -1, 10) == [{"index": 0, "error": "lease expired"}]
+
+
+def test_stale_worker_cannot_overwrite_the_outcome(store):
+    job_id = store.submit(["a"])
+    stale = store.claim_next()
+    time.sleep(0.06)
+    current = store.claim_next()
+    assert store.complete(job_id, 0, {"name": "x"}, current["attempt"])
+    # The first worker finishes late: its writes are dropped
+    assert not store.fail(job_id, 0, "timed out", stale["attempt"])
+    assert not store.complete(job_id, 0, {"name": "stale"}, stale["attempt"])
+    assert not store.renew(job_id, 0, stale["attempt"])
+    assert item_state(store, job_id) == (DONE, 2, None)
+    assert store.get_results(job_id, -1, 10) == [{"index": 0, "data": {"name": "x"}}]
+
+
+def test_stale_worker_does_not_renew_the_new_lease(store):
+    store.submit(["a"])
+    stale = store.claim_next()
+    time.sleep(0.06)
+    current = store.claim_next()
+    assert not store.renew(current["job_id"], 0, stale["attempt"])
+    assert store.renew(current["job_id"], 0, current["attempt"])
+
+
+def test_released_item_gets_its_attempt_back(store):
+    job_id = store.submit(["a"])
+    item = store.claim_next()
+    store.release(job_id, 0, item["attempt"])
+    assert item_state(store, job_id) == (PENDING, 0, None)
+    assert store.claim_next()["attempt"] == 1
+
+
+def test_results_are_paginated_by_index(tmp_path):
+    store = JobStore(str(tmp_path / "jobs.db"), lease_seconds=30, max_attempts=1)
+    job_id = store.submit(["a", "b", "c", "d", "e"])
+    for _ in range(4):
+        item = store.claim_next()
+        if item["index"] == 2:
+            store.fail(job_id, 2, "bad input", item["attempt"])
+        else:
+            store.complete(job_id, item["index"], {"index": item["index"]}, item["attempt"])
+    # Index 4 is still running, so it is not a result yet
+    first_page = store.get_results(job_id, -1, 2)
+    assert first_page == [{"index": 0, "data": {"index": 0}}, {"index": 1, "data": {"index": 1}}]
+    second_page = store.get_results(job_id, first_page[-1]["index"], 2)
+    assert second_page == [{"index": 2, "error": "bad input"}, {"index": 3, "data": {"index": 3}}]
+    assert store.get_results(job_id, second_page[-1]["index"], 2) == []
+    assert store.get_job(job_id)["status"] == "running"
+
+
+def test_stopping_the_pool_puts_running_items_back(store, monkeypatch):
+    started = None
+
+    async def generate(raw_text, bypass_cache=False):
+        started.set()
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(job_service, "generate_product_json", generate)
+
+    async def scenario():
+        nonlocal started
+        started = asyncio.Event()
+        pool = JobWorkerPool(store, workers=1, poll_interval=0.01)
+        job_id = store.submit(["a"])
+        pool.start()
+        await asyncio.wait_for(started.wait(), 1)
+        await pool.stop()
+        return job_id
+
+    job_id = asyncio.run(scenario())
+    assert item_state(store, job_id) == (PENDING, 0, None)
+
+
+def test_worker_survives_store_errors(store, monkeypatch):
+    claim_next = store.claim_next
+    calls = 0
+
+    def flaky_claim_next():
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise sqlite3.OperationalError("database is locked")
+        return claim_next()
+
+    async def generate(raw_text, bypass_cache=False):
+        return {"name": raw_text}
+
+    monkeypatch.setattr(store, "claim_next", flaky_claim_next)
+    monkeypatch.setattr(job_service, "generate_product_json", generate)
+
+    async def scenario():
+        pool = JobWorkerPool(store, workers=1, poll_interval=0.01)
+        job_id = store.submit(["a"])
+        pool.start()
+        for _ in range(100):
+            if store.get_job(job_id)["status"] == "completed":
+                break
+            await asyncio.sleep(0.01)
+        await pool.stop()
+        return job_id
+
+    job_id = asyncio.run(scenario())
+    assert calls > 1
+    assert store.get_results(job_id, -1, 10) == [{"index": 0, "data": {"name": "a"}}]
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
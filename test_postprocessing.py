@@ -0,0 +1,115 @@
+"""
+Tests for repairing model output (services.postprocessing.repair_json).
+
+Run with: python -m pytest test_postprocessing.py
+"""
+
+import json
+import pytest
+from services.postprocessing import normalize_product, repair_json, validate_product
+
+PRODUCT = {
+    "category_id": 229,
+    "name": "مانتو کتان زنانه",
+    "description": "مانتو کتان \"نخی\" با آستین بلند، جیب دار و دکمه چوبی",
+    "price": 250000,
+    "price_currency": "toman",
+    "packaging_dimensions": {"length": 30, "width": 25, "height": 3},
+}
+RESPONSE = json.dumps(PRODUCT, ensure_ascii=False)
+
+
+def cut_after(text: str, marker: str, extra: int = 0) -> str:
+    """The text cut off `extra` characters after the end of `marker`."""
+    return text[:text.index(marker) + len(marker) + extra]
+
+
+def test_valid_json_is_returned_as_is():
+    assert repair_json(RESPONSE) == PRODUCT
+
+
+def test_code_fence_and_trailing_comma():
+    assert repair_json(f"```json\n{RESPONSE[:-1]},}}\n```") == PRODUCT
+
+
+def test_cut_inside_a_key_drops_the_key():
+    repaired = repair_json(cut_after(RESPONSE, '"price_curr'))
+    assert repaired == {key: PRODUCT[key] for key in ("category_id", "name", "description", "price")}
+
+
+def test_cut_after_a_colon_drops_the_member():
+    repaired = repair_json(cut_after(RESPONSE, '"price_currency":'))
+    assert "price_currency" not in repaired
+    assert repaired["price"] == 250000
+
+
+def test_cut_mid_number_drops_the_number():
+    repaired = repair_json(cut_after(RESPONSE, '"price": 25'))
+    assert "price" not in repaired
+    assert repaired["description"] == PRODUCT["description"]
+
+
+def test_cut_mid_number_is_reported_instead_of_priced():
+    _, errors = validate_product(normalize_product(repair_json(cut_after(RESPONSE, '"price": 25'))))
+    assert "price" in errors
+
+
+def test_number_followed_by_a_delimiter_is_kept():
+    assert repair_json(cut_after(RESPONSE, '"price": 250000,'))["price"] == 250000
+
+
+def test_cut_mid_string_drops_the_string():
+    repaired = repair_json(cut_after(RESPONSE, '"description": "مانتو'))
+    assert set(repaired) == {"category_id", "name"}
+
+
+def test_cut_inside_a_nested_object_keeps_its_complete_members():
+    repaired = repair_json(cut_after(RESPONSE, '"width": 2'))
+    assert repaired["packaging_dimensions"] == {"length": 30}
+
+
+def test_cut_inside_an_array_keeps_the_complete_items():
+    packed = json.dumps([dict(PRODUCT, index=0), dict(PRODUCT, index=1)], ensure_ascii=False)
+    repaired = repair_json(cut_after(packed, '"index": 1'))
+    assert repaired[0] == dict(PRODUCT, index=0)
+    assert "index" not in repaired[1]
+
+
+@pytest.mark.parametrize("text", [
+    RESPONSE,
+    json.dumps(PRODUCT, ensure_ascii=False, indent=2),
+    json.dumps([dict(PRODUCT, index=0), dict(PRODUCT, index=1)], ensure_ascii=False),
+])
+def test_every_cut_is_repaired_without_inventing_values(text):
+    def kept_from(original, repaired):
+        if isinstance(repaired, dict):
+            return all(key in original and kept_from(original[key], value) for key, value in repaired.items())
+        if isinstance(repaired, list):
+            return len(repaired) <= len(original) and all(map(kept_from, original, repaired))
+        return repaired == original
+
+    original = json.loads(text)
+    for cut in range(1, len(text)):
+        assert kept_from(original, repair_json(text[:cut])), text[:cut]
+
+
+def test_packaging_dimensions_stay_whole_centimeters():
+    valid = dict(PRODUCT, description=" ".join(["مانتو"] * 25))
+    product, errors = validate_product(normalize_product(valid))
+    assert not errors
+    assert product["packaging_dimensions"] == {"length": 30, "width": 25, "height": 3}
+    assert all(type(value) is int for value in product["packaging_dimensions"].values())
+
+    fractional = dict(valid, packaging_dimensions={"length": 29.6, "width": 0.2, "height": 3.0})
+    product, errors = validate_product(normalize_product(fractional))
+    assert not errors
+    assert product["packaging_dimensions"] == {"length": 30, "width": 1, "height": 3}
+
+
+def test_text_without_json_is_rejected():
+    with pytest.raises(ValueError):
+        repair_json("Sorry, I cannot help with that.")
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))
@@ -0,0 +1,187 @@
+"""
+Tests for streamed generation: incremental JSON parsing (services.json_stream) and stream
+failover in GeminiAPIKeyManager.stream_content_with_failover.
+
+Run with: python -m pytest test_streaming.py
+"""
+
+import json
+import asyncio
+import pytest
+from google.api_core import exceptions as google_exceptions
+from services.json_stream import MEMBER, TEXT, IncrementalObjectParser
+from services.model_backends import register_model_backend
+from services.gemini_service import GeminiAPIKeyManager, GeminiException
+
+PRODUCT = {
+    "category_id": 229,
+    "name": "مانتو \"کتان\" زنانه",
+    "description": "مانتو کتان\nبا آستین بلند \\ جیب دار 😀 و دکمه\tچوبی",
+    "price": 250000,
+    "price_currency": "toman",
+    "packaging_dimensions": {"length": 30, "width": 25, "height": 3},
+    "tags": ["مانتو", "کتان"],
+    "discounted": False,
+    "note": None,
+}
+
+
+def parse(chunks):
+    """Feed the chunks and return (members, streamed description, parser)."""
+    parser = IncrementalObjectParser(stream_keys=["description"])
+    members, streamed = {}, ""
+    for chunk in chunks:
+        for kind, name, value in parser.feed(chunk):
+            if kind == MEMBER:
+                members[name] = value
+            elif kind == TEXT:
+                streamed += value
+    return members, streamed, parser
+
+
+@pytest.mark.parametrize("ensure_ascii", [False, True])
+def test_every_split_into_two_chunks(ensure_ascii):
+    text = json.dumps(PRODUCT, ensure_ascii=ensure_ascii)
+    for cut in range(len(text) + 1):
+        members, streamed, parser = parse([text[:cut], text[cut:]])
+        assert members == PRODUCT, cut
+        assert streamed == PRODUCT["description"], cut
+        assert parser.done and not parser.failed
+
+
+@pytest.mark.parametrize("ensure_ascii", [False, True])
+def test_one_character_chunks(ensure_ascii):
+    # Escapes (\", \\, \n, \uXXXX and surrogate pairs) are split across chunks
+    text = json.dumps(PRODUCT, ensure_ascii=ensure_ascii, indent=2)
+    members, streamed, parser = parse(list(text))
+    assert members == PRODUCT
+    assert streamed == PRODUCT["description"]
+    assert parser.done
+
+
+def test_description_is_streamed_before_it_is_complete():
+    text = json.dumps(PRODUCT, ensure_ascii=False)
+    middle = text.index("آستین")
+    parser = IncrementalObjectParser(stream_keys=["description"])
+    events = parser.feed(text[:middle])
+    assert (TEXT, "description", "مانتو کتان\nبا ") in events
+    assert all(name != "description" for kind, name, _ in events if kind == MEMBER)
+
+
+def test_members_are_reported_as_soon_as_they_close():
+    parser = IncrementalObjectParser()
+    assert parser.feed('{"price": 250000') == []  # The number may go on
+    assert parser.feed(', "name": "x"') == [(MEMBER, "price", 250000), (MEMBER, "name", "x")]
+
+
+def test_code_fence_before_the_object_is_skipped():
+    members, _, parser = parse(["```json\n", json.dumps(PRODUCT), "\n```"])
+    assert members == PRODUCT and parser.done
+
+
+def test_unexpected_text_stops_the_parser_without_raising():
+    parser = IncrementalObjectParser()
+    assert parser.feed('{"name": "x", oops') == [(MEMBER, "name", "x")]
+    assert parser.failed
+    assert parser.feed('"price": 1}') == []
+
+
+class _Chunk:
+    def __init__(self, text: str):
+        self.text = text
+        self.usage_metadata = None
+
+
+class ScriptedModel:
+    """A model whose streams follow SCRIPTS[api_key]: chunks, then optionally an error."""
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    async def generate_content_async(self, prompt, generation_config=None, stream=False):
+        chunks, error = SCRIPTS[self.api_key]
+
+        async def stream_chunks():
+            for chunk in chunks:
+                await asyncio.sleep(0)
+                yield _Chunk(chunk)
+            if error is not None:
+                raise error
+
+        return stream_chunks()
+
+
+SCRIPTS = {}
+register_model_backend("scripted", lambda api_key, model_name, generation_config: ScriptedModel(api_key))
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    for name, value in {
+        "MODEL_BACKEND": "scripted", "GOOGLE_API_KEYS": "key-a,key-b", "GEMINI_MODEL": "gemini-2.5-flash",
+        "MODEL_TIERS": "gemini-2.5-flash", "MAX_RETRIES_PER_KEY": "1", "RETRY_DELAY": "0.01",
+        "HEDGE_ENABLED": "false", "KEY_STATE_BACKEND": "memory", "CONTEXT_CACHE_ENABLED": "false",
+    }.items():
+        monkeypatch.setenv(name, value)
+    SCRIPTS.clear()
+    return GeminiAPIKeyManager()
+
+
+async def collect(manager: GeminiAPIKeyManager) -> list:
+    received = []
+    try:
+        async for chunk in manager.stream_content_with_failover("prompt"):
+            received.append(chunk)
+    except Exception as e:
+        received.append(e)
+    return received
+
+
+def test_stream_fails_over_before_the_first_chunk(manager):
+    SCRIPTS["key-a"] = ([], google_exceptions.InternalServerError("down"))
+    SCRIPTS["key-b"] = (['{"name": ', '"x"}'], None)
+    received = asyncio.run(collect(manager))
+    assert received == ['{"name": ', '"x"}']
+    assert [slot.total_failures for slot in manager.slots] == [1, 0]
+
+
+def test_stream_failing_mid_way_is_raised_without_failover(manager):
+    SCRIPTS["key-a"] = (['{"name": ', '"x", '], google_exceptions.InternalServerError("connection reset"))
+    SCRIPTS["key-b"] = (['{"name": "y"}'], None)
+    received = asyncio.run(collect(manager))
+    # The caller already used part of the answer, so the error is not retried on another key
+    assert received[:2] == ['{"name": ', '"x", ']
+    assert isinstance(received[2], google_exceptions.InternalServerError)
+    slot_a, slot_b = manager.slots
+    assert slot_a.total_failures == 1 and slot_a.last_error == "500 connection reset"
+    assert slot_b.total_requests == 0
+    # The key and the admission slot are released
+    assert [slot.in_flight for slot in manager.slots] == [0, 0]
+    assert manager.admission.in_use == 0
+
+
+def test_empty_streams_on_every_key_exhaust_the_retries(manager):
+    SCRIPTS["key-a"] = ([""], None)
+    SCRIPTS["key-b"] = ([], None)
+    received = asyncio.run(collect(manager))
+    assert len(received) == 1 and isinstance(received[0], GeminiException)
+    assert [slot.total_failures for slot in manager.slots] == [1, 1]
+
+
+def test_consumer_stopping_early_does_not_count_against_the_key(manager):
+    SCRIPTS["key-a"] = (['{"name": ', '"x"}'], None)
+
+    async def first_chunk_only():
+        chunks = manager.stream_content_with_failover("prompt")
+        first = await chunks.__anext__()
+        await chunks.aclose()
+        return first
+
+    assert asyncio.run(first_chunk_only()) == '{"name": '
+    slot_a = manager.slots[0]
+    assert slot_a.total_failures == 0 and slot_a.in_flight == 0
+    assert manager.admission.in_use == 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(pytest.main([__file__, "-q"]))